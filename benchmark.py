@@ -0,0 +1,255 @@
+"""
+WePush 端到端基准测试
+
+在模拟微信（wxauto.simulator.SimWeChat）上运行 WePushMaiBotAdapter，
+连接本地的模拟 MaiBot 服务端（maim_message.MessageServer，按配置的延迟回复每条消息），
+由脚本按固定速率向各个聊天注入消息，统计：
+  - 入站吞吐：模拟 MaiBot 每秒收到的消息数
+  - 出站吞吐：每秒发送到微信的回复数
+  - 延迟：消息进入微信消息列表到回复发送完成的 p50/p99
+
+结果以 JSON 输出，便于对比优化前后的数据：
+    python benchmark.py --chats 4 --rate 5 --duration 30 --reply-delay 0.2 --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+
+# 模拟微信单次UI操作耗时的默认值（秒），只是数量级上的估计，可用 --ui-latency 覆盖
+DEFAULT_UI_LATENCY = {
+    'show': 0.05,
+    'session': 0.1,
+    'open': 0.5,
+    'poll': 0.02,
+    'item': 0.002,
+    'message': 0.01,
+    'send': 0.15,
+    'read': 0.01,
+}
+
+BENCH_PREFIX = 'bench#'
+REPLY_PREFIX = 're:'
+
+
+def _free_port() -> int:
+    """获取一个本地空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, q: float) -> float:
+    """线性插值的百分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+class FakeMaiBot:
+    """模拟 MaiBot Core：收到消息后等待 delay 秒，回复 're:' + 原消息文本"""
+
+    def __init__(self, host: str, port: int, delay: float = 0.0):
+        from maim_message import MessageServer
+
+        self.delay = delay
+        self.received = []
+        self.server = MessageServer(host=host, port=port)
+        self.server.register_message_handler(self._handle_message)
+        self._task = None
+
+    async def _handle_message(self, message: dict):
+        self.received.append((time.time(), self._text(message)))
+        asyncio.create_task(self._reply(message))
+
+    async def _reply(self, message: dict):
+        from maim_message import MessageBase, Seg
+
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        reply = MessageBase.from_dict(message)
+        reply.message_segment = Seg(type='text', data=REPLY_PREFIX + self._text(message))
+        await self.server.send_message(reply)
+
+    @staticmethod
+    def _text(message: dict) -> str:
+        segment = message.get('message_segment') or {}
+        if segment.get('type') == 'seglist':
+            return ''.join(seg.get('data', '') for seg in segment.get('data', []) if seg.get('type') == 'text')
+        return segment.get('data', '') if segment.get('type') == 'text' else ''
+
+    async def start(self):
+        self._task = asyncio.create_task(self.server.run())
+
+    async def stop(self):
+        await self.server.stop()
+        if self._task:
+            self._task.cancel()
+
+
+class TrafficScript:
+    """按固定总速率轮流向各个聊天注入消息，消息内容带序号以便和回复对应"""
+
+    def __init__(self, wx, chats, rate: float, duration: float, senders: int = 3):
+        self.wx = wx
+        self.chats = chats
+        self.rate = rate
+        self.duration = duration
+        self.senders = senders
+        self.arrived = {}
+
+    async def run(self):
+        interval = 1 / self.rate
+        total = int(self.rate * self.duration)
+        start = time.perf_counter()
+        for seq in range(total):
+            delay = start + seq * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            chat, group = self.chats[seq % len(self.chats)]
+            sender = f'成员{seq % self.senders}' if group else None
+            msg = self.wx.Receive(chat, f'{BENCH_PREFIX}{seq}', sender=sender)
+            self.arrived[seq] = msg.arrived
+        return total
+
+
+async def run_benchmark(args) -> dict:
+    from wxauto.simulator import SimWeChat
+
+    latency = DEFAULT_UI_LATENCY if args.ui_latency is None else json.loads(args.ui_latency)
+    if isinstance(latency, dict):
+        latency = {**{op: 0 for op in SimWeChat.OPS}, **latency}
+
+    groups = max(0, min(args.groups, args.chats))
+    chats = [(f'测试群{i}', True) for i in range(groups)]
+    chats += [(f'好友{i}', False) for i in range(args.chats - groups)]
+    wx = SimWeChat(nickname='bench', latency=latency)
+    for chat, group in chats:
+        wx.AddSession(chat, members=[f'成员{i}' for i in range(args.senders)] if group else None)
+
+    replies = {}
+
+    def on_send(who, msg):
+        if msg.content.startswith(REPLY_PREFIX + BENCH_PREFIX):
+            seq = int(msg.content[len(REPLY_PREFIX + BENCH_PREFIX):])
+            replies.setdefault(seq, msg.arrived)
+
+    wx.OnSend(on_send)
+
+    # main/config 在导入时读取环境变量，必须在导入前设置
+    os.environ['MAIBOT_WS_URL'] = f'ws://127.0.0.1:{args.port}/ws'
+    os.environ['MAIBOT_TOKEN'] = ''
+    os.environ['WX_TARGET_CHATS'] = ','.join(chat for chat, _ in chats)
+    os.environ['WX_BACKEND'] = 'sim'
+    os.environ['LOG_LEVEL'] = args.log_level
+    os.environ['MAIBOT_TRANSPORT'] = args.transport
+    from main import WePushMaiBotAdapter
+
+    fake = FakeMaiBot('127.0.0.1', args.port, delay=args.reply_delay)
+    await fake.start()
+    await asyncio.sleep(0.5)
+
+    app = WePushMaiBotAdapter(wx=wx)
+    await app.initialize()
+    app_task = asyncio.create_task(app.start())
+
+    # 等待所有聊天完成监听设置（打开窗口时记录已有消息）
+    deadline = time.time() + args.setup_timeout
+    while time.time() < deadline:
+        if len(wx.listen) == len(chats):
+            break
+        await asyncio.sleep(0.05)
+    else:
+        raise TimeoutError('监听设置超时')
+    ops_before = dict(wx.ops)
+
+    script = TrafficScript(wx, chats, args.rate, args.duration, args.senders)
+    t0 = time.time()
+    injected = await script.run()
+
+    drain_deadline = time.time() + args.drain_timeout
+    while len(replies) < injected and time.time() < drain_deadline:
+        await asyncio.sleep(0.05)
+    t1 = max(replies.values()) if replies else time.time()
+
+    await app.stop()
+    app_task.cancel()
+    await fake.stop()
+
+    latencies = [replies[seq] - script.arrived[seq] for seq in replies if seq in script.arrived]
+    received = [t for t, text in fake.received if t >= t0 and text.startswith(BENCH_PREFIX)]
+    received_other = len([t for t, text in fake.received if t >= t0]) - len(received)
+    elapsed = max(t1 - t0, 1e-9)
+    return {
+        'config': {
+            'chats': args.chats,
+            'groups': groups,
+            'rate': args.rate,
+            'duration': args.duration,
+            'reply_delay': args.reply_delay,
+            'ui_latency': latency,
+        },
+        'injected': injected,
+        'received_by_maibot': len(received),
+        'received_other': received_other,
+        'replies_sent': len(replies),
+        'lost': injected - len(replies),
+        'elapsed_s': round(elapsed, 3),
+        'inbound_msgs_per_s': round(len(received) / elapsed, 3),
+        'outbound_replies_per_s': round(len(replies) / elapsed, 3),
+        'latency_ms': {
+            name: round(value * 1000, 1) if value is not None else None
+            for name, value in (
+                ('p50', _percentile(latencies, 0.5)),
+                ('p99', _percentile(latencies, 0.99)),
+                ('max', max(latencies) if latencies else None),
+            )
+        },
+        'ui_ops': {op: count - ops_before.get(op, 0) for op, count in wx.ops.items()},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='WePush 端到端吞吐和延迟基准测试')
+    parser.add_argument('--chats', type=int, default=4, help='监听的聊天数')
+    parser.add_argument('--groups', type=int, default=2, help='其中群聊的数量')
+    parser.add_argument('--senders', type=int, default=3, help='每个群聊的发送者数量')
+    parser.add_argument('--rate', type=float, default=2.0, help='所有聊天合计每秒注入的消息数')
+    parser.add_argument('--duration', type=float, default=20.0, help='注入消息的时长（秒）')
+    parser.add_argument('--reply-delay', type=float, default=0.1, help='模拟 MaiBot 的回复延迟（秒）')
+    parser.add_argument('--ui-latency', default=None,
+                        help='模拟UI操作耗时，JSON 数字或按操作名的对象，如 \'{"poll": 0.02, "send": 0.2}\'，默认 DEFAULT_UI_LATENCY')
+    parser.add_argument('--port', type=int, default=0, help='模拟 MaiBot 监听的端口，默认随机空闲端口')
+    parser.add_argument('--setup-timeout', type=float, default=60.0, help='等待监听设置完成的超时（秒）')
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help='注入结束后等待剩余回复的超时（秒）')
+    parser.add_argument('--log-level', default='WARNING', help='适配器日志级别')
+    parser.add_argument('--transport', default='router', choices=['router', 'native'], help='MaiBot 连接方式')
+    parser.add_argument('--output', default=None, help='结果 JSON 文件路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+    if not args.port:
+        args.port = _free_port()
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    result = asyncio.run(run_benchmark(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
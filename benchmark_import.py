@@ -0,0 +1,117 @@
+"""
+WePush 导入耗时基准测试
+
+用 python -X importtime 在新进程中多次导入各模块，取累计导入耗时的中位数，
+并与 import_budget.json 中记录的预算（毫秒）比较，超出预算时以非零状态退出：
+    python benchmark_import.py                       # 测量并检查预算
+    python benchmark_import.py --update-budget       # 用本次测量结果（加上余量）更新预算
+    python benchmark_import.py -m wxauto.wxauto      # 只测量指定模块（Windows 上测量 uia 后端）
+
+每个模块同时列出自身耗时最多的子模块，便于找到拖慢启动的导入。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ['wxauto', 'wxauto.backend', 'wxauto.simulator', 'wx_Listener', 'main']
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budget.json')
+
+
+def _parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回 [(模块名, 自身微秒, 累计微秒)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            selftime, cumulative, name = line[len('import time:'):].split('|')
+            rows.append((name.strip(), int(selftime), int(cumulative)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module: str, repeat: int = 5, top: int = 5) -> dict:
+    """在新进程中导入 module repeat 次，返回累计耗时（毫秒）的中位数、最小值和自身耗时最多的子模块"""
+    totals = []
+    selftimes = {}
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, cwd=os.path.dirname(BUDGET_FILE),
+        )
+        if proc.returncode != 0:
+            return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'import failed'}
+        rows = _parse_importtime(proc.stderr)
+        totals.append(sum(cumulative for name, _, cumulative in rows if name == module) / 1000)
+        for name, selftime, _ in rows:
+            selftimes.setdefault(name, []).append(selftime / 1000)
+    slowest = sorted(((name, statistics.median(values)) for name, values in selftimes.items()), key=lambda i: -i[1])
+    return {
+        'median_ms': round(statistics.median(totals), 1),
+        'min_ms': round(min(totals), 1),
+        'slowest': {name: round(value, 1) for name, value in slowest[:top]},
+    }
+
+
+def load_budget(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='WePush 导入耗时基准测试')
+    parser.add_argument('-m', '--module', action='append', dest='modules', help='要测量的模块，可重复，默认为预算文件中的模块')
+    parser.add_argument('--repeat', type=int, default=5, help='每个模块的导入次数')
+    parser.add_argument('--top', type=int, default=5, help='列出自身耗时最多的子模块数')
+    parser.add_argument('--budget', default=BUDGET_FILE, help='预算文件路径')
+    parser.add_argument('--update-budget', action='store_true', help='用本次测量结果更新预算文件')
+    parser.add_argument('--headroom', type=float, default=1.5, help='更新预算时在中位数上乘的余量')
+    parser.add_argument('--output', default=None, help='结果 JSON 文件路径，默认输出到标准输出')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    budget = load_budget(args.budget)
+    modules = args.modules or list(budget) or DEFAULT_MODULES
+
+    results = {}
+    over = []
+    for module in modules:
+        result = measure(module, args.repeat, args.top)
+        if module in budget and 'median_ms' in result:
+            result['budget_ms'] = budget[module]
+            if result['median_ms'] > budget[module]:
+                over.append(module)
+        results[module] = result
+
+    if args.update_budget:
+        for module, result in results.items():
+            if 'median_ms' in result:
+                budget[module] = round(result['median_ms'] * args.headroom, 1)
+        with open(args.budget, 'w', encoding='utf-8') as f:
+            json.dump(budget, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        over = []
+
+    text = json.dumps({'python': sys.version.split()[0], 'platform': sys.platform, 'modules': results},
+                      ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+    if over:
+        print(f"超出导入耗时预算: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -4,11 +4,15 @@ WePush 配置模块
 
 import os
 import logging
-from typing import List, Optional
-from dotenv import load_dotenv
+from typing import List, NamedTuple, Optional
+from dotenv import load_dotenv, find_dotenv, dotenv_values
+
+# 进程启动时的环境变量，优先于.env文件中的值（与 load_dotenv 的默认行为一致）
+_BASE_ENV = dict(os.environ)
 
 # 加载.env文件
-load_dotenv()
+ENV_FILE = find_dotenv(usecwd=True) or os.path.join(os.getcwd(), '.env')
+load_dotenv(ENV_FILE)
 
 def _parse_list(value: Optional[str], default: List[str] = None) -> List[str]:
     """解析逗号分隔的字符串为列表"""
@@ -30,9 +34,31 @@ WX_EXCLUDED_CHATS = _parse_list(
     ["文件传输助手", "微信团队", "微信支付"]
 )
 
+# 入站消息规则文件（JSON），为空时只过滤系统消息和自己发送的消息，格式见 rules.py
+WX_RULES_FILE = os.getenv('WX_RULES_FILE', '')
+
+# 群成员名单缓存的有效期（秒），过期后在轮询间隙重新获取，0 为不过期
+WX_ROSTER_TTL = float(os.getenv('WX_ROSTER_TTL', '3600'))
+
+# 检查.env文件和规则文件修改并热更新的间隔（秒），0 为不检查
+WX_CONFIG_RELOAD_INTERVAL = float(os.getenv('WX_CONFIG_RELOAD_INTERVAL', '5'))
+
+# 微信UI后端：uia 为Windows微信客户端，sim 为内存中的模拟微信（用于测试和基准测试）
+WX_BACKEND = os.getenv('WX_BACKEND', 'uia')
+
+# UIA调用分析结果的文件路径前缀，设置后启用 wxauto.profiler（仅 uia 后端），
+# 停止时写出 <前缀>.txt 报告、<前缀>.folded 调用次数折叠栈和 <前缀>_time.folded 耗时折叠栈
+WX_UIA_PROFILE = os.getenv('WX_UIA_PROFILE', '')
+
 # MaiBot WebSocket 配置
 MAIBOT_WS_URL = os.getenv('MAIBOT_WS_URL', 'ws://127.0.0.1:8000/ws')
 MAIBOT_TOKEN = os.getenv('MAIBOT_TOKEN', '')
+# MaiBot 连接方式：router 为 maim_message.Router，native 为直接基于 websockets 的轻量传输（transport.py），协议相同
+MAIBOT_TRANSPORT = os.getenv('MAIBOT_TRANSPORT', 'router')
+
+# 指标服务配置，METRICS_PORT 为 0 时不启动
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
 
 # 平台标识
 PLATFORM_ID = os.getenv('PLATFORM_ID', 'wxauto')
@@ -41,6 +67,34 @@ PLATFORM_ID = os.getenv('PLATFORM_ID', 'wxauto')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FORMAT = os.getenv('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 LOG_DATE_FORMAT = os.getenv('LOG_DATE_FORMAT', '%Y-%m-%d %H:%M:%S')
+# 逐条消息日志的抽样，格式为 logger=N，每 N 条保留 1 条，如 wx_Listener=10,message_handler=10
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', '')
+
+class ListenConfig(NamedTuple):
+    """可热更新的监听配置"""
+    target_chats: List[str]
+    listen_all_if_empty: bool
+    excluded_chats: List[str]
+    rules_file: str
+
+
+def load_listen_config() -> ListenConfig:
+    """重新读取.env文件中的监听配置，进程启动时已设置的环境变量优先"""
+    env = {**dotenv_values(ENV_FILE), **_BASE_ENV}
+    return ListenConfig(
+        target_chats=_parse_list(env.get('WX_TARGET_CHATS'), []),
+        listen_all_if_empty=_parse_bool(env.get('WX_LISTEN_ALL_IF_EMPTY'), False),
+        excluded_chats=_parse_list(env.get('WX_EXCLUDED_CHATS'), ["文件传输助手", "微信团队", "微信支付"]),
+        rules_file=env.get('WX_RULES_FILE', ''),
+    )
+
+
+def config_mtime() -> Optional[float]:
+    """.env文件的修改时间，文件不存在时返回None"""
+    try:
+        return os.path.getmtime(ENV_FILE)
+    except OSError:
+        return None
 
 # 配置信息打印
 def print_config_info():
@@ -50,9 +104,13 @@ def print_config_info():
     logger.info(f"微信监听目标: {WX_TARGET_CHATS}")
     logger.info(f"监听所有聊天: {WX_LISTEN_ALL_IF_EMPTY}")
     logger.info(f"排除的聊天: {WX_EXCLUDED_CHATS}")
+    logger.info(f"消息规则文件: {WX_RULES_FILE or '未设置'}")
+    logger.info(f"微信UI后端: {WX_BACKEND}")
     logger.info(f"MaiBot WebSocket URL: {MAIBOT_WS_URL}")
+    logger.info(f"MaiBot 连接方式: {MAIBOT_TRANSPORT}")
     logger.info(f"MaiBot Token: {'已设置' if MAIBOT_TOKEN else '未设置'}")
     logger.info(f"平台标识: {PLATFORM_ID}")
+    logger.info(f"指标服务: {f'http://{METRICS_HOST}:{METRICS_PORT}/metrics' if METRICS_PORT else '未启用'}")
     logger.info("==========================\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+"""
+WePush 日志模块
+
+热路径上的日志调用只把日志记录放入队列，格式化和控制台输出在后台线程中完成：
+  - 队列处理器不预先格式化消息，%-风格的参数在写出时才格式化
+  - 带有 extra=PER_MESSAGE 的逐条消息日志可按 logger 抽样（LOG_SAMPLE），WARNING 及以上不抽样
+  - wxauto 的日志也经由同一个队列写出
+"""
+
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Dict, Optional
+
+# 逐条消息日志的标记，用法：logger.info("...%s", arg, extra=PER_MESSAGE)
+PER_MESSAGE = {'per_message': True}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录原样放入队列，不在调用线程中格式化消息"""
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """对逐条消息日志按 logger 抽样，每 N 条保留 1 条
+
+    rates 的键为 logger 名或其前缀（如 'wxauto' 匹配 'wxauto' 和 'wxauto.xxx'），值为 N
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = {name: int(rate) for name, rate in rates.items() if int(rate) > 1}
+        self._counters: Dict[str, itertools.count] = {}
+        self._lock = threading.Lock()
+
+    def _rate(self, name: str) -> int:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, 'per_message', False):
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        with self._lock:
+            counter = self._counters.setdefault(record.name, itertools.count())
+            return next(counter) % rate == 0
+
+
+def parse_sample(value: str) -> Dict[str, int]:
+    """解析 'logger=N,logger=N' 形式的抽样配置"""
+    rates = {}
+    for item in (value or '').split(','):
+        name, _, rate = item.strip().partition('=')
+        if name and rate.strip().isdigit():
+            rates[name.strip()] = int(rate)
+    return rates
+
+
+def setup_logging(level: str = 'INFO', fmt: str = None, datefmt: str = None,
+                  sample: Optional[Dict[str, int]] = None) -> logging.handlers.QueueListener:
+    """配置根 logger 使用队列和后台写出线程，重复调用时先停止之前的配置
+
+    Args:
+        level: 日志级别名
+        fmt: 日志格式
+        datefmt: 时间格式
+        sample: 逐条消息日志的抽样配置，见 SamplingFilter
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(fmt, datefmt))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _LazyQueueHandler(log_queue)
+    if sample:
+        _queue_handler.addFilter(SamplingFilter(sample))
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    # wxauto 默认使用自己的同步控制台输出，改为经由根 logger 的队列
+    wxlog = logging.getLogger('wxauto')
+    for handler in list(wxlog.handlers):
+        wxlog.removeHandler(handler)
+    wxlog.setLevel(logging.NOTSET)
+    wxlog.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
+
+
+atexit.register(stop_logging)
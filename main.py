@@ -2,32 +2,44 @@ import asyncio
 import logging
 import signal
 import sys
+from logging_setup import setup_logging, parse_sample
 from wx_Listener import WeChatListener
 from message_handler import MaiBotMessageHandler
-from config import WX_TARGET_CHATS, LOG_LEVEL, LOG_FORMAT, LOG_DATE_FORMAT
-
-# 配置日志
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT,
-    datefmt=LOG_DATE_FORMAT
+from metrics import start_metrics_server
+from config import (
+    WX_TARGET_CHATS, WX_BACKEND, WX_UIA_PROFILE, LOG_LEVEL, LOG_FORMAT, LOG_DATE_FORMAT, LOG_SAMPLE,
+    METRICS_HOST, METRICS_PORT
 )
 
+# 配置日志，格式化和输出在后台线程中进行
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_DATE_FORMAT, parse_sample(LOG_SAMPLE))
+
 logger = logging.getLogger(__name__)
 
 class WePushMaiBotAdapter:
-    def __init__(self):
+    def __init__(self, wx=None):
+        self.wx = wx
         self.message_handler = None
         self.listener = None
+        self.metrics_server = None
         self.running = False
         
     async def initialize(self):
         """初始化所有组件"""
         try:
+            if METRICS_PORT and not self.metrics_server:
+                self.metrics_server = start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+            if WX_UIA_PROFILE and WX_BACKEND == 'uia' and self.wx is None:
+                from wxauto import profiler
+                profiler.Enable()
+                logger.info(f"已启用UIA调用分析: {WX_UIA_PROFILE}")
+
             # 初始化微信监听器
             self.listener = WeChatListener(
                 target_chats=WX_TARGET_CHATS,
-                callback=self._handle_wechat_message
+                callback=self._handle_wechat_message,
+                wx=self.wx
             )
             
             # 初始化 MaiBot 消息处理器，传递微信监听器引用
@@ -42,7 +54,7 @@ class WePushMaiBotAdapter:
     
     async def _handle_wechat_message(self, chat_name, message_data):
         """处理微信消息的回调函数"""
-        await self.message_handler.send_to_maibot(chat_name, message_data)
+        return await self.message_handler.send_to_maibot(chat_name, message_data)
     
     async def start(self):
         """启动服务"""
@@ -78,8 +90,28 @@ class WePushMaiBotAdapter:
         if self.listener:
             await self.listener.stop_listening()
         
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server = None
+        
+        self._export_uia_profile()
+        
         logger.info("WePush MaiBot Adapter 已停止")
 
+    def _export_uia_profile(self):
+        """写出UIA调用分析结果"""
+        if not WX_UIA_PROFILE:
+            return
+        from wxauto import profiler
+        if not profiler.IsEnabled():
+            return
+        profiler.Disable()
+        with open(f"{WX_UIA_PROFILE}.txt", 'w', encoding='utf-8') as f:
+            f.write(profiler.Report() + '\n')
+        profiler.ExportFolded(f"{WX_UIA_PROFILE}.folded", 'count')
+        profiler.ExportFolded(f"{WX_UIA_PROFILE}_time.folded", 'time')
+        logger.info(f"UIA调用分析结果已写入: {WX_UIA_PROFILE}.txt")
+
 async def main():
     """主函数"""
     app = WePushMaiBotAdapter()
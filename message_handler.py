@@ -8,7 +8,10 @@ from maim_message import (
     BaseMessageInfo, UserInfo, GroupInfo, FormatInfo, MessageBase, Seg,
     Router, RouteConfig, TargetConfig
 )
-from config import MAIBOT_WS_URL, MAIBOT_TOKEN, PLATFORM_ID
+from config import MAIBOT_WS_URL, MAIBOT_TOKEN, MAIBOT_TRANSPORT, PLATFORM_ID
+import metrics
+from logging_setup import PER_MESSAGE
+from segments import build_actions
 
 logger = logging.getLogger(__name__)
 
@@ -19,23 +22,33 @@ class MaiBotMessageHandler:
         self.is_connected = False
         self.wechat_listener = wechat_listener
         self.message_counter = 0
+        # user_id -> 微信昵称，MaiBot 回复中 @ 的是 user_id
+        self._user_names = {}
         
     async def initialize(self):
         """初始化 WebSocket 连接"""
         try:
-            route_config = RouteConfig(
-                route_config={
-                    self.platform: TargetConfig(
-                        url=MAIBOT_WS_URL,
-                        token=MAIBOT_TOKEN if MAIBOT_TOKEN else None,
-                    )
-                }
-            )
-            
-            self.router = Router(route_config)
+            if MAIBOT_TRANSPORT == 'native':
+                from transport import NativeTransport
+                self.router = NativeTransport(MAIBOT_WS_URL, self.platform, MAIBOT_TOKEN or None)
+            else:
+                route_config = RouteConfig(
+                    route_config={
+                        self.platform: TargetConfig(
+                            url=MAIBOT_WS_URL,
+                            token=MAIBOT_TOKEN if MAIBOT_TOKEN else None,
+                        )
+                    }
+                )
+                
+                self.router = Router(route_config)
             self.router.register_class_handler(self._handle_maibot_response)
+            metrics.MAIBOT_CONNECTED.set_function(
+                lambda: self.router.check_connection(self.platform) if self.router else 0,
+                platform=self.platform
+            )
             
-            logger.info(f"初始化 MaiBot WebSocket 连接: {MAIBOT_WS_URL}")
+            logger.info(f"初始化 MaiBot WebSocket 连接: {MAIBOT_WS_URL} ({MAIBOT_TRANSPORT})")
             return True
             
         except Exception as e:
@@ -79,6 +92,7 @@ class MaiBotMessageHandler:
         
         # 用户信息
         user_id = hashlib.md5(sender.encode()).hexdigest()
+        self._user_names[user_id] = sender
         user_info = UserInfo(
             platform=self.platform,
             user_id=user_id,
@@ -87,7 +101,8 @@ class MaiBotMessageHandler:
         
         # 群组信息（如果是群聊）
         group_info = None
-        is_group_chat = chat_name != sender
+        # 监听器按群成员名单判断，没有时沿用发送者与聊天名是否相同的判断
+        is_group_chat = message_data.get('is_group', chat_name != sender)
         if is_group_chat:
             group_id = hashlib.md5(chat_name.encode()).hexdigest()
             group_info = GroupInfo(
@@ -112,7 +127,8 @@ class MaiBotMessageHandler:
             group_info=group_info,
             format_info=format_info,
             template_info=None,
-            additional_config=None
+            # gate 模式的转发优先级：high 为触发的消息，sampled 为抽样的消息，context 为合并的上下文
+            additional_config={'priority': message_data['priority']} if message_data.get('priority') else None
         )
     
     def _build_message_segment(self, content: str) -> Seg:
@@ -126,16 +142,11 @@ class MaiBotMessageHandler:
         """发送消息到 MaiBot Core"""
         if not self.is_connected or not self.router:
             logger.error("WebSocket 未连接，无法发送消息")
+            metrics.MESSAGES_DROPPED.inc(chat=chat_name, reason='disconnected')
             return False
         
         try:
-            # 过滤系统消息和自己发送的消息
-            if (message_data.get('type') in ['sys', 'self'] or 
-                message_data.get('sender') == 'Self' or
-                "以下为新消息" in message_data.get('content', '') or
-                "新消息" in message_data.get('content', '')):
-                return False
-            
+            # 消息已由监听器按入站规则过滤（rules.py）
             # 构建消息
             message_info = self._build_message_info(chat_name, message_data)
             message_segment = self._build_message_segment(message_data['content'])
@@ -148,127 +159,59 @@ class MaiBotMessageHandler:
             
             # 发送消息
             await self.router.send_message(message)
-            logger.info(f"消息已发送到 MaiBot Core: {chat_name} - {message_data['sender']}: {message_data['content'][:50]}...")
+            metrics.MESSAGES_FORWARDED.inc(chat=chat_name)
+            logger.info("消息已发送到 MaiBot Core: %s - %s: %.50s...", chat_name, message_data['sender'],
+                        message_data['content'], extra=PER_MESSAGE)
             return True
             
         except Exception as e:
             logger.error(f"发送消息到 MaiBot Core 失败: {str(e)}")
+            metrics.MESSAGES_DROPPED.inc(chat=chat_name, reason='error')
             return False
     
     async def _handle_maibot_response(self, message):
         """处理从 MaiBot Core 返回的消息"""
         try:
-            # 检查消息类型，可能是字典或 MessageBase 对象
+            # 字典和 MessageBase 两种格式只在取消息段和目标聊天时区分，消息段由 build_actions 一次遍历
             if isinstance(message, dict):
-                logger.info("收到 MaiBot Core 回复 (字典格式)")
-                # 从字典中提取消息内容
-                content = self._extract_content_from_dict(message)
+                logger.debug("收到 MaiBot Core 回复 (字典格式)")
+                segment = message.get('message_segment')
                 target_chat = self._get_target_chat_from_dict(message)
-                
-                # 检查是否有图片
-                image_data = self._extract_image_from_dict(message)
-                if image_data:
-                    logger.info("检测到图片消息")
-                    if self.wechat_listener:
-                        await self.wechat_listener.send_wechat_image(target_chat, image_data)
-                    return
-                
-                if not content:
-                    logger.warning("无法从字典中提取消息内容")
-                    return
-                
-                if not target_chat:
-                    logger.warning("无法从字典中确定目标聊天")
-                    return
-                
             elif hasattr(message, 'message_segment'):
-                logger.info("收到 MaiBot Core 回复 (MessageBase格式)")
-                # 提取消息内容
-                content = self._extract_content(message.message_segment)
+                logger.debug("收到 MaiBot Core 回复 (MessageBase格式)")
+                segment = message.message_segment
                 target_chat = self._get_target_chat(message.message_info)
-                
-                # 检查是否有图片
-                image_data = self._extract_image_from_segment(message.message_segment)
-                if image_data:
-                    logger.info("检测到图片消息")
-                    if self.wechat_listener:
-                        await self.wechat_listener.send_wechat_image(target_chat, image_data)
-                    return
-                
-                if not content:
-                    logger.warning("无法提取消息内容")
-                    return
-                
-                if not target_chat:
-                    logger.warning("无法确定目标聊天")
-                    return
             else:
                 logger.error(f"未知的消息格式: {type(message)}")
                 return
             
-            logger.info(f"准备发送回复到微信: {target_chat} - {content}")
+            actions = build_actions(segment, lambda user_id: self._resolve_user(user_id, target_chat))
+            if not actions:
+                logger.warning("MaiBot 回复中没有可发送的内容")
+                return
+            
+            if not target_chat:
+                logger.warning("无法确定目标聊天")
+                return
+            
+            logger.info("准备发送回复到微信: %s - %s", target_chat,
+                        ', '.join(action.kind for action in actions), extra=PER_MESSAGE)
             
-            # 通过微信监听器发送消息
+            # 通过微信监听器按顺序发送，整条回复只激活一次聊天窗口
             if self.wechat_listener:
-                await self.wechat_listener.send_wechat_message(target_chat, content)
+                await self.wechat_listener.send_wechat_reply(target_chat, actions)
             else:
                 logger.error("微信监听器未设置，无法发送回复")
             
         except Exception as e:
             logger.error(f"处理 MaiBot 回复失败: {str(e)}")
 
-    def _extract_content_from_dict(self, message_dict: dict) -> str:
-        """从字典格式的消息中提取文本内容"""
-        try:
-            message_segment = message_dict.get('message_segment', {})
-            
-            if isinstance(message_segment, dict):
-                if message_segment.get('type') == "text":
-                    return message_segment.get('data', '')
-                elif message_segment.get('type') == "seglist":
-                    contents = []
-                    for seg in message_segment.get('data', []):
-                        if isinstance(seg, dict) and seg.get('type') == "text":
-                            contents.append(seg.get('data', ''))
-                    return "".join(contents)
-            
-            return ""
-        except Exception as e:
-            logger.error(f"从字典提取消息内容失败: {str(e)}")
-            return ""
-
-    def _extract_image_from_dict(self, message_dict: dict) -> str:
-        """从字典格式的消息中提取图片数据"""
-        try:
-            message_segment = message_dict.get('message_segment', {})
-            
-            if isinstance(message_segment, dict):
-                if message_segment.get('type') == "image":
-                    return message_segment.get('data', '')
-                elif message_segment.get('type') == "seglist":
-                    for seg in message_segment.get('data', []):
-                        if isinstance(seg, dict) and seg.get('type') == "image":
-                            return seg.get('data', '')
-            
-            return ""
-        except Exception as e:
-            logger.error(f"从字典提取图片数据失败: {str(e)}")
-            return ""
-
-    def _extract_image_from_segment(self, message_segment) -> str:
-        """从消息段中提取图片数据"""
-        try:
-            if hasattr(message_segment, 'type'):
-                if message_segment.type == "image":
-                    return message_segment.data
-                elif message_segment.type == "seglist":
-                    for seg in message_segment.data:
-                        if isinstance(seg, Seg) and seg.type == "image":
-                            return seg.data
-            return ""
-        except Exception as e:
-            logger.error(f"提取图片数据失败: {str(e)}")
-            return ""
+    def _resolve_user(self, user_id: str, target_chat: str) -> str:
+        """把转发时生成的 user_id 转换回微信昵称，再按群成员名单转换为成员名，用于 @"""
+        name = self._user_names.get(user_id, user_id)
+        if self.wechat_listener:
+            name = self.wechat_listener.roster.canonical(target_chat, name)
+        return name
 
     def _get_target_chat_from_dict(self, message_dict: dict) -> str:
         """从字典格式的消息信息中获取目标聊天"""
@@ -300,25 +243,6 @@ class MaiBotMessageHandler:
             logger.error(f"从字典获取目标聊天失败: {str(e)}")
             return ""
 
-    def _extract_content(self, message_segment: Seg) -> str:
-        """从消息段中提取文本内容"""
-        try:
-            if hasattr(message_segment, 'type'):
-                if message_segment.type == "text":
-                    return message_segment.data
-                elif message_segment.type == "seglist":
-                    contents = []
-                    for seg in message_segment.data:
-                        if isinstance(seg, Seg):
-                            content = self._extract_content(seg)
-                            if content:
-                                contents.append(content)
-                    return "".join(contents)
-            return ""
-        except Exception as e:
-            logger.error(f"提取消息内容失败: {str(e)}")
-            return ""
-
     def _get_target_chat(self, message_info: BaseMessageInfo) -> str:
         """根据消息信息获取目标聊天"""
         try:
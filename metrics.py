@@ -0,0 +1,247 @@
+"""
+WePush 指标模块
+
+以 Prometheus 文本格式在本地 HTTP 端口（METRICS_PORT）上暴露运行指标：
+  - 每个聊天收到、转发、丢弃的消息数
+  - _check_new_messages 和发送回复的耗时分布
+  - MaiBot Router 的连接状态
+  - 每类高层微信调用中的UI操作次数
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类，按标签值保存数据"""
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels):
+        """删除一组标签值的数据，如移除监听的聊天后"""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """返回 (名称后缀, 标签字符串, 值) 列表"""
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('', _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """在每次抓取时调用 function 获取当前值"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                values[key] = float(function())
+            except Exception as e:
+                logger.debug(f"读取指标 {self.name} 失败: {e}")
+        return [('', _format_labels(self.labelnames, key), value) for key, value in values.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            data[0][index] += 1
+            data[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """统计 with 语句块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(data[0]), data[1]) for key, data in self._values.items()]
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(('_bucket', _format_labels(self.labelnames, key, le), cumulative))
+            samples.append(('_sum', _format_labels(self.labelnames, key), total))
+            samples.append(('_count', _format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def expose(self) -> str:
+        """生成 Prometheus 文本格式的全部指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.expose() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+MESSAGES_RECEIVED = Counter('wepush_messages_received_total', '从微信收到的消息数', ['chat'])
+MESSAGES_FORWARDED = Counter('wepush_messages_forwarded_total', '转发到 MaiBot 的消息数', ['chat'])
+MESSAGES_DROPPED = Counter('wepush_messages_dropped_total', '未转发到 MaiBot 的消息数', ['chat', 'reason'])
+MESSAGES_GATED = Counter('wepush_messages_gated_total', 'gate 模式下按原因统计的消息数', ['chat', 'reason'])
+CHECK_DURATION = Histogram('wepush_check_new_messages_seconds', '一次 _check_new_messages 的耗时')
+SEND_DURATION = Histogram('wepush_send_seconds', '发送一条回复到微信的耗时', ['result'])
+SENDS_IN_FLIGHT = Gauge('wepush_sends_in_flight', '正在等待或执行的微信发送数')
+MAIBOT_CONNECTED = Gauge('wepush_maibot_connected', 'MaiBot Router 连接状态，1为已连接', ['platform'])
+UI_CALLS = Counter('wepush_ui_calls_total', '高层微信调用次数', ['call'])
+UI_OPERATIONS = Counter('wepush_ui_operations_total', '高层微信调用中执行的UI操作次数', ['call', 'op'])
+
+
+def track_ui_call(call: str, wx, func: Callable, *args, **kwargs):
+    """执行一次高层微信调用，记录调用次数和期间增加的UI操作次数
+
+    wx.ops 为后端的UI操作计数（collections.Counter），
+    同一时间有多个调用在不同线程中执行时，操作次数会计入各自重叠的调用
+    """
+    ops = getattr(wx, 'ops', None)
+    before = dict(ops) if ops is not None else None
+    try:
+        return func(*args, **kwargs)
+    finally:
+        UI_CALLS.inc(call=call)
+        if before is not None:
+            for op, count in list(ops.items()):
+                delta = count - before.get(op, 0)
+                if delta:
+                    UI_OPERATIONS.inc(delta, call=call, op=op)
+
+
+def start_metrics_server(host: str, port: int, registry: Optional[Registry] = None):
+    """在后台线程中启动指标 HTTP 服务，返回 ThreadingHTTPServer，调用 shutdown() 停止"""
+    # 未启用指标服务时不导入 http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = (registry or REGISTRY).expose().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='wepush-metrics', daemon=True)
+    thread.start()
+    logger.info(f"指标服务已启动: http://{host}:{server.server_address[1]}/metrics")
+    return server
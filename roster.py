@@ -0,0 +1,121 @@
+"""
+WePush 群成员缓存
+
+判断一个聊天是否为群聊、群里有哪些成员，唯一可靠的来源是 ChatWnd.GetGroupMembers，
+它需要打开聊天信息面板，是一次完整的UI操作。这里按聊天缓存其结果：
+  - 聊天第一次收到消息时排队获取，由监听器在两次轮询之间逐个获取，不与轮询同时操作界面
+  - 超过 TTL 或收到入群/退群的系统消息时重新获取，重新获取完成前继续使用旧名单
+  - 是否群聊、成员列表、显示名到成员名的转换都是字典查找，不需要每条消息操作界面
+
+名单获取之前，是否群聊沿用"发送者与聊天名不同即为群聊"的判断。获取失败（GetGroupMembers 抛出异常）
+不缓存任何结果，RETRY_INTERVAL 秒后重新排队，期间继续使用旧名单或上述判断。
+"""
+
+import re
+import time
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+# 入群/退群的系统消息，收到后重新获取名单
+JOIN_LEAVE = re.compile(
+    r'加入了群聊|加入群聊|移出了群聊|退出了群聊|移出群聊'
+    r'|joined the group|left the group|removed .+ from the group|to the group chat'
+)
+# 获取失败后重试的间隔（秒）
+RETRY_INTERVAL = 60
+
+
+def _alias(name: str) -> str:
+    return ' '.join(name.split()).casefold()
+
+
+class Roster(NamedTuple):
+    is_group: bool
+    members: FrozenSet[str]
+    aliases: Dict[str, str]
+    fetched: float
+
+
+class RosterCache:
+    """按聊天缓存的群成员名单，只在事件循环中使用
+
+    Args:
+        ttl: 名单的有效期（秒），0 为不过期
+    """
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self._rosters: Dict[str, Roster] = {}
+        self._pending: Dict[str, None] = {}  # 等待获取的聊天，按加入顺序
+        self._failed: Dict[str, float] = {}
+
+    def get(self, chat: str) -> Optional[Roster]:
+        return self._rosters.get(chat)
+
+    def is_group(self, chat: str, sender: Optional[str] = None) -> bool:
+        """是否群聊，名单获取之前按发送者与聊天名是否相同判断"""
+        roster = self._rosters.get(chat)
+        if roster is not None:
+            return roster.is_group
+        return sender is not None and sender != chat
+
+    def members(self, chat: str) -> FrozenSet[str]:
+        """群成员，非群聊或名单未获取时为空"""
+        roster = self._rosters.get(chat)
+        return roster.members if roster is not None else frozenset()
+
+    def canonical(self, chat: str, name: str) -> str:
+        """把显示名转换为名单中的成员名（忽略大小写和多余空白），不在名单中时原样返回"""
+        roster = self._rosters.get(chat)
+        if roster is None or name in roster.members:
+            return name
+        return roster.aliases.get(_alias(name), name)
+
+    def observe(self, chat: str, type: str, content: str, now: Optional[float] = None):
+        """每条消息调用一次：名单不存在或过期时排队获取，入群/退群的系统消息使名单失效"""
+        if type == 'sys' and content and JOIN_LEAVE.search(content):
+            self.invalidate(chat)
+            return
+        if chat in self._pending:
+            return
+        now = time.monotonic() if now is None else now
+        if now - self._failed.get(chat, -RETRY_INTERVAL) < RETRY_INTERVAL:
+            return
+        roster = self._rosters.get(chat)
+        if roster is None or (self.ttl and now - roster.fetched > self.ttl):
+            self._pending[chat] = None
+
+    def invalidate(self, chat: str):
+        """重新获取名单，获取完成前继续使用旧名单"""
+        self._failed.pop(chat, None)
+        self._pending[chat] = None
+
+    def next_pending(self) -> Optional[str]:
+        """取出下一个等待获取名单的聊天"""
+        if not self._pending:
+            return None
+        chat = next(iter(self._pending))
+        del self._pending[chat]
+        return chat
+
+    def update(self, chat: str, members: List[str], now: Optional[float] = None):
+        """保存获取到的名单，members 为空列表表示不是群聊；获取失败时调用 failed，不要调用本方法"""
+        if members is None:
+            raise ValueError(f"群成员名单不能为 None: {chat}")
+        self._failed.pop(chat, None)
+        members = frozenset(members)
+        self._rosters[chat] = Roster(
+            is_group=bool(members),
+            members=members,
+            aliases={_alias(name): name for name in members},
+            fetched=time.monotonic() if now is None else now,
+        )
+
+    def failed(self, chat: str, now: Optional[float] = None):
+        """记录获取失败，RETRY_INTERVAL 秒内不再排队"""
+        self._failed[chat] = time.monotonic() if now is None else now
+
+    def discard(self, chat: str):
+        """不再监听的聊天"""
+        self._rosters.pop(chat, None)
+        self._pending.pop(chat, None)
+        self._failed.pop(chat, None)
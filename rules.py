@@ -0,0 +1,414 @@
+"""
+WePush 入站消息规则
+
+在消息进入适配器时对每条消息求值一次，决定是否转发到 MaiBot。
+规则从 JSON 文件（WX_RULES_FILE）加载，按顺序匹配，第一条匹配的规则决定结果：
+
+    {
+      "default": "allow",
+      "rules": [
+        {"action": "deny", "senders": ["广告号"]},
+        {"action": "deny", "keywords": ["加微信", "代购"]},
+        {"action": "deny", "chats": ["技术群"], "patterns": ["^\\\\[动画表情\\\\]$"]},
+        {"action": "allow", "chats": ["大群"], "mode": "mention"},
+        {"action": "allow", "chats": ["闲聊群"], "mode": "gate", "triggers": ["机器人"], "gated": "batch"}
+      ]
+    }
+
+规则中的条件都需满足才算匹配，省略的条件不限制：
+  - chats: 聊天名列表
+  - senders: 发送者列表
+  - keywords: 关键词列表（不区分大小写），patterns: 正则表达式列表，内容包含任一关键词或匹配任一正则即满足
+  - mode: 只对 allow 规则有效，"all"（默认）转发全部消息，"mention" 只转发 @ 了机器人的消息，
+    "gate" 立即转发 @ 了机器人、包含触发词(triggers)或在机器人回复后 follow_window 秒内的消息，
+    其余消息按 gated 处理："sample" 每 sample_rate 条转发 1 条，"batch" 攒够 batch_size 条或
+    batch_interval 秒后合并为一条上下文消息转发，"drop" 不转发
+
+系统消息、时间消息、撤回提示和自己发送的消息总是不转发。
+
+编译时按聊天名索引规则，所有规则的关键词合并为一个 Aho-Corasick 自动机，可以安全合并的正则
+（不含内联标志、反向引用、命名组和条件组）合并为一个预筛正则，每组以规则序号命名：
+没有命中时这些规则都不需要再匹配；命中时命中的那条规则直接确定，其余规则从命中位置开始匹配
+（任何一个正则都不可能在预筛的最左命中位置之前匹配）。不能合并的正则由各自的规则单独匹配。
+每个正则在编译规则时单独校验，错误的正则以 ValueError 报告所在的规则。
+"""
+
+import collections
+import json
+import os
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Pattern, Set
+
+ACTIONS = ('allow', 'deny')
+MODES = ('all', 'mention', 'gate')
+GATED = ('sample', 'batch', 'drop')
+# 不转发的消息类型：系统消息（含"以下为新消息"分隔）、时间、撤回提示、自己发送的消息
+SYSTEM_TYPES = frozenset(('sys', 'time', 'recall', 'self'))
+# 与其他正则合并后含义会改变或无法编译的写法：反向引用、命名组、条件组、全局内联标志
+_UNSAFE_PATTERN = re.compile(r'\\[1-9]|\\g<|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+class Decision(NamedTuple):
+    """规则求值结果
+
+    Attributes:
+        forward: 是否转发
+        reason: 不转发的原因（system/denied/no_mention/default），转发时为 'allowed' 或 'default'
+        rule: 匹配的规则序号，未匹配任何规则时为 None
+    """
+    forward: bool
+    reason: str
+    rule: Optional[int] = None
+
+
+class Gate(NamedTuple):
+    """gate 模式的参数"""
+    triggers: tuple
+    gated: str = 'batch'
+    sample_rate: int = 10
+    batch_size: int = 20
+    batch_interval: float = 60
+    follow_window: float = 120
+
+
+class Rule(NamedTuple):
+    action: str
+    chats: Optional[FrozenSet[str]]
+    senders: Optional[FrozenSet[str]]
+    keywords: tuple
+    patterns: tuple
+    mode: str
+    gate: Optional[Gate] = None
+    regexes: tuple = ()  # 与 patterns 一一对应的编译结果
+
+    @property
+    def has_content(self) -> bool:
+        return bool(self.keywords or self.patterns)
+
+
+class _AhoCorasick:
+    """多关键词匹配，一次扫描内容找出所有出现的关键词对应的规则"""
+
+    def __init__(self, keywords: Dict[str, Set[int]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[int]] = [frozenset()]
+        for word, ids in keywords.items():
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                node = nxt
+            self._out[node] = self._out[node] | frozenset(ids)
+
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] | self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> Set[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits |= out[node]
+        return hits
+
+
+def _combinable(pattern: str) -> bool:
+    """正则能否与其他正则合并而不改变含义，无法确定时视为不能合并"""
+    return _UNSAFE_PATTERN.search(pattern) is None
+
+
+def _names(value) -> Optional[FrozenSet[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    return frozenset(str(i) for i in value)
+
+
+def _strings(value) -> tuple:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    return tuple(str(i) for i in value if str(i))
+
+
+class RuleSet:
+    """编译后的规则集，创建后不再修改，热更新时整体替换
+
+    Args:
+        rules: 规则字典列表，格式见模块说明
+        default: 未匹配任何规则时的动作，'allow' 或 'deny'
+        nickname: 机器人的微信昵称，用于 mention 模式
+    """
+
+    def __init__(self, rules: Iterable[dict] = (), default: str = 'allow', nickname: Optional[str] = None):
+        if default not in ACTIONS:
+            raise ValueError(f"未知的默认动作: {default}")
+        self.default = default
+        self.nickname = nickname
+        self._mention = f'@{nickname}' if nickname else None
+        self.rules: List[Rule] = [self._compile_rule(index, rule) for index, rule in enumerate(rules)]
+
+        # 按聊天名索引：不限聊天的规则对所有聊天生效，与指定聊天的规则合并后保持原顺序
+        self._any_chat = [i for i, rule in enumerate(self.rules) if rule.chats is None]
+        self._by_chat: Dict[str, List[int]] = collections.defaultdict(list)
+        for i, rule in enumerate(self.rules):
+            for chat in rule.chats or ():
+                self._by_chat[chat].append(i)
+        self._candidates: Dict[str, tuple] = {}
+
+        keywords: Dict[str, Set[int]] = collections.defaultdict(set)
+        for i, rule in enumerate(self.rules):
+            for keyword in rule.keywords:
+                keywords[keyword.casefold()].add(i)
+        self._keywords = _AhoCorasick(keywords) if keywords else None
+
+        triggers: Dict[str, Set[int]] = collections.defaultdict(set)
+        for i, rule in enumerate(self.rules):
+            for trigger in rule.gate.triggers if rule.gate else ():
+                triggers[trigger.casefold()].add(i)
+        self._triggers = _AhoCorasick(triggers) if triggers else None
+
+        # 可以合并的正则：每条规则合并为一个，并放入预筛正则中以 r{序号} 命名的组；其余各自单独匹配
+        self._combined: Dict[int, Pattern] = {}
+        self._separate: Dict[int, tuple] = {}
+        for i, rule in enumerate(self.rules):
+            safe = [p for p in rule.patterns if _combinable(p)]
+            separate = [r for p, r in zip(rule.patterns, rule.regexes) if not _combinable(p)]
+            if safe:
+                try:
+                    self._combined[i] = re.compile('|'.join(f'(?:{p})' for p in safe))
+                except re.error:
+                    separate = list(rule.regexes)
+            if separate:
+                self._separate[i] = tuple(separate)
+        self._prefilter = None
+        if self._combined:
+            try:
+                self._prefilter = re.compile('|'.join(
+                    f'(?P<r{i}>{regex.pattern})' for i, regex in self._combined.items()))
+            except re.error:
+                self._separate.update((i, self.rules[i].regexes) for i in self._combined)
+                self._combined = {}
+
+    @staticmethod
+    def _compile_rule(index: int, rule: dict) -> Rule:
+        action = rule.get('action', 'deny')
+        mode = rule.get('mode', 'all')
+        if action not in ACTIONS:
+            raise ValueError(f"规则 {index}: 未知的动作 {action}")
+        if mode not in MODES:
+            raise ValueError(f"规则 {index}: 未知的模式 {mode}")
+        patterns = _strings(rule.get('patterns'))
+        regexes = []
+        for pattern in patterns:
+            try:
+                regexes.append(re.compile(pattern))
+            except re.error as e:
+                raise ValueError(f"规则 {index}: 正则表达式错误 {pattern!r}: {e}") from None
+        gate = None
+        if mode == 'gate':
+            try:
+                gate = Gate(
+                    triggers=_strings(rule.get('triggers')),
+                    gated=rule.get('gated', 'batch'),
+                    sample_rate=max(1, int(rule.get('sample_rate', 10))),
+                    batch_size=max(1, int(rule.get('batch_size', 20))),
+                    batch_interval=float(rule.get('batch_interval', 60)),
+                    follow_window=float(rule.get('follow_window', 120)),
+                )
+            except (TypeError, ValueError):
+                raise ValueError(f"规则 {index}: gate 参数必须为数字") from None
+            if gate.gated not in GATED:
+                raise ValueError(f"规则 {index}: 未知的 gated 处理方式 {gate.gated}")
+        return Rule(
+            action=action,
+            chats=_names(rule.get('chats')),
+            senders=_names(rule.get('senders')),
+            keywords=_strings(rule.get('keywords')),
+            patterns=patterns,
+            mode=mode,
+            gate=gate,
+            regexes=tuple(regexes),
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict, nickname: Optional[str] = None) -> 'RuleSet':
+        return cls(data.get('rules', []), data.get('default', 'allow'), nickname)
+
+    @classmethod
+    def load(cls, path: str, nickname: Optional[str] = None) -> 'RuleSet':
+        """从 JSON 文件加载规则，path 为空时返回只过滤系统消息的规则集"""
+        if not path:
+            return cls(nickname=nickname)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f), nickname)
+
+    def _rules_for(self, chat: str) -> tuple:
+        candidates = self._candidates.get(chat)
+        if candidates is None:
+            candidates = tuple(sorted(self._any_chat + self._by_chat.get(chat, [])))
+            self._candidates[chat] = candidates
+        return candidates
+
+    def mentions(self, content: str) -> bool:
+        """消息是否 @ 了机器人"""
+        return bool(self._mention) and self._mention in content
+
+    def evaluate(self, chat: str, sender: str, type: str, content: str,
+                 since_reply: Optional[float] = None) -> Decision:
+        """对一条消息求值
+
+        Args:
+            chat: 聊天名
+            sender: 发送者
+            type: 消息类型（sys/time/recall/self/friend）
+            content: 消息内容
+            since_reply: 距机器人在该聊天中上次回复的秒数，没有回复过时为 None，用于 gate 模式
+
+        Returns:
+            Decision: gate 模式下立即转发的原因为 mention/trigger/follow_up，
+                其余消息为 Decision(False, 'gated', 规则序号)，由 ContextGate 处理
+        """
+        if type in SYSTEM_TYPES or sender == 'Self':
+            return Decision(False, 'system')
+
+        keyword_hits = None
+        prefiltered = None  # 预筛正则的匹配结果，未匹配时为 False
+        for i in self._rules_for(chat):
+            rule = self.rules[i]
+            if rule.senders is not None and sender not in rule.senders:
+                continue
+            if rule.has_content:
+                matched = False
+                if rule.keywords:
+                    if keyword_hits is None:
+                        keyword_hits = self._keywords.search(content.casefold())
+                    matched = i in keyword_hits
+                if not matched and i in self._combined:
+                    if prefiltered is None:
+                        prefiltered = self._prefilter.search(content) or False
+                    if prefiltered:
+                        matched = prefiltered.group(f'r{i}') is not None or \
+                            self._combined[i].search(content, prefiltered.start()) is not None
+                if not matched and i in self._separate:
+                    matched = any(regex.search(content) for regex in self._separate[i])
+                if not matched:
+                    continue
+            if rule.action == 'deny':
+                return Decision(False, 'denied', i)
+            if rule.mode == 'mention' and not self.mentions(content):
+                return Decision(False, 'no_mention', i)
+            if rule.mode == 'gate':
+                return self._gate(i, rule.gate, content, since_reply)
+            return Decision(True, 'allowed', i)
+
+        if self.default == 'deny':
+            return Decision(False, 'default')
+        return Decision(True, 'default')
+
+    def _gate(self, index: int, gate: Gate, content: str, since_reply: Optional[float]) -> Decision:
+        if self.mentions(content):
+            return Decision(True, 'mention', index)
+        if gate.triggers and index in self._triggers.search(content.casefold()):
+            return Decision(True, 'trigger', index)
+        if since_reply is not None and since_reply <= gate.follow_window:
+            return Decision(True, 'follow_up', index)
+        return Decision(False, 'gated', index)
+
+
+class ContextGate:
+    """gate 模式中未立即转发的消息的抽样和合并，以及机器人最近回复的时间
+
+    状态按聊天保存，不随规则热更新重置；只在事件循环中使用，不加锁。
+    """
+
+    def __init__(self):
+        self._replied: Dict[str, float] = {}
+        self._counters: Dict[str, int] = {}
+        self._batches: Dict[str, tuple] = {}  # 聊天名 -> (Gate, 首条消息时间, [message_data])
+
+    def replied(self, chat: str, now: Optional[float] = None):
+        """记录机器人在该聊天中发送了回复"""
+        self._replied[chat] = time.monotonic() if now is None else now
+
+    def since_reply(self, chat: str, now: Optional[float] = None) -> Optional[float]:
+        """距机器人在该聊天中上次回复的秒数，没有回复过时返回 None"""
+        replied = self._replied.get(chat)
+        if replied is None:
+            return None
+        return (time.monotonic() if now is None else now) - replied
+
+    def offer(self, chat: str, message_data: dict, gate: Gate, now: Optional[float] = None) -> Optional[dict]:
+        """处理一条被拦下的消息
+
+        Returns:
+            dict: 需要转发的消息（抽中的消息或攒满的上下文消息），不需要转发时为 None
+        """
+        if gate.gated == 'drop':
+            return None
+        if gate.gated == 'sample':
+            count = self._counters.get(chat, 0)
+            self._counters[chat] = count + 1
+            if count % gate.sample_rate == 0:
+                return {**message_data, 'priority': 'sampled'}
+            return None
+        now = time.monotonic() if now is None else now
+        batch = self._batches.get(chat)
+        if batch is None:
+            batch = self._batches[chat] = (gate, now, [])
+        batch[2].append(message_data)
+        if len(batch[2]) >= gate.batch_size:
+            return self._flush(chat)
+        return None
+
+    def due(self, now: Optional[float] = None) -> List[dict]:
+        """取出已超过 batch_interval 的上下文消息"""
+        now = time.monotonic() if now is None else now
+        return [self._flush(chat) for chat, (gate, first, _) in list(self._batches.items())
+                if now - first >= gate.batch_interval]
+
+    def flush(self, chat: str) -> Optional[dict]:
+        """立即取出该聊天攒下的上下文消息，没有时返回 None"""
+        return self._flush(chat) if chat in self._batches else None
+
+    def _flush(self, chat: str) -> dict:
+        _, _, messages = self._batches.pop(chat)
+        last = messages[-1]
+        return {
+            **last,
+            'type': 'context',
+            'content': '\n'.join(f"{m['sender']}: {m['content']}" for m in messages),
+            'priority': 'context',
+            'count': len(messages),
+        }
+
+
+def rules_mtime(path: str) -> Optional[float]:
+    """规则文件的修改时间，文件不存在或未配置时返回 None"""
+    if not path:
+        return None
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
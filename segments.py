@@ -0,0 +1,85 @@
+"""
+MaiBot 回复消息段解析
+
+把 maim_message 的消息段（Seg 对象或字典，两种形式可以混用）一次遍历展开为按顺序排列的发送动作，
+嵌套的 seglist 按原顺序展开：
+  - text: 文本，相邻的文本和 @ 合并为一个动作，@ 的人放在 at 中（对应 SendMsg 的 at 参数）
+  - image / emoji: base64 图片数据
+  - file: 文件路径
+  - reply: 引用的消息 id，微信界面无法按 id 引用消息，由调用方记录
+  - unsupported: 其他类型，data 为类型名，由调用方记录
+
+Example:
+    >>> build_actions({'type': 'seglist', 'data': [
+    ...     {'type': 'text', 'data': '看'}, {'type': 'image', 'data': 'iVBOR...'}, {'type': 'text', 'data': '好看吗'}]})
+    [Action(kind='text', data='看', at=()), Action(kind='image', data='iVBOR...', at=()),
+     Action(kind='text', data='好看吗', at=())]
+"""
+
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+MEDIA_KINDS = ('image', 'emoji', 'file')
+
+
+class Action(NamedTuple):
+    """一个发送动作"""
+    kind: str
+    data: Any = None
+    at: tuple = ()
+
+
+def _fields(segment) -> Tuple[Optional[str], Any]:
+    if isinstance(segment, dict):
+        return segment.get('type'), segment.get('data')
+    return getattr(segment, 'type', None), getattr(segment, 'data', None)
+
+
+def iter_segments(segment) -> Iterator[Tuple[str, Any]]:
+    """按顺序遍历消息段的叶子节点，返回 (类型, 数据)，seglist 用显式栈展开"""
+    stack = [segment]
+    while stack:
+        segment = stack.pop()
+        if segment is None:
+            continue
+        type_, data = _fields(segment)
+        if type_ == 'seglist' and isinstance(data, (list, tuple)):
+            stack.extend(reversed(data))
+        else:
+            yield type_, data
+
+
+def build_actions(segment, resolve_at: Optional[Callable[[str], str]] = None) -> List[Action]:
+    """把消息段转换为发送动作列表
+
+    Args:
+        segment: 消息段，Seg 对象或字典
+        resolve_at: 把 at 消息段的数据（用户 id）转换为微信昵称的函数，默认原样使用
+    """
+    actions = []
+    text = []
+    at = []
+
+    def flush():
+        if text or at:
+            actions.append(Action('text', ''.join(text), tuple(at)))
+            text.clear()
+            at.clear()
+
+    for type_, data in iter_segments(segment):
+        if type_ == 'text':
+            if data:
+                text.append(str(data))
+        elif type_ == 'at':
+            if data:
+                at.append(resolve_at(str(data)) if resolve_at else str(data))
+        else:
+            flush()
+            if type_ in MEDIA_KINDS:
+                if data:
+                    actions.append(Action(type_, data))
+            elif type_ == 'reply':
+                actions.append(Action('reply', data))
+            else:
+                actions.append(Action('unsupported', type_))
+    flush()
+    return actions
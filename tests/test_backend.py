@@ -0,0 +1,57 @@
+import ast
+import os
+import warnings
+
+import pytest
+
+from wxauto.backend import ChatWndBackend, WeChatBackend
+from wxauto.simulator import SimChatWnd, SimWeChat
+
+WXAUTO = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'wxauto')
+
+
+def _classes():
+    """elements.py 和 wxauto.py 中的类：类名 -> (基类名, 方法名)，这两个模块依赖 Windows，不能导入"""
+    classes = {}
+    for filename in ('elements.py', 'wxauto.py'):
+        with open(os.path.join(WXAUTO, filename), encoding='utf-8') as f:
+            with warnings.catch_warnings():
+                # 原有代码中的正则字符串含有无效的转义序列
+                warnings.simplefilter('ignore', (DeprecationWarning, SyntaxWarning))
+                tree = ast.parse(f.read())
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                bases = [b.id for b in node.bases if isinstance(b, ast.Name)]
+                methods = {n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))}
+                classes[node.name] = (bases, methods)
+    return classes
+
+
+def _methods(classes, name):
+    bases, methods = classes.get(name, ((), set()))
+    methods = set(methods)
+    for base in bases:
+        methods |= _methods(classes, base)
+    return methods
+
+
+@pytest.mark.parametrize('name, interface', [('WeChat', WeChatBackend), ('ChatWnd', ChatWndBackend)])
+def test_uia_backend_implements_interface(name, interface):
+    classes = _classes()
+    assert interface.__name__ in classes[name][0]
+    missing = interface.__abstractmethods__ - _methods(classes, name)
+    assert not missing
+
+
+def test_simulator_implements_interface():
+    assert not SimWeChat.__abstractmethods__
+    assert not SimChatWnd.__abstractmethods__
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Incomplete(ChatWndBackend):
+        def _show(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,135 @@
+import json
+import os
+
+import pytest
+
+from wxauto.classify import ClassifyMessage, ClassifyMessages, ClassifyParam, MessageSnapshot
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'message_snapshots.json')
+
+with open(FIXTURES, encoding='utf-8') as f:
+    CASES = json.load(f)
+
+
+def expected(case):
+    sender, content, runtimeid = case['expected']
+    return [tuple(sender) if isinstance(sender, list) else sender, content, runtimeid]
+
+
+class _Rect:
+    def __init__(self, left, top, right, height):
+        self.left, self.top, self.right = left, top, right
+        self._height = height
+
+    def height(self):
+        return self._height
+
+
+class _Control:
+    def __init__(self, name, rect):
+        self.Name = name
+        self.BoundingRectangle = rect
+
+    def Exists(self, timeout=0):
+        return True
+
+
+class _Missing:
+    @property
+    def Name(self):
+        raise LookupError('控件不存在')
+
+    @property
+    def BoundingRectangle(self):
+        raise LookupError('控件不存在')
+
+    def Exists(self, timeout=0):
+        return False
+
+
+class _MessageItem:
+    """按快照模拟改造前 _split 用到的消息控件接口"""
+
+    def __init__(self, snapshot):
+        self.Name = snapshot.name
+        self.BoundingRectangle = _Rect(snapshot.left, 0, snapshot.right, snapshot.height)
+        self._runtimeid = snapshot.runtimeid
+        self._descendants = snapshot.descendants
+
+    def _find(self, kind, foundIndex):
+        found = [i for i in self._descendants if i[0] == kind]
+        if foundIndex > len(found):
+            return _Missing()
+        _, name, left, top = found[foundIndex - 1]
+        return _Control(name, _Rect(left, top, left, 0))
+
+    def ButtonControl(self, foundIndex=1):
+        return self._find('button', foundIndex)
+
+    def TextControl(self, foundIndex=1):
+        return self._find('text', foundIndex)
+
+    def GetRuntimeId(self):
+        return [self._runtimeid]
+
+
+def legacy_split(MsgItem):
+    """改造前 WeChatBase._split 的分类部分，逐个查询控件"""
+    MsgItemName = MsgItem.Name
+    if MsgItem.BoundingRectangle.height() == ClassifyParam.SYS_TEXT_HEIGHT:
+        Msg = ['SYS', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+    elif MsgItem.BoundingRectangle.height() == ClassifyParam.TIME_TEXT_HEIGHT:
+        Msg = ['Time', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+    elif MsgItem.BoundingRectangle.height() == ClassifyParam.RECALL_TEXT_HEIGHT:
+        if '撤回' in MsgItemName:
+            Msg = ['Recall', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+        else:
+            Msg = ['SYS', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+    else:
+        Index = 1
+        User = MsgItem.ButtonControl(foundIndex=Index)
+        try:
+            while True:
+                if User.Name == '':
+                    Index += 1
+                    User = MsgItem.ButtonControl(foundIndex=Index)
+                else:
+                    break
+            winrect = MsgItem.BoundingRectangle
+            mid = (winrect.left + winrect.right)/2
+            if User.BoundingRectangle.left < mid:
+                if MsgItem.TextControl().Exists(0.1) and MsgItem.TextControl().BoundingRectangle.top < User.BoundingRectangle.top:
+                    name = (User.Name, MsgItem.TextControl().Name)
+                else:
+                    name = (User.Name, User.Name)
+            else:
+                name = 'Self'
+            Msg = [name, MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+        except:
+            Msg = ['SYS', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+    return Msg
+
+
+@pytest.mark.parametrize('case', CASES, ids=[c['snapshot']['runtimeid'] for c in CASES])
+def test_classify_fixture(case):
+    snapshot = MessageSnapshot.FromDict(case['snapshot'])
+    assert ClassifyMessage(snapshot) == expected(case)
+
+
+def test_batch_matches_legacy_per_control_classification():
+    snapshots = [MessageSnapshot.FromDict(case['snapshot']) for case in CASES]
+    assert ClassifyMessages(snapshots) == [legacy_split(_MessageItem(s)) for s in snapshots]
+
+
+def test_snapshot_round_trips_through_dict():
+    for case in CASES:
+        assert MessageSnapshot.FromDict(case['snapshot']).ToDict() == case['snapshot']
+
+
+def test_custom_heights():
+    class Param(ClassifyParam):
+        TIME_TEXT_HEIGHT = 40
+
+    snapshot = MessageSnapshot(40, 0, 100, '12:00', '1')
+    assert ClassifyMessage(snapshot, Param) == ['Time', '12:00', '1']
+    assert ClassifyMessage(snapshot) == ['SYS', '12:00', '1']
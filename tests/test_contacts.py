@@ -0,0 +1,170 @@
+import pytest
+
+from wxauto.contacts import CollectFriends, ContactDirectory, FriendDetailCrawler
+
+
+class FakeContactList:
+    """按方向键逐个选中好友的通讯录界面，hang中的好友读取超时，flaky中的好友第一次读取出错"""
+
+    def __init__(self, friends, hang=(), flaky=()):
+        self.friends = list(friends)
+        self.index = 0
+        self.hang = set(hang)
+        self.flaky = set(flaky)
+        self.reads = 0
+        self.ops_after_timeout = 0
+        self.timed_out = False
+
+    def read(self):
+        if self.timed_out:
+            self.ops_after_timeout += 1
+        self.reads += 1
+        name = self.friends[self.index]
+        if name in self.hang:
+            self.timed_out = True
+            raise TimeoutError(name)
+        if name in self.flaky:
+            self.flaky.discard(name)
+            raise LookupError(name)
+        return {'昵称': name, '微信号': f'wx_{name}', '备注': ''}
+
+    def step(self):
+        if self.timed_out:
+            self.ops_after_timeout += 1
+        self.index = min(self.index + 1, len(self.friends) - 1)
+
+    def locate(self):
+        return self.index
+
+
+@pytest.fixture
+def directory():
+    directory = ContactDirectory(':memory:')
+    yield directory
+    directory.Close()
+
+
+def friend(nickname, remark=None, tags=None):
+    return {'nickname': nickname, 'remark': remark, 'tags': tags}
+
+
+def test_overlapping_pages_are_deduplicated_but_namesakes_are_kept():
+    pages = [
+        [friend('Alice'), friend('张三'), friend('张三')],
+        [friend('张三'), friend('张三'), friend('张三', tags=['同事']), friend('李四')],
+        [friend('李四')],
+        [friend('不会读到')],
+    ]
+    friends = list(CollectFriends(iter(pages)).values())
+    assert friends == [friend('Alice'), friend('张三'), friend('张三'), friend('张三', tags=['同事']), friend('李四')]
+
+
+def test_complete_harvest_keeps_namesakes_and_removes_deleted(directory):
+    directory.Harvest([[friend('张三'), friend('张三'), friend('李四', '老李')]])
+    assert len(directory) == 3
+    directory.Harvest([[friend('张三'), friend('李四', '老李')]])
+    assert directory.All() == [friend('张三'), friend('李四', '老李')]
+    # 搜索结果只更新不删除
+    directory.Harvest([[friend('王五')]], complete=False)
+    assert len(directory) == 3
+
+
+def test_search_prefix_and_contains(directory):
+    directory.Save([friend('Zhang_San'), friend('李四', '老李同学'), friend('100%真')])
+    assert directory.Search('zhang') == [friend('Zhang_San')]
+    assert directory.Search('同学') == []
+    assert directory.Search('同学', contains=True) == [friend('李四', '老李同学')]
+    assert directory.Search('_S', contains=True) == [friend('Zhang_San')]
+    assert directory.Search('%', contains=True) == [friend('100%真')]
+
+
+def crawl(directory, ui, n=None, **kwargs):
+    ui.index = 0
+    ui.timed_out = False
+    return FriendDetailCrawler(directory, ui.read, ui.step, ui.locate, **kwargs).Run(n)
+
+
+def names(directory):
+    return [info['昵称'] for info in directory.Details()]
+
+
+def test_resumes_from_checkpoint(directory):
+    ui = FakeContactList('abcde')
+    assert crawl(directory, ui, n=2)['position'] == 2
+    ui.reads = 0
+    stats = crawl(directory, ui)
+    assert stats['complete'] and stats['read'] == 3
+    # c, d, e 各读一次，到达末尾时再读一次 e
+    assert ui.reads == 4
+    assert names(directory) == list('abcde')
+    assert directory.GetCheckpoint(FriendDetailCrawler.CHECKPOINT) is None
+
+
+def test_fresh_entries_are_skipped_and_stale_ones_refreshed(directory):
+    ui = FakeContactList('abc')
+    crawl(directory, ui)
+    ui.reads = 0
+    assert crawl(directory, ui)['skipped'] == 3
+    assert ui.reads == 1
+    ui.reads = 0
+    assert crawl(directory, ui, max_age=0)['read'] == 3
+
+
+def test_timeout_marks_bad_and_stops_without_touching_the_ui(directory):
+    ui = FakeContactList('abcd', hang='b')
+    stats = crawl(directory, ui)
+    assert stats['bad'] == 1 and not stats['complete']
+    assert ui.ops_after_timeout == 0
+    assert directory.DetailAt(1)['status'] == 'bad'
+    # 再次调用时跳过超时的好友
+    stats = crawl(directory, ui)
+    assert stats['complete']
+    assert names(directory) == list('acd')
+    assert crawl(directory, ui, retry_bad=True)['bad'] == 1
+
+
+def test_bad_last_friend_is_never_read_again(directory):
+    ui = FakeContactList('abc', hang='c')
+    stats = crawl(directory, ui)
+    assert stats['bad'] == 1 and stats['position'] == 3
+    for _ in range(3):
+        ui.reads = 0
+        stats = crawl(directory, ui)
+        assert stats['complete'] and stats['bad'] == 0 and stats['position'] == 3
+        assert ui.reads == 0
+    assert names(directory) == list('ab')
+    assert directory.DetailAt(2)['status'] == 'bad'
+    assert directory.DetailAt(3) is None
+
+
+def test_bad_friend_in_the_middle_does_not_end_the_list(directory):
+    ui = FakeContactList('abcd', hang='b')
+    crawl(directory, ui)
+    stats = crawl(directory, ui)
+    assert stats['complete'] and stats['read'] == 2
+    assert names(directory) == list('acd')
+
+
+def test_other_errors_are_retried_not_marked_bad(directory):
+    ui = FakeContactList('abc', flaky='b')
+    stats = crawl(directory, ui)
+    assert stats['complete'] and stats['errors'] == 0
+    assert names(directory) == list('abc')
+
+
+
+def test_persistent_errors_stop_without_marking_bad(directory):
+    def read():
+        raise LookupError('找不到控件')
+
+    ui = FakeContactList('abc')
+    stats = FriendDetailCrawler(directory, read, ui.step, retries=1).Run()
+    assert stats['errors'] == 3 and stats['bad'] == 0 and not stats['complete']
+    assert directory.DetailAt(0) is None
+    assert directory.GetCheckpoint(FriendDetailCrawler.CHECKPOINT) == (0, None)
+
+
+def test_inserted_friend_invalidates_later_positions(directory):
+    crawl(directory, FakeContactList('abcd'))
+    crawl(directory, FakeContactList('abXcd'), max_age=0)
+    assert names(directory) == list('abXcd')
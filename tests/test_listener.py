@@ -0,0 +1,167 @@
+import asyncio
+import base64
+import os
+
+import pytest
+
+import wx_Listener
+from config import ListenConfig
+from segments import Action
+from wxauto.simulator import SimWeChat
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 8
+JPG = b'\xff\xd8\xff\xe0' + b'\0' * 8
+
+
+@pytest.fixture
+def wx():
+    wx = SimWeChat(sessions=['张三'])
+    wx.AddListenChat('张三')
+    return wx
+
+
+@pytest.fixture
+def listener(wx, tmp_path, monkeypatch):
+    monkeypatch.setattr(wx_Listener, 'SEND_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(wx_Listener.WeChatListener, 'SEND_RETRY_DELAY', 0)
+    return wx_Listener.WeChatListener(wx=wx)
+
+
+def image(data):
+    return Action('image', base64.b64encode(data).decode())
+
+
+def sent(wx):
+    return [msg.content for who, msg in wx.sent]
+
+
+def test_adjacent_images_and_files_are_batched(listener, tmp_path):
+    doc = tmp_path / 'a.txt'
+    doc.write_text('a')
+    parts = listener._prepare_parts([image(PNG), Action('file', str(doc)), image(JPG)])
+    assert len(parts) == 1
+    kind, files, at = parts[0]
+    assert kind == 'files' and at is None
+    assert [os.path.splitext(f)[1] for f in files] == ['.png', '.txt', '.jpg']
+    assert all(os.path.exists(f) for f in files)
+
+
+def test_text_keeps_its_position_between_batches(listener):
+    parts = listener._prepare_parts([
+        image(PNG), Action('text', '看图', ('李四',)), image(JPG), image(PNG), Action('text', '完'),
+    ])
+    assert [(kind, len(data) if kind == 'files' else data, at) for kind, data, at in parts] == [
+        ('files', 1, None), ('text', '看图', ['李四']), ('files', 2, None), ('text', '完', None),
+    ]
+
+
+def test_reply_and_unsupported_segments_are_skipped(listener, tmp_path):
+    parts = listener._prepare_parts([
+        Action('reply', '123'), image(PNG), Action('reply', '456'), Action('record', 'x.amr'),
+        Action('file', str(tmp_path / 'missing.txt')), image(JPG), Action('text', '好'),
+    ])
+    assert [kind for kind, data, at in parts] == ['files', 'text']
+    assert len(parts[0][1]) == 2
+
+
+def test_identical_images_are_cached_once(listener):
+    first, = listener._prepare_parts([image(PNG)])
+    second, = listener._prepare_parts([image(PNG)])
+    assert first[1] == second[1]
+    assert len(os.listdir(wx_Listener.SEND_CACHE_DIR)) == 1
+
+
+def test_reply_is_sent_in_order(listener, wx):
+    assert listener._sync_send_wechat_reply('张三', [Action('text', '一'), image(PNG), Action('text', '二')])
+    assert sent(wx)[0] == '一' and sent(wx)[1].startswith('[文件]') and sent(wx)[2] == '二'
+
+
+def test_retry_sends_only_the_remaining_parts(listener, wx):
+    calls = []
+
+    def latency(op, n):
+        if op == 'send':
+            calls.append(op)
+            if len(calls) == 2:
+                raise RuntimeError('粘贴失败')
+        return 0
+
+    wx.latency = latency
+    actions = [Action('text', '一'), Action('text', '二'), Action('text', '三')]
+    assert listener._sync_send_wechat_reply('张三', actions)
+    assert sent(wx) == ['一', '二', '三']
+
+
+def test_failure_before_any_part_retries_everything(listener, wx, monkeypatch):
+    show = wx.listen['张三']._show
+    failures = [RuntimeError('窗口未响应')]
+
+    def flaky_show():
+        if failures:
+            raise failures.pop()
+        show()
+
+    monkeypatch.setattr(wx.listen['张三'], '_show', flaky_show)
+    assert listener._sync_send_wechat_reply('张三', [Action('text', '一'), Action('text', '二')])
+    assert sent(wx) == ['一', '二']
+
+
+def test_closed_window_is_not_retried(listener, wx):
+    wx.CloseWindow('张三')
+    assert not listener._sync_send_wechat_reply('张三', [Action('text', '一')])
+    assert wx.ops['send'] == 0
+
+
+def config(listener, chats, excluded=()):
+    return ListenConfig(list(chats), False, list(excluded), listener.rules_file)
+
+
+@pytest.fixture
+def groups():
+    wx = SimWeChat(sessions={'群A': ['甲', '乙'], '群B': ['丙'], '群C': ['丁']})
+    listener = wx_Listener.WeChatListener(target_chats=['群A', '群B'], wx=wx)
+    asyncio.run(listener._setup_listen_chats())
+    assert listener.listen_chats == {'群A', '群B'}
+    return wx, listener
+
+
+def test_apply_config_adds_and_removes_only_changed_chats(groups):
+    wx, listener = groups
+    chat_a = wx.listen['群A']
+    listener.roster.update('群B', ['丙'])
+    asyncio.run(listener.apply_config(config(listener, ['群A', '群C'])))
+    assert listener.listen_chats == {'群A', '群C'}
+    assert set(wx.listen) == {'群A', '群C'}
+    assert wx.listen['群A'] is chat_a
+    assert '群B' not in wx.windows
+    assert listener.roster.get('群B') is None
+
+
+def test_excluded_chats_are_removed(groups):
+    wx, listener = groups
+    asyncio.run(listener.apply_config(config(listener, ['群A', '群B'], excluded=['群B'])))
+    assert listener.listen_chats == {'群A'}
+    assert listener.excluded_chats == {'群B'}
+
+
+def test_watch_config_recovers_from_a_bad_config(groups, monkeypatch):
+    wx, listener = groups
+    mtimes = iter([1, 1, 2])
+    loads = [ValueError('WX_TARGET_CHATS格式错误'), config(listener, ['群C'])]
+
+    def load_listen_config():
+        result = loads.pop(0)
+        if not loads:
+            listener.running = False
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(wx_Listener, 'WX_CONFIG_RELOAD_INTERVAL', 0)
+    monkeypatch.setattr(wx_Listener, 'config_mtime', lambda: next(mtimes))
+    monkeypatch.setattr(wx_Listener, 'load_listen_config', load_listen_config)
+    listener._config_mtime = 0
+    listener.running = True
+    asyncio.run(asyncio.wait_for(listener._watch_config(), 5))
+    assert listener.listen_chats == {'群C'}
+    assert set(wx.listen) == {'群C'}
@@ -0,0 +1,58 @@
+import pytest
+
+from roster import RETRY_INTERVAL, RosterCache
+
+
+def test_classification_falls_back_to_sender_until_fetched():
+    roster = RosterCache()
+    assert roster.is_group('张三', sender='张三') is False
+    assert roster.is_group('家庭群', sender='妈妈') is True
+    roster.update('张三', [])
+    assert roster.is_group('张三', sender='李四') is False
+
+
+def test_members_and_canonical_names():
+    roster = RosterCache()
+    roster.update('群', ['Alice Smith', '张三'])
+    assert roster.is_group('群')
+    assert roster.members('群') == {'Alice Smith', '张三'}
+    assert roster.canonical('群', 'alice  smith') == 'Alice Smith'
+    assert roster.canonical('群', '路人') == '路人'
+
+
+def test_observe_queues_once_and_refreshes_after_ttl():
+    roster = RosterCache(ttl=100)
+    roster.observe('群', 'friend', 'hi', now=0)
+    roster.observe('群', 'friend', 'hi', now=1)
+    assert roster.next_pending() == '群'
+    assert roster.next_pending() is None
+    roster.update('群', ['a'], now=1)
+    roster.observe('群', 'friend', 'hi', now=50)
+    assert roster.next_pending() is None
+    roster.observe('群', 'friend', 'hi', now=200)
+    assert roster.next_pending() == '群'
+
+
+def test_join_message_invalidates_but_keeps_old_roster():
+    roster = RosterCache()
+    roster.update('群', ['a'])
+    roster.observe('群', 'sys', '"b"加入了群聊')
+    assert roster.next_pending() == '群'
+    assert roster.members('群') == {'a'}
+
+
+def test_failure_is_not_cached_and_retried_after_interval():
+    roster = RosterCache(ttl=100)
+    roster.update('群', ['a'], now=0)
+    roster.failed('群', now=150)
+    roster.observe('群', 'friend', 'hi', now=151)
+    assert roster.next_pending() is None
+    # 失败不改变已有名单
+    assert roster.is_group('群')
+    roster.observe('群', 'friend', 'hi', now=150 + RETRY_INTERVAL)
+    assert roster.next_pending() == '群'
+
+
+def test_update_rejects_none():
+    with pytest.raises(ValueError):
+        RosterCache().update('群', None)
@@ -0,0 +1,85 @@
+import pytest
+
+from rules import ContextGate, Decision, RuleSet
+
+
+def evaluate(ruleset, content, chat='群', sender='张三', type='friend', since_reply=None):
+    return ruleset.evaluate(chat, sender, type, content, since_reply)
+
+
+def test_system_messages_are_never_forwarded():
+    ruleset = RuleSet([{'action': 'allow'}])
+    assert evaluate(ruleset, '以下为新消息', type='sys') == Decision(False, 'system')
+    assert evaluate(ruleset, '你好', sender='Self') == Decision(False, 'system')
+
+
+def test_first_matching_rule_wins():
+    ruleset = RuleSet([
+        {'action': 'deny', 'senders': ['广告号']},
+        {'action': 'deny', 'keywords': ['代购']},
+        {'action': 'allow', 'chats': ['大群'], 'mode': 'mention'},
+    ], default='deny', nickname='小麦')
+    assert evaluate(ruleset, '你好', sender='广告号') == Decision(False, 'denied', 0)
+    assert evaluate(ruleset, '专业代购', chat='大群') == Decision(False, 'denied', 1)
+    assert evaluate(ruleset, '你好', chat='大群') == Decision(False, 'no_mention', 2)
+    assert evaluate(ruleset, '@小麦 你好', chat='大群') == Decision(True, 'allowed', 2)
+    assert evaluate(ruleset, '你好', chat='别的群') == Decision(False, 'default')
+
+
+def test_keywords_ignore_case():
+    ruleset = RuleSet([{'action': 'deny', 'keywords': ['Spam', '加微信']}])
+    assert not evaluate(ruleset, 'no SPAM here').forward
+    assert not evaluate(ruleset, '请加微信').forward
+    assert evaluate(ruleset, 'hello').forward
+
+
+@pytest.mark.parametrize('pattern, content', [
+    ('(?i)spam', 'SPAM'),
+    (r'(a)\1', 'xaa'),
+    ('(?P<word>q)z', 'qz'),
+    ('(?<=x)y', 'xy'),
+    ('^abc$', 'abc'),
+])
+def test_patterns_that_cannot_be_combined_still_match(pattern, content):
+    # 放在其他正则规则之后，合并时组号和全局标志会受影响
+    ruleset = RuleSet([
+        {'action': 'deny', 'patterns': ['(k)j', '(?P<word>w)']},
+        {'action': 'deny', 'patterns': [pattern]},
+    ])
+    assert evaluate(ruleset, content) == Decision(False, 'denied', 1)
+    assert evaluate(ruleset, 'nothing') == Decision(True, 'default')
+
+
+def test_later_rule_matches_after_prefilter_hit_of_another_rule():
+    ruleset = RuleSet([
+        {'action': 'deny', 'chats': ['别的群'], 'patterns': ['foo']},
+        {'action': 'deny', 'patterns': ['o+b']},
+    ])
+    assert evaluate(ruleset, 'foobar') == Decision(False, 'denied', 1)
+    assert evaluate(ruleset, 'foo') == Decision(True, 'default')
+
+
+@pytest.mark.parametrize('rules', [
+    [{'action': 'deny', 'patterns': ['(']}],
+    [{'action': 'block'}],
+    [{'action': 'allow', 'mode': 'gate', 'gated': 'keep'}],
+])
+def test_invalid_rules_name_the_rule(rules):
+    with pytest.raises(ValueError, match='规则 0'):
+        RuleSet(rules)
+
+
+def test_gate_batches_untriggered_messages():
+    ruleset = RuleSet([{'action': 'allow', 'mode': 'gate', 'triggers': ['机器人'],
+                        'gated': 'batch', 'batch_size': 2, 'follow_window': 10}], nickname='小麦')
+    assert evaluate(ruleset, '叫一下机器人') == Decision(True, 'trigger', 0)
+    assert evaluate(ruleset, '@小麦 在吗') == Decision(True, 'mention', 0)
+    assert evaluate(ruleset, '继续聊', since_reply=5) == Decision(True, 'follow_up', 0)
+    assert evaluate(ruleset, '闲聊', since_reply=50) == Decision(False, 'gated', 0)
+
+    gate = ContextGate()
+    settings = ruleset.rules[0].gate
+    assert gate.offer('群', {'sender': 'a', 'content': '1'}, settings, now=0) is None
+    batch = gate.offer('群', {'sender': 'b', 'content': '2'}, settings, now=1)
+    assert batch['type'] == 'context' and batch['count'] == 2
+    assert batch['content'] == 'a: 1\nb: 2'
@@ -0,0 +1,46 @@
+from segments import Action, build_actions, iter_segments
+
+
+class Seg:
+    def __init__(self, type, data):
+        self.type = type
+        self.data = data
+
+
+def test_nested_seglists_keep_order():
+    segment = {'type': 'seglist', 'data': [
+        {'type': 'text', 'data': '一'},
+        {'type': 'seglist', 'data': [{'type': 'image', 'data': 'img'}, {'type': 'text', 'data': '二'}]},
+        {'type': 'file', 'data': 'a.txt'},
+    ]}
+    assert list(iter_segments(segment)) == [('text', '一'), ('image', 'img'), ('text', '二'), ('file', 'a.txt')]
+
+
+def test_adjacent_text_and_at_are_merged():
+    segment = Seg('seglist', [Seg('at', '10001'), {'type': 'text', 'data': ' 你好'}, Seg('text', '！')])
+    actions = build_actions(segment, resolve_at={'10001': '张三'}.get)
+    assert actions == [Action('text', ' 你好！', ('张三',))]
+
+
+def test_media_reply_and_unsupported_split_text():
+    segment = {'type': 'seglist', 'data': [
+        {'type': 'reply', 'data': 'msg-1'},
+        {'type': 'text', 'data': '看'},
+        {'type': 'emoji', 'data': 'gif'},
+        {'type': 'image', 'data': ''},
+        {'type': 'voice', 'data': 'amr'},
+        {'type': 'text', 'data': '好看吗'},
+    ]}
+    assert build_actions(segment) == [
+        Action('reply', 'msg-1'),
+        Action('text', '看'),
+        Action('emoji', 'gif'),
+        Action('unsupported', 'voice'),
+        Action('text', '好看吗'),
+    ]
+
+
+def test_empty_segments():
+    assert build_actions(None) == []
+    assert build_actions({'type': 'seglist', 'data': []}) == []
+    assert build_actions({'type': 'text', 'data': ''}) == []
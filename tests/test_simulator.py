@@ -0,0 +1,22 @@
+from wxauto.simulator import SimWeChat
+
+
+def test_first_messages_in_an_empty_window_are_new():
+    wx = SimWeChat(sessions=['张三'])
+    wx.AddListenChat('张三')
+    chat = wx.listen['张三']
+    assert chat.usedmsgid == []
+    wx.Receive('张三', '在吗')
+    assert [m.content for m in chat.GetNewMessage() if m.type == 'friend'] == ['在吗']
+    assert chat.GetNewMessage() == []
+
+
+def test_existing_messages_are_not_returned():
+    wx = SimWeChat(sessions=['张三'])
+    wx.Receive('张三', '旧消息')
+    wx.AddListenChat('张三')
+    chat = wx.listen['张三']
+    assert chat.GetNewMessage() == []
+    wx.Receive('张三', '新消息')
+    assert [m.content for m in chat.GetNewMessage()] == ['新消息']
+
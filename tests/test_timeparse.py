@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+from wxauto.timeparse import CacheInfo, ClearCache, ParseTime, ParseTimes
+
+# 2024-05-02 是星期四
+NOW = datetime(2024, 5, 2, 10, 0)
+
+
+@pytest.mark.parametrize('label, expected', [
+    ('12:30', '2024-05-02 12:30:00'),
+    ('9:05:07', '2024-05-02 09:05:07'),
+    ('昨天 9:05', '2024-05-01 09:05:00'),
+    ('前天 23:59', '2024-04-30 23:59:00'),
+    ('星期一 8:00', '2024-04-29 08:00:00'),
+    ('週四 8:00', '2024-05-02 08:00:00'),
+    ('下午 3:15', '2024-05-02 15:15:00'),
+    ('凌晨 12:10', '2024-05-02 00:10:00'),
+    ('Yesterday 1:05 PM', '2024-05-01 13:05:00'),
+    ('Tuesday 12:00 AM', '2024-04-30 00:00:00'),
+    ('2023年12月31日 18:00', '2023-12-31 18:00:00'),
+    ('12月31日 18:00', '2023-12-31 18:00:00'),
+    ('4月30日 下午 6:00', '2024-04-30 18:00:00'),
+    ('2024/1/2 7:08', '2024-01-02 07:08:00'),
+    ('Jan 2, 2024 7:08 AM', '2024-01-02 07:08:00'),
+    ('2 Jan 2024 19:08', '2024-01-02 19:08:00'),
+])
+def test_labels(label, expected):
+    assert ParseTime(label, now=NOW) == expected
+
+
+@pytest.mark.parametrize('label', ['', 'abc', '25:00', '2月30日 10:00'])
+def test_unparsable_labels_return_none(label):
+    assert ParseTime(label, now=NOW) is None
+
+
+def test_batch_uses_one_reference_time_and_parses_duplicates_once():
+    ClearCache()
+    labels = ['12:30', '12:30', 'Yesterday 1:05 PM', 'abc', None]
+    assert ParseTimes(labels, now=NOW) == [
+        '2024-05-02 12:30:00', '2024-05-02 12:30:00', '2024-05-01 13:05:00', None, None,
+    ]
+    assert CacheInfo().misses == 3
@@ -0,0 +1,53 @@
+import asyncio
+
+from transport import InboundMessage, NativeTransport, _socketio_url, decode_message
+
+
+class FakeSocket:
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.frames:
+            raise StopAsyncIteration
+        return self.frames.pop(0)
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+
+def test_socketio_url():
+    assert _socketio_url('ws://127.0.0.1:8000/ws') == 'ws://127.0.0.1:8000/ws/?EIO=4&transport=websocket'
+    assert _socketio_url('https://example.com') == 'wss://example.com/ws/?EIO=4&transport=websocket'
+
+
+def test_decode_message():
+    message = decode_message({
+        'message_info': {'platform': 'wx', 'user_info': {'user_id': '1'}},
+        'message_segment': {'type': 'text', 'data': 'hi'},
+    })
+    assert isinstance(message, InboundMessage)
+    assert message.message_info.user_info.user_id == '1'
+    assert message.message_info.group_info is None
+    assert decode_message({'custom': 1}) == {'custom': 1}
+
+
+def test_session_skips_binary_frames_and_dispatches_messages():
+    received = []
+    transport = NativeTransport('ws://127.0.0.1:8000/ws', 'wx')
+    transport.register_class_handler(received.append)
+    ws = FakeSocket([
+        b'\x04binary',
+        '2',
+        '42["message",{"message_info":{"platform":"wx"},"message_segment":{"type":"text","data":"hi"}}]',
+        '42["other",{}]',
+        'not json',
+    ])
+    asyncio.run(transport._session(ws))
+    assert ws.sent == ['3']
+    assert len(received) == 1
+    assert received[0].message_segment == {'type': 'text', 'data': 'hi'}
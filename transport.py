@@ -0,0 +1,251 @@
+"""
+WePush 原生 WebSocket 传输
+
+MAIBOT_TRANSPORT=native 时代替 maim_message.Router，直接基于 websockets 连接 MaiBot：
+  - 协议与 Router 使用的 maim_message WebSocket 客户端兼容：Socket.IO（Engine.IO v4）的 websocket 传输，
+    连接时带 platform 和 Authorization 请求头，消息为 "message" 事件，服务端无需任何改动
+  - 安装了 orjson 时用 orjson 编解码 JSON，否则使用标准库 json
+  - 收到的消息解码为带 __slots__ 的轻量对象（与 MessageBase 的属性名相同），消息段保持字典，
+    由 segments.build_actions 直接遍历，不构造 MessageBase/Seg
+  - 发送的消息编码后放入队列，由写出任务连续写出，调用方不等待网络写出；断线期间的消息在重连后发出
+  - 启用 permessage-deflate 压缩（服务端支持时）
+
+与 Router 提供相同的接口：register_class_handler、run、stop、send_message、check_connection。
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Engine.IO / Socket.IO 报文类型
+_EIO_OPEN = '0'
+_EIO_CLOSE = '1'
+_EIO_PING = '2'
+_EIO_PONG = '3'
+_SIO_CONNECT = '40'
+_SIO_DISCONNECT = '41'
+_SIO_EVENT = '42'
+_SIO_CONNECT_ERROR = '44'
+
+
+class UserInfo:
+    __slots__ = ('platform', 'user_id', 'user_nickname', 'user_cardname')
+
+    def __init__(self, data: dict):
+        self.platform = data.get('platform')
+        self.user_id = data.get('user_id')
+        self.user_nickname = data.get('user_nickname')
+        self.user_cardname = data.get('user_cardname')
+
+
+class GroupInfo:
+    __slots__ = ('platform', 'group_id', 'group_name')
+
+    def __init__(self, data: dict):
+        self.platform = data.get('platform')
+        self.group_id = data.get('group_id')
+        self.group_name = data.get('group_name')
+
+
+class MessageInfo:
+    __slots__ = ('platform', 'message_id', 'time', 'user_info', 'group_info', 'additional_config')
+
+    def __init__(self, data: dict):
+        self.platform = data.get('platform')
+        self.message_id = data.get('message_id')
+        self.time = data.get('time')
+        user_info = data.get('user_info')
+        group_info = data.get('group_info')
+        self.user_info = UserInfo(user_info) if user_info else None
+        self.group_info = GroupInfo(group_info) if group_info else None
+        self.additional_config = data.get('additional_config')
+
+
+class InboundMessage:
+    """MaiBot 发来的消息，message_segment 为原始字典"""
+    __slots__ = ('message_info', 'message_segment', 'raw_message')
+
+    def __init__(self, data: dict):
+        self.message_info = MessageInfo(data.get('message_info') or {})
+        self.message_segment = data.get('message_segment')
+        self.raw_message = data.get('raw_message')
+
+
+def decode_message(data: Any):
+    """把 "message" 事件的数据解码为 InboundMessage，不是普通消息（如自定义消息）时原样返回"""
+    if isinstance(data, dict) and 'message_info' in data and 'message_segment' in data:
+        return InboundMessage(data)
+    return data
+
+
+def _socketio_url(url: str) -> str:
+    """把 MaiBot 地址转换为 Socket.IO 的 websocket 传输地址，路径与 Router 相同（默认 /ws）"""
+    parts = urlsplit(url)
+    scheme = {'http': 'ws', 'https': 'wss'}.get(parts.scheme, parts.scheme)
+    path = (parts.path or '/ws').rstrip('/') + '/'
+    return urlunsplit((scheme, parts.netloc, path, 'EIO=4&transport=websocket', ''))
+
+
+class NativeTransport:
+    """直接基于 websockets 的 MaiBot 连接
+
+    Args:
+        url: MaiBot WebSocket 地址，与 Router 的 TargetConfig.url 相同
+        platform: 平台标识
+        token: 访问令牌
+        queue_size: 发送队列长度，队列满时 send_message 等待
+        reconnect_delay: 断线重连的最大等待时间（秒）
+    """
+
+    def __init__(self, url: str, platform: str, token: Optional[str] = None,
+                 queue_size: int = 1000, reconnect_delay: float = 10.0):
+        self.url = _socketio_url(url)
+        self.platform = platform
+        self.headers = {'platform': platform}
+        if token:
+            self.headers['Authorization'] = str(token)
+        self.reconnect_delay = reconnect_delay
+        self.handlers: List[Callable] = []
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._pending: Optional[str] = None  # 写出失败、重连后优先发出的报文
+        self._ws = None
+        self._connected = False
+        self._running = False
+        self._tasks = set()
+
+    def register_class_handler(self, handler: Callable):
+        self.handlers.append(handler)
+
+    def check_connection(self, platform: str = None) -> bool:
+        return self._connected
+
+    async def send_message(self, message) -> bool:
+        """编码消息并放入发送队列
+
+        Args:
+            message: MessageBase 或字典
+        """
+        data = message.to_dict() if hasattr(message, 'to_dict') else message
+        await self._queue.put(_SIO_EVENT + _dumps(['message', data]))
+        return True
+
+    async def run(self):
+        """连接并保持连接，断线后按 1, 2, 4...reconnect_delay 秒的间隔重连"""
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import WebSocketException
+
+        self._running = True
+        delay = 1.0
+        while self._running:
+            try:
+                async with connect(self.url, additional_headers=self.headers, compression='deflate',
+                                   max_size=None, ping_interval=None) as ws:
+                    self._ws = ws
+                    await self._handshake(ws)
+                    delay = 1.0
+                    logger.info("已连接到 MaiBot（原生传输）: %s", self.url)
+                    await self._session(ws)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, WebSocketException, ConnectionError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"MaiBot 连接断开（原生传输）: {str(e)}")
+            finally:
+                self._connected = False
+                self._ws = None
+            if self._running:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_delay)
+
+    async def stop(self):
+        self._running = False
+        if self._ws is not None:
+            try:
+                await self._ws.send(_SIO_DISCONNECT)
+            except Exception:
+                pass
+            await self._ws.close()
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _handshake(self, ws):
+        frame = await asyncio.wait_for(ws.recv(), 10)
+        if not isinstance(frame, str) or not frame.startswith(_EIO_OPEN):
+            raise ValueError(f"握手失败: {frame[:100]}")
+        await ws.send(_SIO_CONNECT)
+        while True:
+            frame = await asyncio.wait_for(ws.recv(), 10)
+            if not isinstance(frame, str):
+                raise ValueError("握手失败: 收到二进制帧")
+            if frame == _EIO_PING:
+                await ws.send(_EIO_PONG)
+            elif frame.startswith(_SIO_CONNECT):
+                self._connected = True
+                return
+            elif frame.startswith(_SIO_CONNECT_ERROR):
+                raise ConnectionError(f"MaiBot 拒绝连接: {frame[2:]}")
+            else:
+                raise ValueError(f"握手失败: {frame[:100]}")
+
+    async def _session(self, ws):
+        writer = asyncio.create_task(self._write(ws))
+        try:
+            async for frame in ws:
+                if not isinstance(frame, str):
+                    # Engine.IO v4 的二进制帧只用于二进制附件，MaiBot 的消息都是文本帧
+                    logger.debug("忽略二进制帧: %d 字节", len(frame))
+                    continue
+                if frame == _EIO_PING:
+                    await ws.send(_EIO_PONG)
+                elif frame.startswith(_SIO_EVENT):
+                    self._dispatch(frame)
+                elif frame.startswith(_SIO_DISCONNECT) or frame == _EIO_CLOSE:
+                    logger.info("MaiBot 关闭了连接")
+                    return
+        finally:
+            writer.cancel()
+
+    async def _write(self, ws):
+        """连续写出发送队列中的报文，写出失败的报文在重连后优先发出"""
+        while True:
+            if self._pending is None:
+                self._pending = await self._queue.get()
+            await ws.send(self._pending)
+            self._pending = None
+
+    def _dispatch(self, frame: str):
+        # 42[ack id]["message", data]
+        start = 2
+        while start < len(frame) and frame[start].isdigit():
+            start += 1
+        try:
+            event = _loads(frame[start:])
+        except ValueError:
+            logger.warning("无法解析的消息: %.100s", frame)
+            return
+        if not isinstance(event, list) or len(event) < 2 or event[0] != 'message':
+            return
+        message = decode_message(event[1])
+        for handler in self.handlers:
+            try:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.create_task(result)
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            except Exception as e:
+                logger.error(f"处理消息时出错: {str(e)}")
@@ -1,30 +1,59 @@
 import asyncio
+import base64
+import binascii
+import functools
+import hashlib
 import logging
+import os
+import tempfile
 import time
 import re
-import win32clipboard
-import win32con
-import win32api
 from datetime import datetime
-from wxauto import WeChat
-from config import WX_LISTEN_ALL_IF_EMPTY, WX_EXCLUDED_CHATS
+from wxauto.backend import CreateWeChat
+from wxauto.errors import SendPartsError
+from config import (
+    WX_LISTEN_ALL_IF_EMPTY, WX_EXCLUDED_CHATS, WX_BACKEND, WX_CONFIG_RELOAD_INTERVAL, WX_RULES_FILE, WX_ROSTER_TTL,
+    load_listen_config, config_mtime
+)
+import metrics
+from rules import RuleSet, ContextGate, rules_mtime
+from roster import RosterCache
+from segments import Action
+from logging_setup import PER_MESSAGE
 
 logger = logging.getLogger(__name__)
 
+# 回复中的图片解码后写入的目录，SendFiles 需要文件路径
+SEND_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'wepush_send')
+_IMAGE_TYPES = ((b'\x89PNG', '.png'), (b'\xff\xd8', '.jpg'), (b'GIF8', '.gif'), (b'RIFF', '.webp'), (b'BM', '.bmp'))
+
 class WeChatListener:
-    def __init__(self, target_chats=None, callback=None):
+    # 发送失败后重试前等待的秒数
+    SEND_RETRY_DELAY = 2
+
+    def __init__(self, target_chats=None, callback=None, wx=None):
         """初始化微信监听器
         
         Args:
             target_chats: 要监听的聊天列表
             callback: 收到消息时的回调函数
+            wx: WeChat实例，默认按 WX_BACKEND 创建
         """
-        self.wx = WeChat()
+        self.wx = wx if wx is not None else CreateWeChat(WX_BACKEND)
         self.target_chats = target_chats or []
         self.callback = callback
         self.running = False
         self.listen_chats = set()
+        self.listen_all = WX_LISTEN_ALL_IF_EMPTY
+        self.excluded_chats = frozenset(WX_EXCLUDED_CHATS)
+        self.rules_file = WX_RULES_FILE
+        self.rules = RuleSet.load(self.rules_file, self.wx.nickname)
+        self.gate = ContextGate()
+        self.roster = RosterCache(WX_ROSTER_TTL)
         self.last_check_time = time.time()
+        self._config_mtime = config_mtime()
+        self._rules_mtime = rules_mtime(self.rules_file)
+        self._watch_task = None
         
         logger.info(f"微信监听器初始化成功: {self.wx.nickname}")
         logger.info(f"目标聊天: {self.target_chats}")
@@ -37,169 +66,376 @@ class WeChatListener:
         # 设置监听聊天
         await self._setup_listen_chats()
         
+        # 监听配置热更新
+        if WX_CONFIG_RELOAD_INTERVAL > 0:
+            self._watch_task = asyncio.create_task(self._watch_config())
+        
         # 开始监听循环
         try:
             while self.running:
                 await self._check_new_messages()
+                await self._refresh_roster()
                 await asyncio.sleep(1)    
         except Exception as e:
             logger.error(f"监听过程中发生错误: {str(e)}")
         finally:
             await self.stop_listening()
     
+    async def _run_wx(self, call, *args, **kwargs):
+        """在线程池中执行 self.wx 的方法，并记录该调用的UI操作指标"""
+        return await asyncio.get_event_loop().run_in_executor(
+            None, functools.partial(metrics.track_ui_call, call, self.wx, getattr(self.wx, call), *args, **kwargs)
+        )
+
     async def _setup_listen_chats(self):
         """设置监听的聊天"""
         if self.target_chats:
-            for chat in self.target_chats:
-                await self._add_listen_chat(chat)
-        elif WX_LISTEN_ALL_IF_EMPTY:
+            chats = [chat for chat in self.target_chats if chat not in self.excluded_chats]
+        elif self.listen_all:
             # 获取所有会话列表
-            session_list = await asyncio.get_event_loop().run_in_executor(
-                None, self.wx.GetSessionList, True
-            )
-            for chat in session_list:
-                if chat not in WX_EXCLUDED_CHATS:
-                    await self._add_listen_chat(chat)
-    
-    async def _add_listen_chat(self, chat_name):
-        """添加监听的聊天"""
+            session_list = await self._run_wx('GetSessionList', True)
+            chats = [chat for chat in session_list if chat not in self.excluded_chats]
+        else:
+            return
+        await self._add_listen_chats(chats)
+
+    async def _add_listen_chats(self, chats):
+        """批量添加监听的聊天：已打开独立窗口的直接监听，其余遍历一次会话列表后打开
+
+        Returns:
+            list: 成功添加的聊天
+        """
+        start = time.perf_counter()
         try:
             # 使用线程池执行同步的微信操作
-            success = await asyncio.get_event_loop().run_in_executor(
-                None, self.wx.ChatWith, chat_name
-            )
-            if success:
-                await asyncio.get_event_loop().run_in_executor(
-                    None, self.wx.AddListenChat, chat_name
-                )
-                self.listen_chats.add(chat_name)
-                logger.info(f"添加监听聊天: {chat_name}")
-                return True
+            results = await self._run_wx('AddListenChats', list(chats), callback=self._on_listen_progress)
         except Exception as e:
-            logger.error(f"添加监听聊天失败 {chat_name}: {str(e)}")
-        return False
+            logger.error(f"添加监听聊天失败 {chats}: {str(e)}")
+            return []
+        added = [chat for chat, result in results.items() if result]
+        logger.info("监听设置完成: %d/%d 个聊天，耗时 %.1f 秒", len(added), len(results), time.perf_counter() - start)
+        return added
+
+    def _on_listen_progress(self, chat_name, result, done, total):
+        """AddListenChats 的进度回调，在线程池中调用"""
+        if result:
+            self.listen_chats.add(chat_name)
+            logger.info("添加监听聊天 [%d/%d]: %s (%s)", done, total, chat_name, result)
+        else:
+            logger.error("添加监听聊天失败 [%d/%d]: %s", done, total, chat_name)
+
+    async def _remove_listen_chat(self, chat_name):
+        """移除监听的聊天并关闭其独立窗口"""
+        # 先从 listen_chats 中移除，已轮询到的该聊天的消息不再转发
+        self.listen_chats.discard(chat_name)
+        self.roster.discard(chat_name)
+        try:
+            await self._run_wx('RemoveListenChat', chat_name, close=True)
+            logger.info("移除监听聊天: %s", chat_name)
+        except Exception as e:
+            logger.error(f"移除监听聊天失败 {chat_name}: {str(e)}")
+
+    async def apply_config(self, listen_config):
+        """应用新的监听配置，只增删有变化的聊天，轮询不中断
+
+        Args:
+            listen_config: config.ListenConfig
+        """
+        # 过滤条件整体替换，轮询中的读取看到的总是完整的旧值或新值
+        self.excluded_chats = frozenset(listen_config.excluded_chats)
+        self.listen_all = listen_config.listen_all_if_empty
+        self.target_chats = list(listen_config.target_chats)
+        if listen_config.rules_file != self.rules_file:
+            self.rules_file = listen_config.rules_file
+            self._rules_mtime = rules_mtime(self.rules_file)
+            self._reload_rules()
+
+        if self.target_chats:
+            wanted = [chat for chat in dict.fromkeys(self.target_chats) if chat not in self.excluded_chats]
+        elif self.listen_all:
+            session_list = await self._run_wx('GetSessionList', True)
+            wanted = [chat for chat in session_list if chat not in self.excluded_chats]
+        else:
+            wanted = []
+
+        removed = [chat for chat in self.listen_chats if chat not in wanted]
+        added = [chat for chat in wanted if chat not in self.listen_chats]
+        for chat in removed:
+            await self._remove_listen_chat(chat)
+        if added:
+            await self._add_listen_chats(added)
+        logger.info("监听配置已更新: 新增 %d 个，移除 %d 个，当前监听 %d 个聊天",
+                    len(added), len(removed), len(self.listen_chats))
+
+    def _reload_rules(self):
+        """重新编译规则文件，编译完成后整体替换，失败时保留当前规则"""
+        try:
+            rules = RuleSet.load(self.rules_file, self.wx.nickname)
+        except Exception as e:
+            logger.error(f"加载消息规则失败，保留当前规则: {str(e)}")
+            return
+        self.rules = rules
+        logger.info("消息规则已更新: %d 条规则，默认%s", len(rules.rules),
+                    '转发' if rules.default == 'allow' else '不转发')
+
+    async def _watch_config(self):
+        """定期检查.env文件和规则文件，修改后热更新"""
+        while self.running:
+            await asyncio.sleep(WX_CONFIG_RELOAD_INTERVAL)
+            mtime = rules_mtime(self.rules_file)
+            if mtime != self._rules_mtime:
+                self._rules_mtime = mtime
+                logger.info("检测到规则文件修改，重新加载消息规则")
+                self._reload_rules()
+            mtime = config_mtime()
+            if mtime == self._config_mtime:
+                continue
+            self._config_mtime = mtime
+            logger.info("检测到配置文件修改，重新加载监听配置")
+            try:
+                await self.apply_config(load_listen_config())
+            except Exception as e:
+                logger.error(f"热更新监听配置失败: {str(e)}")
     
+    async def _refresh_roster(self):
+        """在两次轮询之间获取一个聊天的群成员名单，不与轮询同时操作界面"""
+        chat_name = self.roster.next_pending()
+        if chat_name is None:
+            return
+        chat = self.wx.listen.get(chat_name)
+        if chat is None:
+            return
+        try:
+            members = await asyncio.get_event_loop().run_in_executor(
+                None, metrics.track_ui_call, 'GetGroupMembers', self.wx, chat.GetGroupMembers
+            )
+            self.roster.update(chat_name, members)
+            logger.debug("已获取群成员名单: %s - %s", chat_name, len(members) if members else '非群聊')
+        except Exception as e:
+            self.roster.failed(chat_name)
+            logger.warning(f"获取群成员名单失败 {chat_name}: {str(e)}")
+
     async def _check_new_messages(self):
         """检查新消息"""
         try:
-            # 使用线程池执行同步的微信操作
-            all_messages = await asyncio.get_event_loop().run_in_executor(
-                None, self.wx.GetListenMessage
-            )
-            
-            if all_messages:
-                for chat, messages in all_messages.items():
-                    chat_name = chat.who if hasattr(chat, 'who') else str(chat)
-                    if messages:
-                        for msg in messages:
-                            await self._process_message(chat_name, msg)
+            with metrics.CHECK_DURATION.time():
+                # 使用线程池执行同步的微信操作
+                all_messages = await self._run_wx('GetListenMessage')
+                
+                if all_messages:
+                    for chat, messages in all_messages.items():
+                        chat_name = chat.who if hasattr(chat, 'who') else str(chat)
+                        if messages:
+                            for msg in messages:
+                                await self._process_message(chat_name, msg)
+                # gate 模式中攒够时间的上下文消息
+                for message_data in self.gate.due():
+                    await self._forward(message_data['chat'], message_data)
         except Exception as e:
             logger.error(f"检查新消息失败: {str(e)}")
     
     async def _process_message(self, chat_name, message):
         """处理单条消息"""
         try:
-            # 过滤系统消息和自己发送的消息
-            if (hasattr(message, 'type') and message.type in ['sys', 'self'] or 
-                hasattr(message, 'sender') and message.sender == 'Self' or
-                hasattr(message, 'content') and (
-                    "以下为新消息" in message.content or
-                    "新消息" in message.content
-                )):
+            metrics.MESSAGES_RECEIVED.inc(chat=chat_name)
+            # 已移除监听的聊天
+            if chat_name not in self.listen_chats:
+                metrics.MESSAGES_DROPPED.inc(chat=chat_name, reason='unlisted')
+                return
+            sender = getattr(message, 'sender', 'Unknown')
+            msgtype = getattr(message, 'type', 'text')
+            content = getattr(message, 'content', '') or ''
+            self.roster.observe(chat_name, msgtype, content)
+            # 入站规则只在这里求值一次，系统消息和自己发送的消息也由规则过滤
+            rules = self.rules
+            decision = rules.evaluate(chat_name, sender, msgtype, content, self.gate.since_reply(chat_name))
+            if not decision.forward and decision.reason != 'gated':
+                metrics.MESSAGES_DROPPED.inc(chat=chat_name, reason=decision.reason)
                 return
             
             message_data = {
                 "chat": chat_name,
-                "sender": getattr(message, 'sender', 'Unknown'),
-                "type": getattr(message, 'type', 'text'),
-                "content": getattr(message, 'content', ''),
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "sender": sender,
+                "type": msgtype,
+                "content": content,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "is_group": self.roster.is_group(chat_name, sender),
             }
             
-            logger.info(f"收到消息: {chat_name} - {message_data['sender']}: {message_data['content'][:50]}...")
-            
-            # 调用回调函数
-            if self.callback:
-                await self.callback(chat_name, message_data)
+            logger.info("收到消息: %s - %s: %.50s...", chat_name, message_data['sender'], message_data['content'],
+                        extra=PER_MESSAGE)
+
+            if decision.reason == 'gated':
+                # 未触发的消息抽样或合并为上下文，没有需要转发的消息时到此为止
+                gate = rules.rules[decision.rule].gate
+                metrics.MESSAGES_GATED.inc(chat=chat_name, reason=gate.gated)
+                message_data = self.gate.offer(chat_name, message_data, gate)
+                if message_data is None:
+                    return
+            elif decision.reason in ('mention', 'trigger', 'follow_up'):
+                # 触发的消息优先转发，之前攒下的上下文先发出，保持顺序
+                metrics.MESSAGES_GATED.inc(chat=chat_name, reason=decision.reason)
+                context = self.gate.flush(chat_name)
+                if context is not None:
+                    await self._forward(chat_name, context)
+                message_data['priority'] = 'high'
+
+            await self._forward(chat_name, message_data)
                 
         except Exception as e:
             logger.error(f"处理消息失败: {str(e)}")
+
+    async def _forward(self, chat_name, message_data):
+        """把消息交给回调函数转发"""
+        if self.callback:
+            await self.callback(chat_name, message_data)
     
-    async def send_wechat_message(self, chat_name: str, message: str) -> bool:
+    async def send_wechat_message(self, chat_name: str, message: str, at=None) -> bool:
         """发送消息到微信
         
         Args:
             chat_name: 聊天名称
             message: 要发送的消息内容
+            at: 要@的人，str或list
             
         Returns:
             bool: 是否发送成功
         """
+        if isinstance(at, str):
+            at = [at]
+        return await self.send_wechat_reply(chat_name, [Action('text', message, tuple(at or ()))])
+
+    async def send_wechat_reply(self, chat_name: str, actions) -> bool:
+        """按顺序发送一条回复的所有动作（segments.Action），只激活一次聊天窗口
+        
+        Args:
+            chat_name: 聊天名称
+            actions: 发送动作列表，相邻的图片和文件合并为一次发送
+            
+        Returns:
+            bool: 是否发送成功
+        """
+        start = time.perf_counter()
+        success = False
+        metrics.SENDS_IN_FLIGHT.inc()
         try:
             # 使用线程池执行同步的微信操作
             loop = asyncio.get_event_loop()
             success = await loop.run_in_executor(
-                None, self._sync_send_wechat_message, chat_name, message
+                None, self._sync_send_wechat_reply, chat_name, actions
             )
             
             if success:
-                logger.info(f"已发送回复到微信: {chat_name} - {message}")
+                self.gate.replied(chat_name)
+                logger.info("已发送回复到微信: %s - %s", chat_name,
+                            ' | '.join(a.data if a.kind == 'text' else f'[{a.kind}]' for a in actions),
+                            extra=PER_MESSAGE)
                 return True
             else:
-                logger.error(f"发送消息到微信失败: {chat_name}")
+                logger.error("发送消息到微信失败: %s", chat_name)
                 return False
                 
         except Exception as e:
             logger.error(f"发送消息到微信失败: {str(e)}")
             return False
+        finally:
+            metrics.SENDS_IN_FLIGHT.dec()
+            metrics.SEND_DURATION.observe(time.perf_counter() - start, result='success' if success else 'failure')
     
 
-    def _sync_send_wechat_message(self, chat_name: str, message: str) -> bool:
-        """同步发送消息到微信（在后台线程中执行）"""
+    def _sync_send_wechat_reply(self, chat_name: str, actions) -> bool:
+        """同步发送回复到微信（在后台线程中执行）"""
+        parts = self._prepare_parts(actions)
+        if not parts:
+            logger.warning("回复中没有可发送的内容: %s", chat_name)
+            return False
         max_retries = 2
+        sent = 0
         
         for attempt in range(max_retries):
             try:
-                logger.info(f"尝试发送消息 [{attempt+1}/{max_retries}]: {chat_name}")
-                
-                # 尝试使用WeChat的SendMsg方法
-                success = self._send_via_wxauto_api(chat_name, message)
+                logger.debug("尝试发送消息 [%d/%d]: %s", attempt + 1, max_retries, chat_name)
                 
-                if success:
-                    logger.info("成功通过WeChat API发送消息")
-                    return True
+                # 重试时只发送上次出错的段及之后的段，已发出的段不重复发送；
+                # 返回False表示有段无法发送（文件不存在等），重试结果相同，不再重试
+                return self._send_via_wxauto_api(chat_name, parts[sent:])
                     
+            except SendPartsError as e:
+                sent += e.sent
+                logger.error(f"发送微信消息失败 (尝试 {attempt+1}/{max_retries})，已发送 {sent}/{len(parts)} 段: {str(e.error)}")
             except Exception as e:
                 logger.error(f"发送微信消息失败 (尝试 {attempt+1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
+            if attempt < max_retries - 1:
+                time.sleep(self.SEND_RETRY_DELAY)
         
         logger.error("最终发送失败")
         return False
 
-    def _send_via_wxauto_api(self, chat_name: str, message: str) -> bool:
-        """通过WeChat的SendMsg API发送消息"""
-        try:
-            # 确保微信窗口激活
-            self.wx._show()
-            time.sleep(1)
-            
-            logger.info(f"使用WeChat SendMsg API发送到: {chat_name}")
-            
-            # 使用WeChat的SendMsg方法
-            result = self.wx.SendMsg(message, who=chat_name)
-            
-            # 检查结果，SendMsg方法可能返回None表示成功，或者其他值
-            if result is None:
-                logger.info("WeChat SendMsg API调用成功")
-                time.sleep(1)
-                return True
+    def _prepare_parts(self, actions):
+        """把发送动作转换为SendParts的参数：图片解码为缓存文件，相邻的图片和文件合并为一段"""
+        parts = []
+        for action in actions:
+            if action.kind == 'text':
+                parts.append(('text', action.data, list(action.at) or None))
+                continue
+            if action.kind in ('image', 'emoji'):
+                path = self._cache_media(action.data)
+            elif action.kind == 'file':
+                path = action.data if isinstance(action.data, str) and os.path.exists(action.data) else None
+            elif action.kind == 'reply':
+                logger.debug("微信不支持按消息id引用，忽略引用消息段: %s", action.data)
+                continue
             else:
-                logger.warning(f"WeChat SendMsg返回: {result}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"WeChat API发送失败: {str(e)}")
+                logger.warning("不支持发送的消息段类型: %s", action.data)
+                continue
+            if path is None:
+                logger.warning("无法发送%s消息段", action.kind)
+                continue
+            if parts and parts[-1][0] == 'files':
+                parts[-1][1].append(path)
+            else:
+                parts.append(('files', [path], None))
+        return parts
+
+    def _cache_media(self, data):
+        """把base64图片写入发送缓存目录，文件名为内容的哈希值，相同的图片只写一次"""
+        try:
+            if isinstance(data, str):
+                data = base64.b64decode(data.split(',', 1)[-1] if data.startswith('data:') else data)
+        except (binascii.Error, ValueError) as e:
+            logger.warning(f"图片数据解码失败: {str(e)}")
+            return None
+        ext = next((ext for magic, ext in _IMAGE_TYPES if data.startswith(magic)), '.png')
+        path = os.path.join(SEND_CACHE_DIR, hashlib.md5(data).hexdigest() + ext)
+        if not os.path.exists(path):
+            os.makedirs(SEND_CACHE_DIR, exist_ok=True)
+            self._clean_media_cache()
+            with open(path, 'wb') as f:
+                f.write(data)
+        return path
+
+    def _clean_media_cache(self):
+        """删除发送缓存目录中超过一天的文件"""
+        expire = time.time() - 86400
+        for entry in os.scandir(SEND_CACHE_DIR):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expire:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _send_via_wxauto_api(self, chat_name: str, parts) -> bool:
+        """通过WeChat的SendParts API发送一条回复的所有段，出错时的异常由调用方处理"""
+        logger.debug("使用WeChat SendParts API发送到: %s", chat_name)
+        
+        # SendParts 只激活一次独立聊天窗口，按顺序发送所有段，不需要先激活主窗口
+        result = metrics.track_ui_call('SendParts', self.wx, self.wx.SendParts, parts, who=chat_name)
+        
+        if result:
+            logger.debug("WeChat SendParts API调用成功")
+            return True
+        else:
+            logger.warning(f"WeChat SendParts返回: {result}")
             return False
     
     def _switch_to_chat_simple(self, chat_name: str) -> bool:
@@ -320,6 +556,9 @@ class WeChatListener:
     def _ensure_input_focus(self) -> bool:
         """确保输入框获得焦点"""
         try:
+            import win32api
+            import win32con
+
             # 方法1: 尝试直接找到并点击输入框
             edit_control = self.wx.ChatBox.EditControl()
             if edit_control.Exists(1):
@@ -350,6 +589,7 @@ class WeChatListener:
     def _set_clipboard_text(self, text: str):
         """设置剪贴板文本"""
         try:
+            import win32clipboard
             win32clipboard.OpenClipboard()
             win32clipboard.EmptyClipboard()
             win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
@@ -377,4 +617,7 @@ class WeChatListener:
     async def stop_listening(self):
         """停止监听"""
         self.running = False
+        if self._watch_task and self._watch_task is not asyncio.current_task():
+            self._watch_task.cancel()
+            self._watch_task = None
         logger.info("停止监听微信消息")
\ No newline at end of file
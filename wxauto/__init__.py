@@ -1,9 +1,27 @@
-from .wxauto import WeChat
-from .utils import *
-
-__version__ = VERSION
+"""
+wxauto的Windows实现（WeChat）依赖uiautomation和win32，只在第一次访问时导入，
+因此在其他平台上也可以导入本包并使用backend、simulator等模块
+"""
+import importlib
+import importlib.util
 
 __all__ = [
     'WeChat', 
     'VERSION',
 ]
+
+def __getattr__(name):
+    if name == 'WeChat':
+        return importlib.import_module('.wxauto', __name__).WeChat
+    if name.startswith('__') and name != '__version__':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if importlib.util.find_spec(f'{__name__}.{name}') is not None:
+        # 子模块由import机制自行导入
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    utils = importlib.import_module('.utils', __name__)
+    if name == '__version__':
+        return utils.VERSION
+    try:
+        return getattr(utils, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
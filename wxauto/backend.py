@@ -0,0 +1,183 @@
+"""
+UI后端：WeChat/ChatWnd的实现
+
+上层代码（监听器、适配器）只依赖下面两个接口中列出的方法和属性，
+'uia'后端为基于uiautomation的Windows微信客户端实现（wxauto.wxauto.WeChat），
+'sim'后端为内存中模拟的微信（wxauto.simulator.SimWeChat），不依赖Windows，
+可以由脚本驱动消息流量，用于在任意平台上复现和测量轮询、发送的性能。
+
+两个接口为抽象基类，两个后端都继承它们，缺少任何一个方法的后端类无法实例化。
+"""
+import abc
+import importlib
+
+
+class ChatWndBackend(abc.ABC):
+    """独立聊天窗口接口
+
+    Attributes:
+        who (str): 聊天对象名
+        usedmsgid (list): 已读取的消息id，创建窗口时记录已有的消息，窗口为空时为空列表，
+            之后收到的第一批消息同样作为新消息返回
+        savepic (bool): 监听时是否自动保存图片
+        savefile (bool): 监听时是否自动保存文件
+        savevoice (bool): 监听时是否自动转换语音
+    """
+    who: str = None
+
+    @abc.abstractmethod
+    def _show(self):
+        """激活窗口"""
+
+    @abc.abstractmethod
+    def Close(self):
+        """关闭窗口"""
+
+    @abc.abstractmethod
+    def SendMsg(self, msg, at=None):
+        """发送文本消息"""
+
+    @abc.abstractmethod
+    def SendFiles(self, filepath):
+        """发送文件，返回是否成功"""
+
+    @abc.abstractmethod
+    def SendParts(self, parts):
+        """按顺序发送[('text'|'files', 数据, 要@的人)]，只激活一次窗口，返回是否全部成功；
+        中途出错时引发SendPartsError，其sent为已处理的段数"""
+
+    @abc.abstractmethod
+    def GetAllMessage(self, savepic=False, savefile=False, savevoice=False):
+        """获取窗口中加载的所有消息"""
+
+    @abc.abstractmethod
+    def GetNewMessage(self, savepic=False, savefile=False, savevoice=False):
+        """获取窗口中的新消息，创建窗口时已记录的消息不返回"""
+
+    @abc.abstractmethod
+    def GetGroupMembers(self):
+        """获取群成员列表，不是群聊时返回空列表，读取失败时抛出异常"""
+
+
+class WeChatBackend(abc.ABC):
+    """微信主窗口接口
+
+    Attributes:
+        nickname (str): 当前登录的微信昵称
+        listen (dict): 监听对象，键为聊天对象名，值为ChatWndBackend
+        ops (collections.Counter): 已执行的UI操作次数，按操作类型计数
+    """
+    nickname: str = None
+    listen: dict = None
+    ops = None
+
+    @abc.abstractmethod
+    def _show(self):
+        """激活主窗口"""
+
+    @abc.abstractmethod
+    def GetSessionList(self, reset=False, newmessage=False):
+        """获取会话列表，键为聊天对象名，值为新消息条数"""
+
+    @abc.abstractmethod
+    def ChatWith(self, who, timeout=2):
+        """打开聊天，返回聊天对象名，未找到返回False"""
+
+    @abc.abstractmethod
+    def CurrentChat(self):
+        """当前聊天对象名"""
+
+    @abc.abstractmethod
+    def SendMsg(self, msg, who=None, clear=True, at=None):
+        """发送文本消息"""
+
+    @abc.abstractmethod
+    def SendFiles(self, filepath, who=None):
+        """发送文件，返回是否成功"""
+
+    @abc.abstractmethod
+    def SendParts(self, parts, who):
+        """向who的独立聊天窗口按顺序发送多段消息，窗口不存在时返回False"""
+
+    @abc.abstractmethod
+    def GetAllMessage(self, savepic=False, savefile=False, savevoice=False):
+        """获取当前聊天中加载的所有消息"""
+
+    @abc.abstractmethod
+    def GetNextNewMessage(self, savepic=False, savefile=False, savevoice=False, timeout=10):
+        """获取下一个有新消息的聊天的新消息，格式为{聊天对象: [消息]}"""
+
+    @abc.abstractmethod
+    def AddListenChat(self, who, savepic=False, savefile=False, savevoice=False):
+        """添加监听对象，打开独立聊天窗口"""
+
+    @abc.abstractmethod
+    def GetChatWindows(self):
+        """获取已打开的独立聊天窗口的聊天对象名"""
+
+    @abc.abstractmethod
+    def AddListenChats(self, whos, savepic=False, savefile=False, savevoice=False, callback=None):
+        """批量添加监听对象：已有独立窗口的直接监听，其余遍历一次会话列表后打开，
+        每处理完一个对象调用callback(who, result, done, total)，返回{聊天对象名: result}，失败为False
+        """
+
+    @abc.abstractmethod
+    def GetListenMessage(self, who=None):
+        """获取监听对象的新消息，格式为{ChatWndBackend: [消息]}"""
+
+    @abc.abstractmethod
+    def GetAllListenChat(self):
+        """获取所有监听对象"""
+
+    @abc.abstractmethod
+    def RemoveListenChat(self, who, close=False):
+        """移除监听对象，close为True时同时关闭独立聊天窗口"""
+
+    @abc.abstractmethod
+    def GetGroupMembers(self):
+        """获取当前聊天群成员"""
+
+
+BACKENDS = {
+    'uia': 'wxauto.wxauto:WeChat',
+    'sim': 'wxauto.simulator:SimWeChat',
+}
+
+def RegisterBackend(name, factory):
+    """注册UI后端
+
+    Args:
+        name (str): 后端名称
+        factory (str|callable): 创建WeChatBackend的可调用对象，或'模块:名称'形式的导入路径
+    """
+    BACKENDS[name] = factory
+
+def GetBackend(name='uia'):
+    """获取UI后端的WeChat类，只在此时导入后端模块
+
+    Args:
+        name (str): 后端名称，默认'uia'
+
+    Returns:
+        callable: 创建WeChatBackend的可调用对象
+    """
+    if name not in BACKENDS:
+        raise ValueError(f'未知的UI后端：{name}，可选：{", ".join(BACKENDS)}')
+    factory = BACKENDS[name]
+    if isinstance(factory, str):
+        module, attr = factory.split(':')
+        factory = getattr(importlib.import_module(module), attr)
+        BACKENDS[name] = factory
+    return factory
+
+def CreateWeChat(backend='uia', **kwargs):
+    """创建WeChat实例
+
+    Args:
+        backend (str): 后端名称，'uia'为Windows微信客户端，'sim'为模拟微信
+        **kwargs: 传给后端构造函数的参数
+
+    Returns:
+        WeChatBackend: WeChat实例
+    """
+    return GetBackend(backend)(**kwargs)
@@ -0,0 +1,122 @@
+"""
+消息分类：根据消息控件的快照判断系统消息、时间、撤回、好友消息和自己的消息
+
+本模块只处理普通的Python数据，不依赖uiautomation和win32，
+可以用录制下来的快照在任意平台上测试和评估分类逻辑。
+"""
+
+
+class ClassifyParam:
+    SYS_TEXT_HEIGHT = 33
+    TIME_TEXT_HEIGHT = 34
+    RECALL_TEXT_HEIGHT = 45
+    CHAT_TEXT_HEIGHT = 52
+    CHAT_IMG_HEIGHT = 117
+
+
+class MessageSnapshot:
+    """消息控件快照
+
+    Args:
+        height (int): 消息控件高度
+        left (int): 消息控件左边界
+        right (int): 消息控件右边界
+        name (str): 消息控件Name，即消息内容
+        runtimeid (str): 消息控件RuntimeId拼接成的字符串
+        descendants (list): 按控件树顺序排列的按钮和文本控件，元素为(kind, name, left, top)，kind为'button'或'text'
+    """
+    __slots__ = ('height', 'left', 'right', 'name', 'runtimeid', 'descendants')
+
+    def __init__(self, height, left, right, name, runtimeid, descendants=()):
+        self.height = height
+        self.left = left
+        self.right = right
+        self.name = name
+        self.runtimeid = runtimeid
+        self.descendants = tuple(tuple(i) for i in descendants)
+
+    def __repr__(self) -> str:
+        return f"<wxauto Message Snapshot ({self.height}: {self.name})>"
+
+    def ToDict(self):
+        """转换为可以保存为json的字典"""
+        return {
+            'height': self.height,
+            'left': self.left,
+            'right': self.right,
+            'name': self.name,
+            'runtimeid': self.runtimeid,
+            'descendants': [list(i) for i in self.descendants],
+        }
+
+    @classmethod
+    def FromDict(cls, data):
+        """从ToDict的结果恢复快照"""
+        return cls(
+            data['height'],
+            data['left'],
+            data['right'],
+            data['name'],
+            data['runtimeid'],
+            data.get('descendants', ()),
+        )
+
+
+def ClassifyMessage(snapshot, param=ClassifyParam):
+    """对单条消息快照分类
+
+    Args:
+        snapshot (MessageSnapshot): 消息控件快照
+        param (ClassifyParam, optional): 各类消息控件高度，默认ClassifyParam
+
+    Returns:
+        list: [发送者, 内容, runtimeid]，发送者为'SYS'、'Time'、'Recall'、'Self'，或好友消息的(昵称, 群昵称)
+    """
+    height = snapshot.height
+    name = snapshot.name
+    runtimeid = snapshot.runtimeid
+    if height == param.SYS_TEXT_HEIGHT:
+        return ['SYS', name, runtimeid]
+    if height == param.TIME_TEXT_HEIGHT:
+        return ['Time', name, runtimeid]
+    if height == param.RECALL_TEXT_HEIGHT:
+        if '撤回' in name:
+            return ['Recall', name, runtimeid]
+        return ['SYS', name, runtimeid]
+
+    # 第一个有名字的按钮是发送者头像，第一个文本控件在头像上方时为群昵称
+    user = None
+    text = None
+    for kind, ctrlname, left, top in snapshot.descendants:
+        if kind == 'button':
+            if user is None and ctrlname:
+                user = (ctrlname, left, top)
+        elif kind == 'text':
+            if text is None:
+                text = (ctrlname, left, top)
+        if user is not None and text is not None:
+            break
+    if user is None:
+        return ['SYS', name, runtimeid]
+    username, userleft, usertop = user
+    if userleft < (snapshot.left + snapshot.right)/2:
+        if text is not None and text[2] < usertop:
+            sender = (username, text[0])
+        else:
+            sender = (username, username)
+    else:
+        sender = 'Self'
+    return [sender, name, runtimeid]
+
+
+def ClassifyMessages(snapshots, param=ClassifyParam):
+    """对一批消息快照分类
+
+    Args:
+        snapshots (list): MessageSnapshot列表
+        param (ClassifyParam, optional): 各类消息控件高度，默认ClassifyParam
+
+    Returns:
+        list: 与snapshots一一对应的分类结果，格式同ClassifyMessage
+    """
+    return [ClassifyMessage(snapshot, param) for snapshot in snapshots]
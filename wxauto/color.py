@@ -1,8 +1,22 @@
 import warnings
 import random
+import ctypes
 import os
 
-os.system('')
+def _enable_ansi():
+    """开启Windows控制台的ANSI颜色支持，代替os.system('')，不启动cmd子进程"""
+    if os.name != 'nt':
+        return
+    try:
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except Exception:
+        pass
+
+_enable_ansi()
 
 color_dict = {
     'BLACK': '\x1b[30m',
@@ -0,0 +1,514 @@
+"""
+通讯录缓存
+
+把通讯录管理窗口中读取的好友保存到本地SQLite数据库，下次运行时不需要重新滚动整个好友列表：
+  - 每个好友以(昵称, 备注, 标签, 同一页中第几个相同的好友)的哈希值为键，读取时用字典去重，
+    一页中没有新好友时停止滚动；昵称、备注和标签都相同的好友在同一页中按出现次序区分，不会合并
+  - 完整读取后删除本次没有出现的好友（已删除的好友），按关键词搜索的结果只更新不删除
+  - 昵称和备注可按前缀搜索；安装了pypinyin时同时保存全拼和首字母，可按拼音前缀搜索；
+    也可以与通讯录管理窗口的搜索一样，按昵称和备注包含关键词搜索（Search的contains参数）
+
+好友详情（GetFriendDetails）逐个读取，每个好友0.5~1秒，同样保存在这个数据库中，见FriendDetailCrawler：
+  - 每读取一个好友立即保存，并记录读到好友列表的第几个，中断后从上次的位置继续
+  - 未过期的详情和读取失败（超时）的好友按位置跳过，只按一次方向键，不读取界面
+  - 每个好友的读取有超时时间，超时的好友记为失败并停止读取，下次跳过这个好友继续
+
+Example:
+    >>> directory = ContactDirectory()
+    >>> wx.GetAllFriends(directory=directory)       # 第一次从界面读取并保存
+    >>> wx.GetAllFriends(directory=directory)       # 之后直接从数据库读取
+    >>> directory.Search('zs')                       # 按昵称/备注/拼音/首字母前缀搜索
+    >>> directory.Search('三', contains=True)         # 按昵称/备注包含关键词搜索
+    >>> wx.CrawlFriendDetails(directory, max_age=7*86400)   # 读取好友详情，7天内读取过的跳过
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# 与utils中的wxlog为同一个日志记录器，这里不导入utils以便在其他平台上使用
+wxlog = logging.getLogger('wxauto')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS contacts (
+    key TEXT PRIMARY KEY,
+    nickname TEXT NOT NULL,
+    remark TEXT,
+    tags TEXT,
+    pinyin TEXT NOT NULL DEFAULT '',
+    initials TEXT NOT NULL DEFAULT '',
+    seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_nickname ON contacts (nickname COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS contacts_remark ON contacts (remark COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS contacts_pinyin ON contacts (pinyin COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS contacts_initials ON contacts (initials COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS details (
+    key TEXT PRIMARY KEY,
+    position INTEGER,
+    status TEXT NOT NULL,
+    data TEXT,
+    error TEXT,
+    fetched REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS details_position ON details (position);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    key TEXT,
+    updated REAL NOT NULL
+);
+'''
+
+
+def ContactKey(info, occurrence=0):
+    """好友的键，(昵称, 备注, 标签, occurrence)的哈希值
+
+    Args:
+        info (dict): GetAllFriends返回的好友信息，包含nickname、remark和tags
+        occurrence (int, optional): 同一页中第几个昵称、备注和标签都相同的好友，从0开始
+    """
+    tags = '\x01'.join(info.get('tags') or ())
+    text = f"{info.get('nickname') or ''}\x00{info.get('remark') or ''}\x00{tags}"
+    if occurrence:
+        text += f'\x00{occurrence}'
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def KeyedFriends(friends):
+    """为一页（或一个完整列表）中的好友生成键，相同的好友按出现次序区分
+
+    Returns:
+        list: [(键, 好友信息)]
+    """
+    seen = collections.Counter()
+    keyed = []
+    for info in friends:
+        base = ContactKey(info)
+        keyed.append((ContactKey(info, seen[base]), info))
+        seen[base] += 1
+    return keyed
+
+
+def CollectFriends(pages):
+    """从逐页读取的好友列表中收集好友，一页中没有新好友时停止读取
+
+    相邻两页有重叠，按键去重；同一页中相同的好友是不同的好友，按出现次序保留
+
+    Args:
+        pages (iterable): 每次产生一页好友信息列表，如ContactWnd.IterFriendPages()
+
+    Returns:
+        dict: 键 -> 好友信息，按出现顺序排列
+    """
+    friends = {}
+    for page in pages:
+        new = 0
+        for key, info in KeyedFriends(page):
+            if key not in friends:
+                friends[key] = info
+                new += 1
+        if not new:
+            break
+    if hasattr(pages, 'close'):
+        pages.close()
+    return friends
+
+
+def DetailKey(info):
+    """好友详情的键，有微信号时为微信号，否则为(昵称, 备注)的哈希值
+
+    Args:
+        info (dict): GetFriendDetails返回的好友详情
+    """
+    if info.get('微信号'):
+        return info['微信号']
+    return ContactKey({'nickname': info.get('昵称'), 'remark': info.get('备注')})
+
+
+def _pinyin(text):
+    """返回(全拼, 首字母)，未安装pypinyin时为空字符串"""
+    if not text:
+        return '', ''
+    try:
+        from pypinyin import lazy_pinyin, Style
+    except ImportError:
+        return '', ''
+    full = ''.join(lazy_pinyin(text)).lower()
+    initials = ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER)).lower()
+    return full, initials
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class ContactDirectory:
+    """保存在SQLite数据库中的好友列表
+
+    Args:
+        path (str, optional): 数据库文件路径，默认为当前目录下的 wxauto文件/contacts.db，':memory:' 为内存数据库
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(os.getcwd(), 'wxauto文件', 'contacts.db')
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        # LIKE 默认不区分大小写，配合 NOCASE 索引可以按索引查找前缀
+        self._db.execute('PRAGMA case_sensitive_like = OFF')
+        self._db.executescript(_SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"<wxauto Contact Directory at {self.path} ({len(self)} friends)>"
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM contacts').fetchone()[0]
+
+    def Save(self, friends, complete=False):
+        """保存好友列表
+
+        Args:
+            friends (iterable): GetAllFriends格式的好友信息
+            complete (bool, optional): 是否为完整的好友列表，是则删除本次没有出现的好友
+
+        Returns:
+            int: 保存的好友数
+        """
+        now = time.time()
+        rows = []
+        for key, info in KeyedFriends(friends):
+            pinyin = [_pinyin(info.get('nickname')), _pinyin(info.get('remark'))]
+            rows.append((
+                key,
+                info.get('nickname') or '',
+                info.get('remark'),
+                json.dumps(info.get('tags'), ensure_ascii=False) if info.get('tags') is not None else None,
+                ' '.join(i[0] for i in pinyin if i[0]),
+                ' '.join(i[1] for i in pinyin if i[1]),
+                now,
+            ))
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT INTO contacts (key, nickname, remark, tags, pinyin, initials, seen) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tags=excluded.tags, pinyin=excluded.pinyin, '
+                'initials=excluded.initials, seen=excluded.seen',
+                rows,
+            )
+            if complete:
+                self._db.execute('DELETE FROM contacts WHERE seen < ?', (now,))
+        return len(rows)
+
+    def Harvest(self, pages, complete=True):
+        """从逐页读取的好友列表中收集好友，一页中没有新好友时停止读取，并保存到数据库
+
+        Args:
+            pages (iterable): 每次产生一页好友信息列表，如ContactWnd.IterFriendPages()
+            complete (bool, optional): 是否为完整的好友列表，见Save
+
+        Returns:
+            list: 按出现顺序排列的好友信息
+        """
+        friends = list(CollectFriends(pages).values())
+        self.Save(friends, complete)
+        return friends
+
+    def _rows(self, sql, params=()):
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [
+            {
+                'nickname': row['nickname'],
+                'remark': row['remark'],
+                'tags': json.loads(row['tags']) if row['tags'] else None,
+            }
+            for row in rows
+        ]
+
+    def All(self):
+        """所有好友，格式与GetAllFriends相同"""
+        return self._rows('SELECT nickname, remark, tags FROM contacts ORDER BY rowid')
+
+    def Search(self, keyword, limit=None, contains=False):
+        """按昵称、备注、拼音或拼音首字母的前缀搜索好友（不区分大小写）
+
+        Args:
+            keyword (str): 搜索关键词
+            limit (int, optional): 最多返回的好友数
+            contains (bool, optional): 是否与通讯录管理窗口的搜索一样，按昵称或备注包含关键词搜索（不使用索引）
+
+        Returns:
+            list: 匹配的好友，格式与GetAllFriends相同
+        """
+        if not keyword:
+            return self.All()[:limit] if limit else self.All()
+        if contains:
+            pattern = '%' + _escape_like(keyword) + '%'
+            sql = "SELECT nickname, remark, tags FROM contacts WHERE " \
+                  "nickname LIKE ? ESCAPE '\\' OR remark LIKE ? ESCAPE '\\' ORDER BY rowid"
+            params = (pattern, pattern)
+            if limit:
+                sql += ' LIMIT ?'
+                params += (int(limit),)
+            return self._rows(sql, params)
+        prefix = _escape_like(keyword) + '%'
+        # 拼音列中昵称和备注的拼音以空格分隔，备注的拼音也按前缀匹配
+        inner = '% ' + prefix
+        sql = (
+            "SELECT nickname, remark, tags FROM contacts WHERE "
+            "nickname LIKE ? ESCAPE '\\' OR remark LIKE ? ESCAPE '\\' "
+            "OR pinyin LIKE ? ESCAPE '\\' OR initials LIKE ? ESCAPE '\\' "
+            "OR pinyin LIKE ? ESCAPE '\\' OR initials LIKE ? ESCAPE '\\' "
+            "ORDER BY rowid"
+        )
+        params = (prefix, prefix, prefix, prefix, inner, inner)
+        if limit:
+            sql += ' LIMIT ?'
+            params += (int(limit),)
+        return self._rows(sql, params)
+
+    def DetailAt(self, position):
+        """好友列表中第position个好友的详情记录
+
+        Returns:
+            dict: key, status ('ok' 或 'bad'), fetched, data，没有记录时为None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT key, status, data, fetched FROM details WHERE position = ?', (position,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'key': row['key'],
+            'status': row['status'],
+            'fetched': row['fetched'],
+            'data': json.loads(row['data']) if row['data'] else None,
+        }
+
+    def _put_detail(self, position, key, status, data, error):
+        with self._lock, self._db:
+            # 每个位置只对应一个好友，之前在这个位置的记录失去位置，失败记录没有位置就没有意义
+            self._db.execute('UPDATE details SET position = NULL WHERE position = ? AND key <> ?', (position, key))
+            self._db.execute("DELETE FROM details WHERE position IS NULL AND status = 'bad'")
+            self._db.execute(
+                'INSERT INTO details (key, position, status, data, error, fetched) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET position=excluded.position, status=excluded.status, '
+                'data=excluded.data, error=excluded.error, fetched=excluded.fetched',
+                (key, position, status, data, error, time.time()),
+            )
+
+    def SaveDetail(self, position, info):
+        """保存第position个好友的详情
+
+        Returns:
+            str: 好友详情的键，见DetailKey
+        """
+        key = DetailKey(info)
+        self._put_detail(position, key, 'ok', json.dumps(info, ensure_ascii=False), None)
+        return key
+
+    def MarkBad(self, position, error):
+        """记录第position个好友读取失败，之后按位置跳过"""
+        self._put_detail(position, f'position:{position}', 'bad', None, str(error))
+
+    def ForgetPositions(self, start=0):
+        """好友列表发生变化时，清除第start个及之后好友的位置，已读取的详情保留"""
+        with self._lock, self._db:
+            self._db.execute('UPDATE details SET position = NULL WHERE position >= ?', (start,))
+            self._db.execute("DELETE FROM details WHERE position IS NULL AND status = 'bad'")
+
+    def Details(self):
+        """所有读取成功的好友详情，按好友列表中的顺序排列，格式与GetFriendDetails相同"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM details WHERE status = 'ok' ORDER BY position IS NULL, position, rowid"
+            ).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def GetCheckpoint(self, name):
+        """读取进度
+
+        Returns:
+            tuple: (下一个要读取的位置, 上一个好友的键)，没有进度时为None
+        """
+        with self._lock:
+            row = self._db.execute('SELECT position, key FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        return (row['position'], row['key']) if row is not None else None
+
+    def SetCheckpoint(self, name, position, key):
+        """保存进度"""
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT INTO checkpoints (name, position, key, updated) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET position=excluded.position, key=excluded.key, updated=excluded.updated',
+                (name, position, key, time.time()),
+            )
+
+    def ClearCheckpoint(self, name):
+        """清除进度，下次从第一个好友开始"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM checkpoints WHERE name = ?', (name,))
+
+    def Close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._db.close()
+
+
+class FriendDetailCrawler:
+    """可中断、可继续的好友详情读取
+
+    只负责读取的顺序和进度，界面操作由调用方传入，见WeChat.CrawlFriendDetails：
+      - 从上次保存的位置继续：先按position次方向键回到上次的好友，不读取详情
+      - 某个位置的详情未过期（max_age秒内读取过）或已记为失败时，只按方向键跳过
+      - 读取到的好友与该位置保存的不是同一个时，说明好友列表有增减，之后的位置全部作废、重新读取；
+        跳过的位置不读取界面，无法发现增减，新好友最迟在详情过期后读取到
+      - 读取到的好友与上一个相同时，说明已经到达列表末尾，本轮读取完成，清除进度；
+        上一个好友读取失败时无法这样比较，改为在按方向键前后各调用一次locate，选中的好友没有变化即为末尾，
+        最后一个好友读取超时（如已离职的企业微信好友）时不会再读取它
+      - 读取超时的好友记为失败并立即停止：超时的读取可能仍在进行，不能再操作界面，
+        微信恢复或重启后再次调用，从下一个好友继续
+      - 其他错误（如一时找不到控件）在原位置重试retries次，仍失败时本次跳过，不记为失败，下次重新读取；
+        连续max_errors个好友出错时界面多半不在通讯录，停止读取，下次从第一个出错的好友继续
+
+    Args:
+        directory (ContactDirectory): 保存详情和进度的通讯录缓存
+        read (callable): 读取当前好友的详情，超时时抛出TimeoutError
+        step (callable): 选中下一个好友（按一次方向键）
+        locate (callable, optional): 不读取详情，返回当前选中的好友的标识（同一次运行中不变），无法确定时返回None；
+            只在从读取失败的好友向下移动时调用
+        max_age (float, optional): 详情的有效期（秒），默认为None，读取过的详情都不再读取，0为全部重新读取
+        retry_bad (bool, optional): 是否重新读取之前失败的好友
+        retries (int, optional): 读取出错（超时除外）时的重试次数
+        max_errors (int, optional): 连续多少个好友出错后停止
+    """
+    CHECKPOINT = 'friend_details'
+
+    def __init__(self, directory, read, step, locate=None, max_age=None, retry_bad=False, retries=2, max_errors=3):
+        self.directory = directory
+        self.read = read
+        self.step = step
+        self.locate = locate
+        self.max_age = max_age
+        self.retry_bad = retry_bad
+        self.retries = retries
+        self.max_errors = max_errors
+
+    def _skippable(self, stored, now):
+        if stored is None:
+            return False
+        if stored['status'] == 'bad':
+            return not self.retry_bad
+        return self.max_age is None or now - stored['fetched'] < self.max_age
+
+    def _advance(self, check):
+        """选中下一个好友，check为True时返回选中的好友是否没有变化（已到列表末尾）"""
+        before = self.locate() if check and self.locate is not None else None
+        self.step()
+        return before is not None and self.locate() == before
+
+    def _finish(self, position, stats):
+        """列表共有position个好友，本轮读取完成"""
+        self.directory.ForgetPositions(position)
+        self.directory.ClearCheckpoint(self.CHECKPOINT)
+        stats['position'] = position
+        stats['complete'] = True
+
+    def Run(self, n=None, timeout=None):
+        """从上次的位置继续读取
+
+        Args:
+            n (int, optional): 本次最多读取的好友数（跳过的不计），默认为None，读取到列表末尾
+            timeout (float, optional): 本次读取的时间（秒），超过后保存进度并返回
+
+        Returns:
+            dict: 本次读取(read)、跳过(skipped)、出错后跳过(errors)、超时(bad)的好友数，下一个位置(position)，
+                是否读取到列表末尾(complete)
+        """
+        t0 = time.time()
+        stats = {'read': 0, 'skipped': 0, 'errors': 0, 'bad': 0, 'position': 0, 'complete': False}
+        checkpoint = self.directory.GetCheckpoint(self.CHECKPOINT)
+        position, prev_key = checkpoint if checkpoint else (0, None)
+        if position:
+            wxlog.debug('从第%d个好友继续读取好友详情', position)
+            for _ in range(position - 1):
+                self.step()
+            # 上次最后一个好友读取失败时，确认列表中还有下一个好友
+            if self._advance(prev_key is None):
+                self._finish(position, stats)
+                wxlog.debug('好友详情读取结果：%s', stats)
+                return stats
+        errors = 0
+        while True:
+            stats['position'] = position
+            if timeout is not None and time.time() - t0 > timeout:
+                wxlog.debug('读取好友详情超时，已保存进度')
+                break
+            if n and stats['read'] >= n:
+                break
+            stored = self.directory.DetailAt(position)
+            if self._skippable(stored, time.time()):
+                prev_key = stored['key'] if stored['status'] == 'ok' else None
+                stats['skipped'] += 1
+            else:
+                try:
+                    info = self._read(position)
+                except TimeoutError as e:
+                    # 超时的读取可能仍在操作界面，不再按方向键，下次从下一个好友继续
+                    wxlog.debug('读取第%d个好友详情超时，停止读取：%s', position, e)
+                    self.directory.MarkBad(position, 'timeout')
+                    self.directory.SetCheckpoint(self.CHECKPOINT, position + 1, None)
+                    stats['bad'] += 1
+                    stats['position'] = position + 1
+                    break
+                except Exception as e:
+                    stats['errors'] += 1
+                    errors += 1
+                    if errors >= self.max_errors:
+                        wxlog.debug('连续%d个好友读取出错，停止读取：%s', errors, e)
+                        self.directory.SetCheckpoint(self.CHECKPOINT, position - errors + 1, None)
+                        stats['position'] = position - errors + 1
+                        break
+                    wxlog.debug('读取第%d个好友详情出错，本次跳过：%s', position, e)
+                    prev_key = None
+                else:
+                    errors = 0
+                    key = DetailKey(info)
+                    if key == prev_key:
+                        # 已经是最后一个好友，再按方向键仍停留在这个好友上
+                        self._finish(position, stats)
+                        break
+                    if stored is not None and stored['key'] != key:
+                        self.directory.ForgetPositions(position)
+                    self.directory.SaveDetail(position, info)
+                    prev_key = key
+                    stats['read'] += 1
+            position += 1
+            if self._advance(prev_key is None):
+                self._finish(position, stats)
+                break
+            self.directory.SetCheckpoint(self.CHECKPOINT, position, prev_key)
+        wxlog.debug('好友详情读取结果：%s', stats)
+        return stats
+
+    def _read(self, position):
+        """读取当前好友，出错（超时除外）时重试"""
+        for attempt in range(self.retries + 1):
+            try:
+                return self.read()
+            except TimeoutError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                wxlog.debug('读取第%d个好友详情出错，重试：%s', position, e)
@@ -3,6 +3,12 @@ from .languages import *
 from .utils import *
 from .color import *
 from .errors import *
+from .classify import *
+from .timeparse import ParseTime, ParseTimes
+from .contacts import CollectFriends
+from .backend import ChatWndBackend
+import collections
+import threading
 import datetime
 import time
 import os
@@ -10,63 +16,59 @@ import re
 
 
 
-class WxParam:
-    SYS_TEXT_HEIGHT = 33
-    TIME_TEXT_HEIGHT = 34
-    RECALL_TEXT_HEIGHT = 45
-    CHAT_TEXT_HEIGHT = 52
-    CHAT_IMG_HEIGHT = 117
+class WxParam(ClassifyParam):
     DEFALUT_SAVEPATH = os.path.join(os.getcwd(), 'wxauto文件')
 
 class WeChatBase:
+    @property
+    def ops(self):
+        """UI操作计数，所有窗口共用uiautomation的OperationCounts"""
+        return uia.OperationCounts
+
     def _lang(self, text, langtype='MAIN'):
         if langtype == 'MAIN':
             return MAIN_LANGUAGE[text][self.language]
         elif langtype == 'WARNING':
             return WARNING[text][self.language]
 
-    def _split(self, MsgItem):
-        uia.SetGlobalSearchTimeout(0)
-        MsgItemName = MsgItem.Name
-        if MsgItem.BoundingRectangle.height() == WxParam.SYS_TEXT_HEIGHT:
-            Msg = ['SYS', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
-        elif MsgItem.BoundingRectangle.height() == WxParam.TIME_TEXT_HEIGHT:
-            Msg = ['Time', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
-        elif MsgItem.BoundingRectangle.height() == WxParam.RECALL_TEXT_HEIGHT:
-            if '撤回' in MsgItemName:
-                Msg = ['Recall', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
-            else:
-                Msg = ['SYS', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+    def _getmsgids(self, msgitems=None):
+        """只读取消息控件的RuntimeId，不解析消息内容，用于记录已有消息"""
+        if msgitems is None:
+            msgitems = self.C_MsgList.GetChildren()
+        return [''.join([str(i) for i in item.GetRuntimeId()]) for item in msgitems]
+
+    def _snapshot(self, MsgItem):
+        """一次性读取消息控件的位置、内容、RuntimeId，以及聊天消息中按顺序排列的按钮和文本控件
+
+        Returns:
+            MessageSnapshot: 消息控件快照
+        """
+        kinds = {uia.ControlType.ButtonControl: 'button', uia.ControlType.TextControl: 'text'}
+        rect = MsgItem.BoundingRectangle
+        name = MsgItem.Name
+        runtimeid = ''.join([str(i) for i in MsgItem.GetRuntimeId()])
+        if rect.height() in (WxParam.SYS_TEXT_HEIGHT, WxParam.TIME_TEXT_HEIGHT, WxParam.RECALL_TEXT_HEIGHT):
+            descendants = []
         else:
-            Index = 1
-            User = MsgItem.ButtonControl(foundIndex=Index)
             try:
-                while True:
-                    if User.Name == '':
-                        Index += 1
-                        User = MsgItem.ButtonControl(foundIndex=Index)
-                    else:
-                        break
-                winrect = MsgItem.BoundingRectangle
-                mid = (winrect.left + winrect.right)/2
-                if User.BoundingRectangle.left < mid:
-                    if MsgItem.TextControl().Exists(0.1) and MsgItem.TextControl().BoundingRectangle.top < User.BoundingRectangle.top:
-                        name = (User.Name, MsgItem.TextControl().Name)
-                    else:
-                        name = (User.Name, User.Name)
-                else:
-                    name = 'Self'
-                Msg = [name, MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
+                descendants = [
+                    (kinds[ctype], ctrlname, ctrlrect.left, ctrlrect.top)
+                    for ctype, ctrlname, ctrlrect in uia.SnapshotDescendants(MsgItem, kinds)
+                ]
             except:
-                Msg = ['SYS', MsgItemName, ''.join([str(i) for i in MsgItem.GetRuntimeId()])]
-        uia.SetGlobalSearchTimeout(10.0)
-        return ParseMessage(Msg, MsgItem, self)
+                descendants = []
+        return MessageSnapshot(rect.height(), rect.left, rect.right, name, runtimeid, descendants)
+
+    def _split(self, MsgItem):
+        with uia.SearchTimeout(0):
+            snapshot = self._snapshot(MsgItem)
+        return ParseMessage(ClassifyMessage(snapshot, WxParam), MsgItem, self)
     
     def _getmsgs(self, msgitems, savepic=False, savefile=False, savevoice=False):
-        msgs = []
-        for MsgItem in msgitems:
-            if MsgItem.ControlTypeName == 'ListItemControl':
-                msgs.append(self._split(MsgItem))
+        msgitems = [i for i in msgitems if i.ControlTypeName == 'ListItemControl']
+        with uia.SearchTimeout(0):
+            snapshots = [self._snapshot(i) for i in msgitems]
+        msgs = ParseMessages(ClassifyMessages(snapshots, WxParam), msgitems, self)
 
         msgtypes = [
             f"[{self._lang('图片')}]",
@@ -77,19 +79,18 @@ class WeChatBase:
         if not [i for i in msgs if i.content[:4] in msgtypes]:
             return msgs
 
-        for msg in msgs:
+        for index, msg in enumerate(msgs):
             if msg.type not in ('friend', 'self'):
                 continue
+            content = None
             if msg.content.startswith(f"[{self._lang('图片')}]") and savepic:
-                imgpath = self._download_pic(msg.control)
-                msg.content = imgpath if imgpath else msg.content
+                content = self._download_pic(msg.control)
             elif msg.content.startswith(f"[{self._lang('文件')}]") and savefile:
-                filepath = self._download_file(msg.control)
-                msg.content = filepath if filepath else msg.content
+                content = self._download_file(msg.control)
             elif msg.content.startswith(f"[{self._lang('语音')}]") and savevoice:
-                voice_text = self._get_voice_text(msg.control)
-                msg.content = voice_text if voice_text else msg.content
-            msg.info[1] = msg.content
+                content = self._get_voice_text(msg.control)
+            if content:
+                msgs[index] = msg._replace(content=content)
         return msgs
     
     def _download_pic(self, msgitem):
@@ -163,6 +164,7 @@ class WeChatBase:
         option = menu.MenuItemControl(Name="语音转文字")
         if not option.Exists(0.5):
             voicecontrol.Click(simulateMove=False)
+            msgitem.ClearProgenyCache()
             if not msgitem.GetProgenyControl(8, 4):
                 return None
         else:
@@ -170,14 +172,16 @@ class WeChatBase:
 
         text = ''
         while True:
-            if msgitem.GetProgenyControl(8, 4):
-                if msgitem.GetProgenyControl(8, 4).Name == text:
+            msgitem.ClearProgenyCache()
+            voicetext = msgitem.GetProgenyControl(8, 4)
+            if voicetext:
+                if voicetext.Name == text:
                     return text
-                text = msgitem.GetProgenyControl(8, 4).Name
+                text = voicetext.Name
             time.sleep(0.1)
 
 
-class ChatWnd(WeChatBase):
+class ChatWnd(WeChatBase, ChatWndBackend):
     def __init__(self, who, language='cn'):
         self.who = who
         self.language = language
@@ -185,13 +189,19 @@ class ChatWnd(WeChatBase):
         self.UiaAPI = uia.WindowControl(searchDepth=1, ClassName='ChatWnd', Name=who)
         self.editbox = self.UiaAPI.EditControl()
         self.C_MsgList = self.UiaAPI.ListControl()
-        self.GetAllMessage()
+        self.usedmsgid = self._getmsgids()
 
         self.savepic = False   # 该参数用于在自动监听的情况下是否自动保存聊天图片
 
     def __repr__(self) -> str:
         return f"<wxauto Chat Window at {hex(id(self))} for {self.who}>"
 
+    def Close(self):
+        """关闭独立聊天窗口"""
+        HWND = FindWindow(name=self.who, classname='ChatWnd')
+        if HWND:
+            win32gui.PostMessage(HWND, win32con.WM_CLOSE, 0, 0)
+
     def _show(self):
         self.HWND = FindWindow(name=self.who, classname='ChatWnd')
         win32gui.ShowWindow(self.HWND, 1)
@@ -205,7 +215,7 @@ class ChatWnd(WeChatBase):
         Args:
             msg (str, optional): 要发送的文本消息
         """
-        wxlog.debug(f"@所有人：{self.who} --> {msg}")
+        wxlog.debug("@所有人：%s --> %s", self.who, msg)
         self._show()
         if not self.editbox.HasKeyboardFocus:
             self.editbox.Click(simulateMove=False)
@@ -228,8 +238,11 @@ class ChatWnd(WeChatBase):
             msg (str): 要发送的文本消息
             at (str|list, optional): 要@的人，可以是一个人或多个人，格式为str或list，例如："张三"或["张三", "李四"]
         """
-        wxlog.debug(f"发送消息：{self.who} --> {msg}")
+        wxlog.debug("发送消息：%s --> %s", self.who, msg)
         self._show()
+        self._sendmsg(msg, at)
+
+    def _sendmsg(self, msg, at=None):
         if not self.editbox.HasKeyboardFocus:
             self.editbox.Click(simulateMove=False)
 
@@ -263,7 +276,53 @@ class ChatWnd(WeChatBase):
         Returns:
             bool: 是否成功发送文件
         """
-        wxlog.debug(f"发送文件：{self.who} --> {filepath}")
+        wxlog.debug("发送文件：%s --> %s", self.who, filepath)
+        filelist = self._filelist(filepath)
+        if filelist is None:
+            return False
+        if filelist:
+            self._show()
+            self._sendfiles(filelist)
+            return True
+        else:
+            Warnings.lightred('所有文件都无法成功发送', stacklevel=2)
+            return False
+
+    def SendParts(self, parts):
+        """按顺序发送多段消息，只激活一次聊天窗口
+
+        Args:
+            parts (list): [(类型, 数据, 要@的人)]，类型为'text'时数据为文本，@的人格式同SendMsg的at；
+                类型为'files'时数据为文件路径列表，一次粘贴发送
+
+        Returns:
+            bool: 是否所有段都成功发送，文件不存在或类型未知的段跳过并返回False
+
+        Raises:
+            SendPartsError: 发送某一段时出错，sent为此前已处理的段数，重试时只需发送parts[sent:]
+        """
+        wxlog.debug("发送%d段消息：%s", len(parts), self.who)
+        self._show()
+        success = True
+        for sent, (kind, data, at) in enumerate(parts):
+            try:
+                if kind == 'text':
+                    self._sendmsg(data, at)
+                elif kind == 'files':
+                    filelist = self._filelist(data)
+                    if filelist:
+                        self._sendfiles(filelist)
+                    else:
+                        success = False
+                else:
+                    Warnings.lightred(f'未知的消息段类型：{kind}', stacklevel=2)
+                    success = False
+            except Exception as e:
+                raise SendPartsError(sent, e) from e
+        return success
+
+    def _filelist(self, filepath):
+        """检查文件路径，返回存在的文件的绝对路径列表，参数格式错误时返回None"""
         filelist = []
         if isinstance(filepath, str):
             if not os.path.exists(filepath):
@@ -279,25 +338,21 @@ class ChatWnd(WeChatBase):
                     Warnings.lightred(f'未找到文件：{i}', stacklevel=2)
         else:
             Warnings.lightred(f'filepath参数格式错误：{type(filepath)}，应为str、list、tuple、set格式', stacklevel=2)
-            return False
-        
-        if filelist:
-            self._show()
-            self.editbox.SendKeys('{Ctrl}a', waitTime=0)
-            t0 = time.time()
-            while True:
-                if time.time() - t0 > 10:
-                    raise TimeoutError(f'发送文件超时 --> {filelist}')
-                SetClipboardFiles(filelist)
-                time.sleep(0.2)
-                self.editbox.SendKeys('{Ctrl}v')
-                if self.editbox.GetValuePattern().Value:
-                    break
-            self.editbox.SendKeys('{Enter}')
-            return True
-        else:
-            Warnings.lightred('所有文件都无法成功发送', stacklevel=2)
-            return False
+            return None
+        return filelist
+
+    def _sendfiles(self, filelist):
+        self.editbox.SendKeys('{Ctrl}a', waitTime=0)
+        t0 = time.time()
+        while True:
+            if time.time() - t0 > 10:
+                raise TimeoutError(f'发送文件超时 --> {filelist}')
+            SetClipboardFiles(filelist)
+            time.sleep(0.2)
+            self.editbox.SendKeys('{Ctrl}v')
+            if self.editbox.GetValuePattern().Value:
+                break
+        self.editbox.SendKeys('{Enter}')
         
     def GetAllMessage(self, savepic=False, savefile=False, savevoice=False):
         '''获取当前窗口中加载的所有聊天记录
@@ -310,7 +365,7 @@ class ChatWnd(WeChatBase):
         Returns:
             list: 聊天记录信息
         '''
-        wxlog.debug(f"获取所有聊天记录：{self.who}")
+        wxlog.debug("获取所有聊天记录：%s", self.who)
         MsgItems = self.C_MsgList.GetChildren()
         msgs = self._getmsgs(MsgItems, savepic, savefile, savevoice)
         return msgs
@@ -326,16 +381,15 @@ class ChatWnd(WeChatBase):
         Returns:
             list: 新聊天记录信息
         '''
-        wxlog.debug(f"获取新聊天记录：{self.who}")
-        if not self.usedmsgid:
-            self.usedmsgid = [i[-1] for i in self.GetAllMessage()]
-            return []
+        wxlog.debug("获取新聊天记录：%s", self.who)
         MsgItems = self.C_MsgList.GetChildren()
-        NewMsgItems = [i for i in MsgItems if ''.join([str(i) for i in i.GetRuntimeId()]) not in self.usedmsgid]
+        msgids = self._getmsgids(MsgItems)
+        usedmsgid = set(self.usedmsgid)
+        NewMsgItems = [item for item, msgid in zip(MsgItems, msgids) if msgid not in usedmsgid]
         if not NewMsgItems:
             return []
         newmsgs = self._getmsgs(NewMsgItems, savepic, savefile, savevoice)
-        self.usedmsgid = [i[-1] for i in self._getmsgs(MsgItems)]
+        self.usedmsgid = msgids
         # if newmsgs[0].type == 'sys' and newmsgs[0].content == self._lang('查看更多消息'):
         #     newmsgs = newmsgs[1:]
         return newmsgs
@@ -347,7 +401,7 @@ class ChatWnd(WeChatBase):
         Returns:
             bool: 是否成功加载更多聊天信息
         """
-        wxlog.debug(f"加载更多聊天信息：{self.who}")
+        wxlog.debug("加载更多聊天信息：%s", self.who)
         self._show()
         loadmore = self.C_MsgList.GetFirstChildControl()
         loadmore_top = loadmore.BoundingRectangle.top
@@ -370,33 +424,41 @@ class ChatWnd(WeChatBase):
         """获取当前聊天群成员
 
         Returns:
-            list: 当前聊天群成员列表
+            list: 当前聊天群成员列表，不是群聊时为空列表
+
+        Raises:
+            TargetNotFoundError: 找不到聊天信息按钮或读取不到群成员（如界面未响应），可以稍后重试
         """
-        wxlog.debug(f"获取当前聊天群成员：{self.who}")
+        wxlog.debug("获取当前聊天群成员：%s", self.who)
         ele = self.UiaAPI.PaneControl(searchDepth=7, foundIndex=6).ButtonControl(Name='聊天信息')
         try:
-            uia.SetGlobalSearchTimeout(1)
-            rect = ele.BoundingRectangle
-            Click(rect)
-        except:
-            return 
-        finally:
-            uia.SetGlobalSearchTimeout(10)
+            with uia.SearchTimeout(1):
+                rect = ele.BoundingRectangle
+        except LookupError:
+            raise TargetNotFoundError(f'找不到聊天信息按钮：{self.who}') from None
+        Click(rect)
         roominfoWnd = self.UiaAPI.WindowControl(ClassName='SessionChatRoomDetailWnd', searchDepth=1)
-        more = roominfoWnd.ButtonControl(Name='查看更多', searchDepth=8)
-        try:
-            uia.SetGlobalSearchTimeout(1)
-            rect = more.BoundingRectangle
+        # 非群聊的聊天信息不是群详情窗口，再点一次聊天信息按钮关闭面板（Esc可能关闭独立聊天窗口）
+        if not roominfoWnd.Exists(1):
             Click(rect)
-        except:
-            pass
+            return []
+        try:
+            more = roominfoWnd.ButtonControl(Name='查看更多', searchDepth=8)
+            try:
+                with uia.SearchTimeout(1):
+                    rect = more.BoundingRectangle
+                Click(rect)
+            except LookupError:
+                pass
+            members = [i.Name for i in roominfoWnd.ListControl(Name='聊天成员').GetChildren()]
+            while members and members[-1] in ['添加', '移出']:
+                members = members[:-1]
+            if not members:
+                raise TargetNotFoundError(f'读取不到群成员：{self.who}')
+            return members
         finally:
-            uia.SetGlobalSearchTimeout(10)
-        members = [i.Name for i in roominfoWnd.ListControl(Name='聊天成员').GetChildren()]
-        while members[-1] in ['添加', '移出']:
-            members = members[:-1]
-        roominfoWnd.SendKeys('{Esc}')
-        return members
+            if roominfoWnd.Exists(0):
+                roominfoWnd.SendKeys('{Esc}')
 
 class WeChatImage:
     def __init__(self, language='cn') -> None:
@@ -557,7 +619,7 @@ class NewFriendsElement:
             remark (str, optional): 备注名
             tags (list, optional): 标签列表
         """
-        wxlog.debug(f"接受好友请求：{self.name}  备注：{remark} 标签：{tags}")
+        wxlog.debug("接受好友请求：%s  备注：%s 标签：%s", self.name, remark, tags)
         self._wx._show()
         self.Status.Click(simulateMove=False)
         NewFriendsWnd = self._wx.UiaAPI.WindowControl(ClassName='WeUIDialog')
@@ -605,34 +667,51 @@ class ContactWnd:
         Args:
             keyword (str): 搜索关键词
         """
-        wxlog.debug(f"搜索好友：{keyword}")
+        wxlog.debug("搜索好友：%s", keyword)
         self.ContactBox.EditControl(Name="搜索").Click(simulateMove=False)
         self.ContactBox.SendKeys('{Ctrl}{A}')
         self.ContactBox.SendKeys(keyword)
 
-    def GetAllFriends(self):
-        """获取好友列表"""
-        wxlog.debug("获取好友列表")
+    def _contactinfo(self, ele):
+        contacts_info = {
+            'nickname': ele.TextControl().Name,
+            'remark': ele.ButtonControl(foundIndex=2).Name,
+            'tags': ele.ButtonControl(foundIndex=3).Name.split('，'),
+        }
+        if contacts_info.get('remark') in ('添加备注', ''):
+            contacts_info['remark'] = None
+        if contacts_info.get('tags') in (['添加标签'], ['']):
+            contacts_info['tags'] = None
+        return contacts_info
+
+    def IterFriendPages(self):
+        """逐页读取好友列表，每取下一页时向下滚动一次，滚动到底后结束
+
+        Yields:
+            list: 当前页的好友信息
+        """
         self._show()
-        contacts_list = []
         while True:
             contact_ele_list = self.ContactBox.ListControl().GetChildren()
-            for ele in contact_ele_list:
-                contacts_info = {
-                    'nickname': ele.TextControl().Name,
-                    'remark': ele.ButtonControl(foundIndex=2).Name,
-                    'tags': ele.ButtonControl(foundIndex=3).Name.split('，'),
-                }
-                if contacts_info.get('remark') in ('添加备注', ''):
-                    contacts_info['remark'] = None
-                if contacts_info.get('tags') in (['添加标签'], ['']):
-                    contacts_info['tags'] = None
-                if contacts_info not in contacts_list:
-                    contacts_list.append(contacts_info)
-            bottom = self.ContactBox.ListControl().GetChildren()[-1].BoundingRectangle.top
+            if not contact_ele_list:
+                return
+            yield [self._contactinfo(ele) for ele in contact_ele_list]
+            bottom = contact_ele_list[-1].BoundingRectangle.top
             self.ContactBox.WheelDown(wheelTimes=5, waitTime=0.1)
             if bottom == self.ContactBox.ListControl().GetChildren()[-1].BoundingRectangle.top:
-                return contacts_list
+                return
+
+    def GetAllFriends(self, directory=None, complete=True):
+        """获取好友列表，相邻两页重叠的好友去重，一页中没有新好友时停止滚动，见contacts.CollectFriends
+
+        Args:
+            directory (ContactDirectory, optional): 同时保存到该通讯录缓存
+            complete (bool, optional): 是否为完整的好友列表（未搜索），保存时删除本次没有出现的好友
+        """
+        wxlog.debug("获取好友列表")
+        if directory is not None:
+            return directory.Harvest(self.IterFriendPages(), complete)
+        return list(CollectFriends(self.IterFriendPages()).values())
     
     def Close(self):
         """关闭联系人窗口"""
@@ -657,7 +736,7 @@ class ContactElement:
         Args:
             remark (str): 新备注名
         """
-        wxlog.debug(f"修改好友备注名：{self.nickname} --> {remark}")
+        wxlog.debug("修改好友备注名：%s --> %s", self.nickname, remark)
         self.element.ButtonControl(foundIndex=2).Click(simulateMove=False)
         self.element.SendKeys('{Ctrl}a')
         self.element.SendKeys(remark)
@@ -666,21 +745,125 @@ class ContactElement:
 
 class SessionElement:
     def __init__(self, item):
-        self.name = item.GetProgenyControl(4, control_type='TextControl').Name\
-            if item.GetProgenyControl(4, control_type='TextControl') else None
-        self.time = item.GetProgenyControl(4, 1, control_type='TextControl').Name\
-            if item.GetProgenyControl(4, 1, control_type='TextControl') else None
-        self.content = item.GetProgenyControl(4, 2, control_type='TextControl').Name\
-            if item.GetProgenyControl(4, 2, control_type='TextControl') else None
+        name = item.GetProgenyControl(4, control_type='TextControl')
+        self.name = name.Name if name else None
+        time_ = item.GetProgenyControl(4, 1, control_type='TextControl')
+        self.time = time_.Name if time_ else None
+        content = item.GetProgenyControl(4, 2, control_type='TextControl')
+        self.content = content.Name if content else None
         self.isnew = item.GetProgenyControl(2, 2) is not None
-        wxlog.debug(f"============== 【{self.name}】 ==============")
-        wxlog.debug(f"最后一条消息时间: {self.time}")
-        wxlog.debug(f"最后一条消息内容: {self.content}")
-        wxlog.debug(f"是否有新消息: {self.isnew}")
+        wxlog.debug("============== 【%s】 ==============", self.name)
+        wxlog.debug("最后一条消息时间: %s", self.time)
+        wxlog.debug("最后一条消息内容: %s", self.content)
+        wxlog.debug("是否有新消息: %s", self.isnew)
+
+
+class MessageControls:
+    """消息控件表：按消息id保存最近解析的消息控件，供引用、转发、解析合并消息等操作使用
+
+    消息对象本身不持有控件，表中最多保存MaxSize个控件，超出后释放最早的控件；
+    MaxSize为0时不保存控件。不在表中的控件在需要时从窗口当前的消息列表中查找，找到后同样保存在表中
+    """
+    MaxSize = 256
+    _controls = collections.OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def Store(msgid, control):
+        """保存消息控件"""
+        if MessageControls.MaxSize <= 0 or control is None:
+            return
+        with MessageControls._lock:
+            MessageControls._controls[msgid] = control
+            MessageControls._controls.move_to_end(msgid)
+            while len(MessageControls._controls) > MessageControls.MaxSize:
+                MessageControls._controls.popitem(last=False)
+
+    @staticmethod
+    def Find(msgid, winobj=None):
+        """获取消息控件，不在表中时从winobj当前的消息列表中由新到旧查找
+
+        Args:
+            msgid (str): 消息id，即消息控件RuntimeId拼接成的字符串
+            winobj (WeChat | ChatWnd, optional): 消息所在的窗口对象
+
+        Returns:
+            Control: 消息控件，未找到时为None
+        """
+        with MessageControls._lock:
+            control = MessageControls._controls.get(msgid)
+        if control is not None or winobj is None:
+            return control
+        for item in reversed(winobj.C_MsgList.GetChildren()):
+            if ''.join([str(i) for i in item.GetRuntimeId()]) == msgid:
+                MessageControls.Store(msgid, item)
+                return item
+        return None
+
+    @staticmethod
+    def Clear():
+        """释放所有保存的消息控件"""
+        with MessageControls._lock:
+            MessageControls._controls.clear()
 
 
 class Message:
+    """消息记录，创建后不可修改
+
+    info为(发送者, 内容, 消息id)，消息控件不保存在消息对象上，通过control属性从MessageControls获取
+    """
     type = 'message'
+    _keepcontrol = False
+    __slots__ = ('info', 'sender', 'content', 'id', '_winobj')
+
+    def __init__(self, info, control, obj):
+        self._set(
+            info=(info[0], info[1], info[-1]),
+            sender=info[0],
+            content=info[1],
+            id=info[-1],
+            _winobj=obj,
+        )
+        if self._keepcontrol:
+            MessageControls.Store(self.id, control)
+
+    def _set(self, **kwargs):
+        for name, value in kwargs.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} 不可修改")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} 不可修改")
+
+    def _replace(self, **kwargs):
+        """返回替换部分字段后的新消息，修改content时同步修改info"""
+        msg = object.__new__(self.__class__)
+        for cls in self.__class__.__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                object.__setattr__(msg, name, getattr(self, name))
+        if 'content' in kwargs and 'info' not in kwargs:
+            kwargs['info'] = (self.info[0], kwargs['content'], self.info[2])
+        msg._set(**kwargs)
+        return msg
+
+    @property
+    def wx(self):
+        return self._winobj
+
+    @property
+    def control(self):
+        """消息控件，已不在消息列表中时引发TargetNotFoundError"""
+        control = MessageControls.Find(self.id, self._winobj)
+        if control is None:
+            raise TargetNotFoundError(f'消息控件已不在消息列表中：{self.sender} | {self.content}')
+        return control
+
+    @property
+    def chatbox(self):
+        obj = self._winobj
+        return obj.ChatBox if hasattr(obj, 'ChatBox') else obj.UiaAPI
 
     def __getitem__(self, index):
         return self.info[index]
@@ -689,20 +872,16 @@ class Message:
         return self.content
     
     def __repr__(self):
-        return str(self.info[:2])
+        return str(list(self.info[:2]))
     
 
 class SysMessage(Message):
     type = 'sys'
+    __slots__ = ()
     
     def __init__(self, info, control, wx):
-        self.info = info
-        self.control = control
-        self.wx = wx
-        self.sender = info[0]
-        self.content = info[1]
-        self.id = info[-1]
-        wxlog.debug(f"【系统消息】{self.content}")
+        super().__init__(info, control, wx)
+        wxlog.debug("【系统消息】%s", self.content)
     
     # def __repr__(self):
     #     return f'<wxauto SysMessage at {hex(id(self))}>'
@@ -710,16 +889,12 @@ class SysMessage(Message):
 
 class TimeMessage(Message):
     type = 'time'
+    __slots__ = ('time',)
     
-    def __init__(self, info, control, wx):
-        self.info = info
-        self.control = control
-        self.wx = wx
-        self.time = ParseWeChatTime(info[1])
-        self.sender = info[0]
-        self.content = info[1]
-        self.id = info[-1]
-        wxlog.debug(f"【时间消息】{self.time}")
+    def __init__(self, info, control, wx, time=None):
+        super().__init__(info, control, wx)
+        self._set(time=time if time is not None else ParseTime(info[1]))
+        wxlog.debug("【时间消息】%s", self.time)
     
     # def __repr__(self):
     #     return f'<wxauto TimeMessage at {hex(id(self))}>'
@@ -727,15 +902,11 @@ class TimeMessage(Message):
 
 class RecallMessage(Message):
     type = 'recall'
+    __slots__ = ()
     
     def __init__(self, info, control, wx):
-        self.info = info
-        self.control = control
-        self.wx = wx
-        self.sender = info[0]
-        self.content = info[1]
-        self.id = info[-1]
-        wxlog.debug(f"【撤回消息】{self.content}")
+        super().__init__(info, control, wx)
+        wxlog.debug("【撤回消息】%s", self.content)
     
     # def __repr__(self):
     #     return f'<wxauto RecallMessage at {hex(id(self))}>'
@@ -743,16 +914,12 @@ class RecallMessage(Message):
 
 class SelfMessage(Message):
     type = 'self'
+    _keepcontrol = True
+    __slots__ = ()
     
     def __init__(self, info, control, obj):
-        self.info = info
-        self.control = control
-        self._winobj = obj
-        self.sender = info[0]
-        self.content = info[1]
-        self.id = info[-1]
-        self.chatbox = obj.ChatBox if hasattr(obj, 'ChatBox') else obj.UiaAPI
-        wxlog.debug(f"【自己消息】{self.content}")
+        super().__init__(info, control, obj)
+        wxlog.debug("【自己消息】%s", self.content)
     
     # def __repr__(self):
     #     return f'<wxauto SelfMessage at {hex(id(self))}>'
@@ -766,7 +933,7 @@ class SelfMessage(Message):
         Returns:
             bool: 是否成功引用
         """
-        wxlog.debug(f'发送引用消息：{msg}  --> {self.sender} | {self.content}')
+        wxlog.debug('发送引用消息：%s  --> %s | %s', msg, self.sender, self.content)
         self._winobj._show()
         headcontrol = [i for i in self.control.GetFirstChildControl().GetChildren() if i.ControlTypeName == 'ButtonControl'][0]
         RollIntoView(self.chatbox.ListControl(), headcontrol, equal=True)
@@ -799,7 +966,7 @@ class SelfMessage(Message):
         Returns:
             bool: 是否成功转发
         """
-        wxlog.debug(f'转发消息：{self.sender} --> {friend} | {self.content}')
+        wxlog.debug('转发消息：%s --> %s | %s', self.sender, friend, self.content)
         self._winobj._show()
         headcontrol = [i for i in self.control.GetFirstChildControl().GetChildren() if i.ControlTypeName == 'ButtonControl'][0]
         RollIntoView(self.chatbox.ListControl(), headcontrol, equal=True)
@@ -826,7 +993,7 @@ class SelfMessage(Message):
     
     def parse(self):
         """解析合并消息内容，当且仅当消息内容为合并转发的消息时有效"""
-        wxlog.debug(f'解析合并消息内容：{self.sender} | {self.content}')
+        wxlog.debug('解析合并消息内容：%s | %s', self.sender, self.content)
         self._winobj._show()
         headcontrol = [i for i in self.control.GetFirstChildControl().GetChildren() if i.ControlTypeName == 'ButtonControl'][0]
         RollIntoView(self.chatbox.ListControl(), headcontrol, equal=True)
@@ -843,27 +1010,24 @@ class SelfMessage(Message):
                 content = textcontrols[2].Name
             except IndexError:
                 content = ''
-            msgs.append(([who, content, ParseWeChatTime(time)]))
+            msgs.append([who, content, time])
         chatrecordwnd.SendKeys('{Esc}')
+        for msg, time in zip(msgs, ParseTimes([i[2] for i in msgs])):
+            msg[2] = time
         return msgs
 
 class FriendMessage(Message):
     type = 'friend'
+    _keepcontrol = True
+    __slots__ = ('sender_remark',)
     
     def __init__(self, info, control, obj):
-        self.info = info
-        self.control = control
-        self._winobj = obj
-        self.sender = info[0][0]
-        self.sender_remark = info[0][1]
-        self.content = info[1]
-        self.id = info[-1]
-        self.info[0] = info[0][0]
-        self.chatbox = obj.ChatBox if hasattr(obj, 'ChatBox') else obj.UiaAPI
+        super().__init__((info[0][0], info[1], info[-1]), control, obj)
+        self._set(sender_remark=info[0][1])
         if self.sender == self.sender_remark:
-            wxlog.debug(f"【好友消息】{self.sender}: {self.content}")
+            wxlog.debug("【好友消息】%s: %s", self.sender, self.content)
         else:
-            wxlog.debug(f"【好友消息】{self.sender}({self.sender_remark}): {self.content}")
+            wxlog.debug("【好友消息】%s(%s): %s", self.sender, self.sender_remark, self.content)
     
     # def __repr__(self):
     #     return f'<wxauto FriendMessage at {hex(id(self))}>'
@@ -877,7 +1041,7 @@ class FriendMessage(Message):
         Returns:
             bool: 是否成功引用
         """
-        wxlog.debug(f'发送引用消息：{msg}  --> {self.sender} | {self.content}')
+        wxlog.debug('发送引用消息：%s  --> %s | %s', msg, self.sender, self.content)
         self._winobj._show()
         headcontrol = [i for i in self.control.GetFirstChildControl().GetChildren() if i.ControlTypeName == 'ButtonControl'][0]
         RollIntoView(self.chatbox.ListControl(), headcontrol, equal=True)
@@ -910,7 +1074,7 @@ class FriendMessage(Message):
         Returns:
             bool: 是否成功转发
         """
-        wxlog.debug(f'转发消息：{self.sender} --> {friend} | {self.content}')
+        wxlog.debug('转发消息：%s --> %s | %s', self.sender, friend, self.content)
         self._winobj._show()
         headcontrol = [i for i in self.control.GetFirstChildControl().GetChildren() if i.ControlTypeName == 'ButtonControl'][0]
         RollIntoView(self.chatbox.ListControl(), headcontrol, equal=True)
@@ -937,7 +1101,7 @@ class FriendMessage(Message):
     
     def parse(self):
         """解析合并消息内容，当且仅当消息内容为合并转发的消息时有效"""
-        wxlog.debug(f'解析合并消息内容：{self.sender} | {self.content}')
+        wxlog.debug('解析合并消息内容：%s | %s', self.sender, self.content)
         self._winobj._show()
         headcontrol = [i for i in self.control.GetFirstChildControl().GetChildren() if i.ControlTypeName == 'ButtonControl'][0]
         RollIntoView(self.chatbox.ListControl(), headcontrol, equal=True)
@@ -954,8 +1118,10 @@ class FriendMessage(Message):
                 content = textcontrols[2].Name
             except IndexError:
                 content = ''
-            msgs.append(([who, content, ParseWeChatTime(time)]))
+            msgs.append([who, content, time])
         chatrecordwnd.SendKeys('{Esc}')
+        for msg, time in zip(msgs, ParseTimes([i[2] for i in msgs])):
+            msg[2] = time
         return msgs
 
 
@@ -970,6 +1136,15 @@ message_types = {
 def ParseMessage(data, control, wx):
     return message_types.get(data[0], FriendMessage)(data, control, wx)
 
+def ParseMessages(datas, controls, wx):
+    """批量创建消息对象，所有时间消息的时间标签一次解析"""
+    datas = list(datas)
+    times = iter(ParseTimes([data[1] for data in datas if data[0] == 'Time']))
+    return [
+        TimeMessage(data, control, wx, next(times)) if data[0] == 'Time' else ParseMessage(data, control, wx)
+        for data, control in zip(datas, controls)
+    ]
+
 
 class LoginWnd:
     _class_name = 'WeChatLoginWndForPC'
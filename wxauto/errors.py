@@ -3,4 +3,11 @@ class TargetNotFoundError(Exception):
     pass
 
 class FriendNotFoundError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class SendPartsError(Exception):
+    """SendParts在发送中途失败，sent为失败前已处理的段数"""
+    def __init__(self, sent, error):
+        super().__init__(f'{sent}: {error}')
+        self.sent = sent
+        self.error = error
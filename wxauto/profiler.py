@@ -0,0 +1,245 @@
+"""
+UIA调用分析：统计每个wxauto接口调用中执行的uiautomation操作次数和耗时
+
+默认关闭，不影响性能。Enable()后替换uiautomation.Control的属性读取、查找、导航、输入方法
+以及wxauto窗口类的方法，按线程记录调用栈；Disable()恢复原方法。
+
+Example:
+    >>> from wxauto import profiler
+    >>> with profiler.Profile():
+    ...     wx.GetListenMessage()
+    >>> print(profiler.Report())
+    >>> profiler.ExportFolded('uia.folded')               # 每个栈的操作次数，可用flamegraph.pl生成火焰图
+    >>> profiler.ExportFolded('uia_time.folded', 'time')  # 每个栈的自身耗时（微秒）
+"""
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+# 统计的Control属性
+CONTROL_PROPERTIES = (
+    'Name', 'BoundingRectangle', 'ClassName', 'AutomationId', 'ControlType', 'ControlTypeName',
+    'LocalizedControlType', 'NativeWindowHandle', 'ProcessId', 'IsEnabled', 'IsOffscreen', 'HasKeyboardFocus',
+)
+# 统计的Control方法，包括Control子类中重写的同名方法
+CONTROL_METHODS = (
+    'Exists', 'Refind', 'GetChildren', 'GetParentControl', 'GetFirstChildControl', 'GetLastChildControl',
+    'GetNextSiblingControl', 'GetPreviousSiblingControl', 'GetProgenyControl', 'GetAllProgeny', 'GetRuntimeId',
+    'GetPattern', 'GetValuePattern', 'Click', 'RightClick', 'DoubleClick', 'SendKeys', 'WheelUp', 'WheelDown',
+    'SetFocus', 'SwitchToThisWindow',
+)
+# 统计的uiautomation模块函数
+MODULE_FUNCTIONS = ('FindControl', 'FindControlByCondition', 'SnapshotDescendants')
+# 作为wxauto接口统计的类，(模块名, 类名)，统计其中定义的所有方法
+API_CLASSES = (
+    ('wxauto', 'WeChat'),
+    ('elements', 'WeChatBase'),
+    ('elements', 'ChatWnd'),
+    ('elements', 'WeChatImage'),
+    ('elements', 'ContactWnd'),
+    ('elements', 'SessionElement'),
+    ('elements', 'Message'),
+    ('elements', 'SelfMessage'),
+    ('elements', 'FriendMessage'),
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}      # 栈(tuple) -> [次数, 总耗时, 自身耗时]
+_patched = []    # (owner, name, 原属性)
+_apinames = set()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _record(name, func, *args, **kwargs):
+    stack = _stack()
+    frame = [name, 0.0]
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        key = tuple(i[0] for i in stack)
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        with _lock:
+            data = _stats.get(key)
+            if data is None:
+                data = _stats[key] = [0, 0.0, 0.0]
+            data[0] += 1
+            data[1] += elapsed
+            data[2] += elapsed - frame[1]
+
+
+def _wrap_function(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return _record(name, func, *args, **kwargs)
+    wrapper._profiled = True
+    return wrapper
+
+
+def _patch(owner, attr, name):
+    original = owner.__dict__[attr]
+    if isinstance(original, property):
+        if original.fget is None or getattr(original.fget, '_profiled', False):
+            return
+        wrapped = property(_wrap_function(name, original.fget), original.fset, original.fdel, original.__doc__)
+    elif isinstance(original, (staticmethod, classmethod)):
+        if getattr(original.__func__, '_profiled', False):
+            return
+        wrapped = type(original)(_wrap_function(name, original.__func__))
+    elif callable(original):
+        if getattr(original, '_profiled', False):
+            return
+        wrapped = _wrap_function(name, original)
+    else:
+        return
+    _patched.append((owner, attr, original))
+    setattr(owner, attr, wrapped)
+
+
+def _subclasses(cls):
+    classes = [cls]
+    for sub in cls.__subclasses__():
+        classes.extend(_subclasses(sub))
+    return classes
+
+
+def IsEnabled():
+    """是否已启用"""
+    return bool(_patched)
+
+
+def Enable():
+    """启用统计，替换uiautomation和wxauto中的相关方法"""
+    if _patched:
+        return
+    import importlib
+    from . import uiautomation as uia
+
+    for cls in _subclasses(uia.Control):
+        for attr in CONTROL_PROPERTIES + CONTROL_METHODS:
+            if attr in cls.__dict__:
+                _patch(cls, attr, f'Control.{attr}')
+    for attr in MODULE_FUNCTIONS:
+        if attr in uia.__dict__:
+            _patch(uia, attr, f'uia.{attr}')
+    for module, clsname in API_CLASSES:
+        cls = getattr(importlib.import_module(f'.{module}', __package__), clsname, None)
+        if cls is None:
+            continue
+        for attr, value in list(cls.__dict__.items()):
+            if attr.startswith('__'):
+                continue
+            name = f'{clsname}.{attr}'
+            _apinames.add(name)
+            _patch(cls, attr, name)
+
+
+def Disable():
+    """停止统计，恢复原方法，已统计的数据保留"""
+    while _patched:
+        owner, attr, original = _patched.pop()
+        setattr(owner, attr, original)
+
+
+def Reset():
+    """清空已统计的数据"""
+    with _lock:
+        _stats.clear()
+
+
+@contextlib.contextmanager
+def Profile(reset=True):
+    """在with语句块中启用统计，结束后恢复
+
+    Args:
+        reset (bool, optional): 开始前是否清空已统计的数据
+    """
+    enabled = IsEnabled()
+    if reset:
+        Reset()
+    Enable()
+    try:
+        yield
+    finally:
+        if not enabled:
+            Disable()
+
+
+def GetStats():
+    """按最内层的wxauto接口调用汇总uiautomation操作
+
+    Returns:
+        dict: {接口名: {操作名: (次数, 自身耗时秒数)}}，不在任何接口调用中的操作计入'<none>'
+    """
+    with _lock:
+        items = [(key, tuple(data)) for key, data in _stats.items()]
+    stats = collections.defaultdict(lambda: collections.defaultdict(lambda: [0, 0.0]))
+    for key, (count, _, selftime) in items:
+        op = key[-1]
+        if op in _apinames:
+            continue
+        api = next((i for i in reversed(key) if i in _apinames), '<none>')
+        stats[api][op][0] += count
+        stats[api][op][1] += selftime
+    return {api: {op: tuple(value) for op, value in ops.items()} for api, ops in stats.items()}
+
+
+def GetApiStats():
+    """每个wxauto接口的调用次数和总耗时
+
+    Returns:
+        dict: {接口名: (次数, 总耗时秒数)}
+    """
+    with _lock:
+        items = [(key, tuple(data)) for key, data in _stats.items()]
+    stats = collections.defaultdict(lambda: [0, 0.0])
+    for key, (count, total, _) in items:
+        if key[-1] in _apinames and key[-1] not in key[:-1]:
+            stats[key[-1]][0] += count
+            stats[key[-1]][1] += total
+    return {api: tuple(value) for api, value in stats.items()}
+
+
+def Report():
+    """生成按接口分组的文本报告"""
+    apistats = GetApiStats()
+    lines = []
+    for api, ops in sorted(GetStats().items(), key=lambda i: -sum(v[1] for v in i[1].values())):
+        calls, total = apistats.get(api, (0, 0.0))
+        opcount = sum(v[0] for v in ops.values())
+        optime = sum(v[1] for v in ops.values())
+        lines.append(f'{api}  calls={calls}  time={total*1000:.1f}ms  uia_ops={opcount}  uia_time={optime*1000:.1f}ms')
+        for op, (count, selftime) in sorted(ops.items(), key=lambda i: -i[1][1]):
+            per = f'{count/calls:.1f}/call' if calls else ''
+            lines.append(f'    {op:<36}{count:>8}  {selftime*1000:>10.1f}ms  {per}')
+    return '\n'.join(lines)
+
+
+def ExportFolded(path, weight='count'):
+    """导出折叠栈文件，每行为'帧1;帧2;...;帧n 值'，可直接用于flamegraph.pl等火焰图工具
+
+    Args:
+        path (str): 文件路径
+        weight (str, optional): 'count'为调用次数，'time'为自身耗时（微秒）
+    """
+    with _lock:
+        items = [(key, tuple(data)) for key, data in _stats.items()]
+    with open(path, 'w', encoding='utf-8') as f:
+        for key, (count, _, selftime) in sorted(items):
+            value = count if weight == 'count' else int(selftime * 1e6)
+            if value:
+                f.write(f"{';'.join(key)} {value}\n")
+    return path
@@ -0,0 +1,630 @@
+"""
+模拟微信：在内存中模拟会话列表、独立聊天窗口、消息列表和消息RuntimeId
+
+不依赖Windows和uiautomation，提供与WeChat/ChatWnd相同的接口（见backend.py），
+由脚本调用Receive/ReceiveSys注入消息，通过latency参数模拟各类UI操作的耗时，
+用于在任意平台上复现和测量轮询、发送的性能。
+
+Example:
+    >>> wx = SimWeChat(nickname='bot', latency={'poll': 0.01, 'message': 0.002, 'send': 0.05})
+    >>> wx.AddSession('测试群', members=['张三', '李四'])
+    >>> wx.AddListenChat('测试群')
+    >>> wx.GetListenMessage()
+    {}
+    >>> msg = wx.Receive('测试群', '你好', sender='张三')
+    >>> wx.GetListenMessage()
+    {<wxauto Chat Window at 0x... for 测试群>: [('张三', '你好')]}
+"""
+from .backend import WeChatBackend, ChatWndBackend
+from .errors import TargetNotFoundError, SendPartsError
+from .color import Warnings
+import collections
+import threading
+import itertools
+import datetime
+import time
+import os
+
+
+class SimMessage:
+    """模拟消息，属性与wxauto的消息对象一致
+
+    Attributes:
+        type (str): 'sys'、'time'、'recall'、'self'或'friend'
+        info (tuple): (发送者, 内容, 消息id)
+        sender (str): 发送者
+        sender_remark (str): 好友消息的群昵称，其他消息与sender相同
+        content (str): 消息内容
+        id (str): 消息id，即模拟的RuntimeId
+        time (str): 时间消息对应的时间，格式为%Y-%m-%d %H:%M:%S，其他消息为None
+        arrived (float): 消息进入消息列表的时间戳，用于统计延迟
+    """
+    __slots__ = ('type', 'info', 'sender', 'sender_remark', 'content', 'id', 'time', 'arrived')
+
+    def __init__(self, type, sender, content, id, remark=None, time=None, arrived=None):
+        self.type = type
+        self.info = (sender, content, id)
+        self.sender = sender
+        self.sender_remark = remark if remark is not None else sender
+        self.content = content
+        self.id = id
+        self.time = time
+        self.arrived = arrived
+
+    def __getitem__(self, index):
+        return self.info[index]
+
+    def __str__(self):
+        return self.content
+
+    def __repr__(self):
+        return str(self.info[:2])
+
+
+class SimSession:
+    """模拟会话
+
+    Attributes:
+        name (str): 聊天对象名
+        members (list): 群成员，非群聊为None
+        messages (deque): 消息列表中加载的消息，最多window_size条
+        unread (int): 会话列表中显示的新消息条数
+        hwnd (int): 模拟的窗口句柄，参与生成RuntimeId
+        lasttime (float): 最后一条消息的时间戳
+    """
+    __slots__ = ('name', 'members', 'messages', 'unread', 'hwnd', 'lasttime')
+
+    def __init__(self, name, members, window_size, hwnd):
+        self.name = name
+        self.members = list(members) if members is not None else None
+        self.messages = collections.deque(maxlen=window_size)
+        self.unread = 0
+        self.hwnd = hwnd
+        self.lasttime = 0
+
+    def __repr__(self) -> str:
+        return f"<wxauto Simulated Session {self.name} ({self.unread})>"
+
+
+class SimChatWnd(ChatWndBackend):
+    def __init__(self, who, wx, language='cn'):
+        self.who = who
+        self.language = language
+        self.usedmsgid = []
+        self._wx = wx
+        self.usedmsgid = self._getmsgids()
+
+        self.savepic = False
+        self.savefile = False
+        self.savevoice = False
+
+    def __repr__(self) -> str:
+        return f"<wxauto Chat Window at {hex(id(self))} for {self.who}>"
+
+    def _show(self):
+        self._wx._window(self.who)
+        self._wx._cost('show')
+
+    def Close(self):
+        """关闭独立聊天窗口"""
+        self._wx._cost('show')
+        self._wx.CloseWindow(self.who)
+
+    def SendMsg(self, msg, at=None):
+        """发送文本消息
+
+        Args:
+            msg (str): 要发送的文本消息
+            at (str|list, optional): 要@的人
+        """
+        self._show()
+        self._sendmsg(msg, at)
+
+    def _sendmsg(self, msg, at=None):
+        if at:
+            if isinstance(at, str):
+                at = [at]
+            msg = ''.join([f'@{i} ' for i in at]) + ('\n' + msg if msg else '')
+        self._wx._post(self.who, msg)
+
+    def SendFiles(self, filepath):
+        """发送文件
+
+        Args:
+            filepath (str|list): 要发送文件的绝对路径
+
+        Returns:
+            bool: 是否成功发送文件
+        """
+        filelist = self._wx._filelist(filepath)
+        if not filelist:
+            return False
+        self._show()
+        self._sendfiles(filelist)
+        return True
+
+    def _sendfiles(self, filelist):
+        for file in filelist:
+            self._wx._post(self.who, f'[文件]{os.path.basename(file)}')
+
+    def SendParts(self, parts):
+        """按顺序发送多段消息，只激活一次聊天窗口，与ChatWnd.SendParts一致"""
+        self._show()
+        success = True
+        for sent, (kind, data, at) in enumerate(parts):
+            try:
+                filelist = self._wx._filelist(data) if kind == 'files' else None
+                if kind == 'text':
+                    self._sendmsg(data, at)
+                elif filelist:
+                    self._sendfiles(filelist)
+                else:
+                    success = False
+            except Exception as e:
+                raise SendPartsError(sent, e) from e
+        return success
+
+    def _getmsgids(self):
+        """只读取消息id，不解析消息"""
+        self._wx._window(self.who)
+        msgs = self._wx._messages(self.who)
+        self._wx._cost('poll')
+        self._wx._cost('item', len(msgs))
+        return [i.id for i in msgs]
+
+    def GetAllMessage(self, savepic=False, savefile=False, savevoice=False):
+        '''获取当前窗口中加载的所有聊天记录
+
+        Returns:
+            list: 聊天记录信息
+        '''
+        self._wx._window(self.who)
+        msgs = self._wx._messages(self.who)
+        self._wx._cost('poll')
+        self._wx._cost('message', len(msgs))
+        return msgs
+
+    def GetNewMessage(self, savepic=False, savefile=False, savevoice=False):
+        '''获取当前窗口中加载的新聊天记录
+
+        Returns:
+            list: 新聊天记录信息
+        '''
+        self._wx._window(self.who)
+        msgs = self._wx._messages(self.who)
+        self._wx._cost('poll')
+        self._wx._cost('item', len(msgs))
+        usedmsgid = set(self.usedmsgid)
+        newmsgs = [i for i in msgs if i.id not in usedmsgid]
+        if not newmsgs:
+            return []
+        self._wx._cost('message', len(newmsgs))
+        self.usedmsgid = [i.id for i in msgs]
+        return newmsgs
+
+    def LoadMoreMessage(self):
+        """模拟消息列表只保留最近window_size条消息，没有更多消息可加载"""
+        return False
+
+    def GetGroupMembers(self):
+        """获取当前聊天群成员
+
+        Returns:
+            list: 当前聊天群成员列表，不是群聊时为空列表
+        """
+        self._wx._cost('read')
+        return self._wx._members(self.who) or []
+
+
+class SimWeChat(WeChatBackend):
+    OPS = ('show', 'session', 'open', 'poll', 'item', 'message', 'send', 'read')
+
+    def __init__(
+            self,
+            nickname='wxauto',
+            sessions=None,
+            latency=0,
+            window_size=60,
+            session_view=100,
+            language='cn',
+            debug=False,
+        ) -> None:
+        """模拟微信实例
+
+        Args:
+            nickname (str, optional): 当前登录的微信昵称
+            sessions (list|dict, optional): 初始会话，列表为聊天对象名，字典的值为群成员列表（非群聊为None）
+            latency (float|dict|callable, optional): 模拟的UI操作耗时（秒），
+                float表示每个操作的耗时，dict按操作名指定耗时，callable为latency(op, n)返回总耗时；
+                操作名见SimWeChat.OPS，其中'item'为读取单个消息控件id，'message'为解析单条消息，按数量累计
+            window_size (int, optional): 每个聊天的消息列表中加载的消息条数
+            session_view (int, optional): 会话列表中可见的会话数
+        """
+        self.nickname = nickname
+        self.language = language
+        self.latency = latency
+        self.window_size = window_size
+        self.session_view = session_view
+        self.listen = dict()
+        self.usedmsgid = []
+        self.sessions = collections.OrderedDict()
+        self.windows = set()
+        self.current = None
+        self.sent = collections.deque(maxlen=1000)
+        self.ops = collections.Counter()
+        self._onsend = []
+        self._lock = threading.RLock()
+        self._uilock = threading.Lock()
+        self._msgids = itertools.count(1)
+        self._hwnds = itertools.count(0x10010, 2)
+        if isinstance(sessions, dict):
+            for who, members in sessions.items():
+                self.AddSession(who, members)
+        elif sessions:
+            for who in sessions:
+                self.AddSession(who)
+
+    def __repr__(self) -> str:
+        return f"<wxauto Simulated WeChat at {hex(id(self))} for {self.nickname}>"
+
+    def _cost(self, op, n=1):
+        """记录一次UI操作并按latency阻塞，模拟单个UI线程串行处理所有操作"""
+        if n <= 0:
+            return
+        with self._lock:
+            self.ops[op] += n
+        latency = self.latency
+        if callable(latency):
+            seconds = latency(op, n)
+        elif isinstance(latency, dict):
+            seconds = latency.get(op, 0) * n
+        else:
+            seconds = latency * n
+        if seconds > 0:
+            with self._uilock:
+                time.sleep(seconds)
+
+    def _session(self, who, create=False):
+        with self._lock:
+            session = self.sessions.get(who)
+            if session is None:
+                if not create:
+                    raise TargetNotFoundError(f'未找到聊天：{who}')
+                session = SimSession(who, None, self.window_size, next(self._hwnds))
+                self.sessions[who] = session
+                self.sessions.move_to_end(who, last=False)
+            return session
+
+    def _window(self, who):
+        if who not in self.windows:
+            raise TargetNotFoundError(f'未找到聊天窗口：{who}')
+
+    def _messages(self, who):
+        with self._lock:
+            return list(self._session(who).messages)
+
+    def _members(self, who):
+        with self._lock:
+            members = self._session(who).members
+            return list(members) if members is not None else None
+
+    def _append(self, who, type, sender, content, remark=None):
+        now = time.time()
+        with self._lock:
+            session = self._session(who, create=True)
+            if now - session.lasttime > 300:
+                session.messages.append(SimMessage(
+                    'time', 'Time', datetime.datetime.fromtimestamp(now).strftime('%H:%M'), self._newid(session),
+                    time=datetime.datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S'), arrived=now
+                ))
+            msg = SimMessage(type, sender, content, self._newid(session), remark=remark, arrived=now)
+            session.messages.append(msg)
+            session.lasttime = now
+            if type not in ('self', 'time') and who not in self.windows and who != self.current:
+                session.unread += 1
+            self.sessions.move_to_end(who, last=False)
+        return msg
+
+    def _newid(self, session):
+        return f'42{session.hwnd}{next(self._msgids)}'
+
+    def _post(self, who, content):
+        self._cost('send')
+        msg = self._append(who, 'self', 'Self', content)
+        with self._lock:
+            self.sent.append((who, msg))
+            callbacks = list(self._onsend)
+        for callback in callbacks:
+            callback(who, msg)
+
+    def _filelist(self, filepath):
+        filelist = []
+        if isinstance(filepath, str):
+            filepath = [filepath]
+        elif not isinstance(filepath, (list, tuple, set)):
+            Warnings.lightred(f'filepath参数格式错误：{type(filepath)}，应为str、list、tuple、set格式', stacklevel=3)
+            return filelist
+        for i in filepath:
+            if os.path.exists(i):
+                filelist.append(os.path.realpath(i))
+            else:
+                Warnings.lightred(f'未找到文件：{i}', stacklevel=3)
+        return filelist
+
+    # ---------------- 脚本驱动接口 ----------------
+
+    def AddSession(self, who, members=None):
+        """添加会话并置顶
+
+        Args:
+            who (str): 聊天对象名
+            members (list, optional): 群成员，为None时表示好友私聊
+        """
+        with self._lock:
+            session = self._session(who, create=True)
+            if members is not None:
+                session.members = list(members)
+            self.sessions.move_to_end(who, last=False)
+        return session
+
+    def Receive(self, who, content, sender=None, remark=None):
+        """模拟收到一条好友消息，会话不存在时自动创建
+
+        Args:
+            who (str): 聊天对象名
+            content (str): 消息内容
+            sender (str, optional): 发送者，默认为who
+            remark (str, optional): 发送者的群昵称，默认与sender相同
+
+        Returns:
+            SimMessage: 收到的消息
+        """
+        return self._append(who, 'friend', sender or who, content, remark)
+
+    def ReceiveSys(self, who, content):
+        """模拟一条系统消息，如入群、退群提示"""
+        return self._append(who, 'sys', 'SYS', content)
+
+    def OpenWindow(self, who):
+        """模拟手动打开（双击会话）独立聊天窗口"""
+        with self._lock:
+            session = self._session(who)
+            session.unread = 0
+            self.windows.add(who)
+
+    def CloseWindow(self, who):
+        """模拟关闭独立聊天窗口，之后该窗口的ChatWnd操作会引发TargetNotFoundError"""
+        with self._lock:
+            self.windows.discard(who)
+
+    def OnSend(self, callback):
+        """注册发送回调，每发送一条消息调用callback(who, msg)"""
+        with self._lock:
+            self._onsend.append(callback)
+
+    # ---------------- WeChat接口 ----------------
+
+    def _show(self):
+        self._cost('show')
+
+    def SwitchToChat(self):
+        """切换到聊天页面"""
+        self._show()
+
+    def GetSessionList(self, reset=False, newmessage=False):
+        """获取当前聊天列表中可见的聊天对象
+
+        Returns:
+            SessionList (dict): 聊天对象列表，键为聊天对象名，值为新消息条数
+        """
+        self._cost('session')
+        with self._lock:
+            sessions = list(self.sessions.values())[:self.session_view]
+            SessionList = {i.name: i.unread for i in sessions}
+        if newmessage:
+            return {i: SessionList[i] for i in SessionList if SessionList[i] > 0}
+        return SessionList
+
+    def ChatWith(self, who, timeout=2):
+        '''打开某个聊天框
+
+        Returns:
+            chatname ( str ): 匹配值第一个的完整名字，未找到返回False
+        '''
+        self._show()
+        self._cost('open')
+        with self._lock:
+            if who not in self.sessions:
+                matched = [i for i in self.sessions if who in i]
+                if not matched:
+                    return False
+                who = matched[0]
+            self.current = who
+            self.sessions[who].unread = 0
+        return who
+
+    def CurrentChat(self):
+        '''获取当前聊天对象名'''
+        self._cost('read')
+        return self.current
+
+    def SendMsg(self, msg, who=None, clear=True, at=None):
+        """发送文本消息，与WeChat.SendMsg一致，只在who的独立聊天窗口存在时发送"""
+        if who in self.windows:
+            chat = SimChatWnd(who, self, self.language) if who not in self.listen else self.listen[who]
+            chat.SendMsg(msg, at=at)
+        return None
+
+    def SendParts(self, parts, who):
+        """向who的独立聊天窗口按顺序发送多段消息，与WeChat.SendParts一致"""
+        if who not in self.windows:
+            return False
+        chat = SimChatWnd(who, self, self.language) if who not in self.listen else self.listen[who]
+        return chat.SendParts(parts)
+
+    def SendFiles(self, filepath, who=None):
+        """发送文件
+
+        Returns:
+            bool: 是否成功发送文件
+        """
+        if who in self.windows:
+            chat = SimChatWnd(who, self, self.language) if who not in self.listen else self.listen[who]
+            chat.SendFiles(filepath)
+            return None
+        filelist = self._filelist(filepath)
+        if not filelist:
+            return False
+        if who and who != self.current and not self.ChatWith(who):
+            return False
+        self._show()
+        for file in filelist:
+            self._post(self.current, f'[文件]{os.path.basename(file)}')
+        return True
+
+    def GetAllMessage(self, savepic=False, savefile=False, savevoice=False):
+        '''获取当前窗口中加载的所有聊天记录'''
+        if self.current is None:
+            return []
+        msgs = self._messages(self.current)
+        self._cost('poll')
+        self._cost('message', len(msgs))
+        return msgs
+
+    def GetNextNewMessage(self, savepic=False, savefile=False, savevoice=False, timeout=10):
+        """获取下一个新消息"""
+        if self.current is not None:
+            msgs = self._messages(self.current)
+            self._cost('poll')
+            self._cost('item', len(msgs))
+            usedmsgid = set(self.usedmsgid)
+            newmsgs = [i for i in msgs if i.id not in usedmsgid]
+            self.usedmsgid = [i.id for i in msgs]
+            if newmsgs and len(newmsgs) < len(msgs):
+                self._cost('message', len(newmsgs))
+                return {self.current: newmsgs}
+        sessiondict = self.GetSessionList(newmessage=True)
+        for session, amount in sessiondict.items():
+            self.ChatWith(session)
+            msgs = self._messages(session)
+            self._cost('poll')
+            self._cost('message', amount)
+            self.usedmsgid = [i.id for i in msgs]
+            return {session: msgs[-amount:]}
+        return {}
+
+    def GetAllNewMessage(self, max_round=10):
+        """获取所有新消息"""
+        newmessages = {}
+        for _ in range(max_round):
+            newmsg = self.GetNextNewMessage()
+            if not newmsg:
+                break
+            for session in newmsg:
+                newmessages.setdefault(session, []).extend(newmsg[session])
+        return newmessages
+
+    def AddListenChat(self, who, savepic=False, savefile=False, savevoice=False):
+        """添加监听对象，独立聊天窗口不存在时打开"""
+        if who not in self.windows:
+            if not self.ChatWith(who):
+                raise TargetNotFoundError(f'未找到聊天：{who}')
+            self._cost('open')
+            self.OpenWindow(who)
+        self._listen(who, savepic, savefile, savevoice)
+
+    def _listen(self, who, savepic=False, savefile=False, savevoice=False):
+        chat = SimChatWnd(who, self, self.language)
+        chat.savepic = savepic
+        chat.savefile = savefile
+        chat.savevoice = savevoice
+        self.listen[who] = chat
+
+    def GetChatWindows(self):
+        """获取已打开的独立聊天窗口"""
+        self._cost('read')
+        with self._lock:
+            return list(self.windows)
+
+    def AddListenChats(self, whos, savepic=False, savefile=False, savevoice=False, callback=None):
+        """批量添加监听对象，与WeChat.AddListenChats一致：
+        已有独立窗口的直接监听，会话列表中可见的直接打开（只计'open'），其余搜索后打开（ChatWith + 'open'）
+        """
+        whos = list(dict.fromkeys(whos))
+        results = {}
+
+        def report(who, result):
+            results[who] = result
+            if callback:
+                callback(who, result, len(results), len(whos))
+
+        windows = set(self.GetChatWindows())
+        pending = []
+        for who in whos:
+            if who in self.listen:
+                report(who, 'listening')
+            elif who in windows:
+                self._listen(who, savepic, savefile, savevoice)
+                report(who, 'adopted')
+            else:
+                pending.append(who)
+        if not pending:
+            return results
+
+        self._show()
+        visible = set(list(self.GetSessionList(True))[:-1])
+        searching = []
+        for who in pending:
+            if who not in visible:
+                searching.append(who)
+                continue
+            self._show()
+            self._cost('open')
+            self.OpenWindow(who)
+            self._listen(who, savepic, savefile, savevoice)
+            report(who, 'session')
+        for who in searching:
+            if not self.ChatWith(who) or who not in self.sessions:
+                report(who, False)
+                continue
+            self._cost('open')
+            self.OpenWindow(who)
+            self._listen(who, savepic, savefile, savevoice)
+            report(who, 'search')
+        return results
+
+    def GetListenMessage(self, who=None):
+        """获取监听对象的新消息"""
+        if who and who in self.listen:
+            chat = self.listen[who]
+            return chat.GetNewMessage(savepic=chat.savepic, savefile=chat.savefile, savevoice=chat.savevoice)
+        msgs = {}
+        for chat in list(self.listen.values()):
+            msg = chat.GetNewMessage(savepic=chat.savepic, savefile=chat.savefile, savevoice=chat.savevoice)
+            if msg:
+                msgs[chat] = msg
+        return msgs
+
+    def GetAllListenChat(self):
+        """获取所有监听对象"""
+        return self.listen
+
+    def RemoveListenChat(self, who, close=False):
+        """移除监听对象，close为True时同时关闭独立聊天窗口"""
+        chat = self.listen.pop(who, None)
+        if chat:
+            if close:
+                chat.Close()
+        else:
+            Warnings.lightred(f'未找到监听对象：{who}', stacklevel=2)
+
+    def GetGroupMembers(self):
+        """获取当前聊天群成员
+
+        Returns:
+            list: 当前聊天群成员列表，非群聊为None
+        """
+        self._cost('read')
+        if self.current is None:
+            return None
+        return self._members(self.current)
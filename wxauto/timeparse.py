@@ -0,0 +1,149 @@
+"""
+微信时间标签解析
+
+消息列表中的时间消息显示为相对时间标签，如'12:30'、'昨天 12:30'、'星期一 12:30'、
+'Yesterday 12:30 PM'、'2024年5月1日 12:30'，解析结果为'%Y-%m-%d %H:%M:%S'格式的字符串。
+
+  - 所有格式的正则在导入时编译，按顺序匹配
+  - 批量解析(ParseTimes)时整批使用同一个参考时间，相同的标签只解析一次
+  - 解析结果按(标签, 参考日期)缓存，相对时间标签在同一天内的结果不变
+
+支持简体(cn)、繁体(cn_t)和英文(en)界面的格式，无法解析时返回None。
+
+Example:
+    >>> ParseTime('昨天 9:05', now=datetime(2024, 5, 2, 10, 0))
+    '2024-05-01 09:05:00'
+    >>> ParseTimes(['12:30', 'Yesterday 1:05 PM', 'abc'], now=datetime(2024, 5, 2, 10, 0))
+    ['2024-05-02 12:30:00', '2024-05-01 13:05:00', None]
+"""
+from datetime import datetime, date, timedelta
+import functools
+import re
+
+CACHE_SIZE = 2048
+
+_MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+_EN_WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+_CN_WEEKDAYS = '一二三四五六日'
+_RELATIVE_DAYS = {'今天': 0, 'today': 0, '昨天': 1, 'yesterday': 1, '前天': 2}
+_AFTERNOON = ('下午', '晚上', 'pm')
+_MORNING = ('上午', '早上', '凌晨', 'am')
+
+_TIME = (
+    r'(?:(?P<cnampm>上午|下午|早上|中午|晚上|凌晨)\s*)?'
+    r'(?P<hour>\d{1,2}):(?P<minute>\d{1,2})(?::(?P<second>\d{2}))?'
+    r'(?:\s*(?P<enampm>[AaPp]\.?[Mm]\.?))?'
+)
+_MONTHNAME = r'(?P<monthname>' + '|'.join(m.capitalize() for m in _MONTHS) + r')[a-z]*\.?'
+
+# 日期部分，和_TIME组合为'^日期 时间$'，没有日期部分的标签为当天
+_DATES = (
+    r'(?P<year>\d{4})年(?P<month>\d{1,2})月(?P<day>\d{1,2})日',
+    r'(?P<month>\d{1,2})月(?P<day>\d{1,2})日',
+    r'(?P<year>\d{4})[-/.](?P<month>\d{1,2})[-/.](?P<day>\d{1,2})',
+    r'(?P<month>\d{1,2})/(?P<day>\d{1,2})/(?P<year>\d{2}|\d{4})',
+    r'(?P<month>\d{1,2})-(?P<day>\d{1,2})',
+    r'(?P<relative>今天|昨天|前天|[Tt]oday|[Yy]esterday)',
+    r'(?:星期|週|周)(?P<cnweekday>[一二三四五六日天])',
+    r'(?P<enweekday>Mon|Tue|Wed|Thu|Fri|Sat|Sun)[a-z]*',
+    _MONTHNAME + r'\s+(?P<day>\d{1,2})(?:,?\s+(?P<year>\d{4}))?,?',
+    r'(?P<day>\d{1,2})\s+' + _MONTHNAME + r'(?:\s+(?P<year>\d{4}))?,?',
+)
+
+PATTERNS = [re.compile(r'^' + _TIME + r'$')] + [re.compile(r'^' + d + r'\s*' + _TIME + r'$') for d in _DATES]
+
+
+def _hour(groups):
+    hour = int(groups['hour'])
+    ampm = (groups['cnampm'] or groups['enampm'] or '').replace('.', '').lower()
+    if hour < 12 and (ampm in _AFTERNOON or (ampm == '中午' and hour < 11)):
+        hour += 12
+    elif hour == 12 and ampm in _MORNING:
+        hour = 0
+    return hour
+
+
+def _date(groups, today):
+    if groups.get('relative'):
+        return today - timedelta(days=_RELATIVE_DAYS[groups['relative'].lower()])
+    weekday = groups.get('cnweekday')
+    if weekday:
+        weekday = _CN_WEEKDAYS.index('日' if weekday == '天' else weekday)
+    elif groups.get('enweekday'):
+        weekday = _EN_WEEKDAYS.index(groups['enweekday'].lower())
+    if weekday is not None:
+        return today - timedelta(days=(today.weekday() - weekday) % 7)
+    if not groups.get('day'):
+        return today
+    month = _MONTHS.index(groups['monthname'].lower()) + 1 if groups.get('monthname') else int(groups['month'])
+    day = int(groups['day'])
+    if groups.get('year'):
+        year = int(groups['year'])
+        return date(year + 2000 if year < 100 else year, month, day)
+    # 不带年份的日期为最近一年中的这一天，跨年后显示的去年12月的日期不会被算成今年
+    result = date(today.year, month, day)
+    if result > today:
+        result = date(today.year - 1, month, day)
+    return result
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _parse(time_str, today):
+    time_str = time_str.strip()
+    for pattern in PATTERNS:
+        match = pattern.match(time_str)
+        if match:
+            break
+    else:
+        return None
+    groups = match.groupdict()
+    try:
+        day = _date(groups, today)
+        return datetime(
+            day.year, day.month, day.day, _hour(groups), int(groups['minute']), int(groups['second'] or 0)
+        ).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def ParseTime(time_str, now=None):
+    """解析一个微信时间标签
+
+    Args:
+        time_str (str): 时间标签
+        now (datetime, optional): 参考时间，默认为当前时间
+
+    Returns:
+        str: '%Y-%m-%d %H:%M:%S'格式的时间，无法解析时返回None
+    """
+    if not time_str:
+        return None
+    return _parse(time_str, (now or datetime.now()).date())
+
+
+def ParseTimes(time_strs, now=None):
+    """批量解析微信时间标签，整批使用同一个参考时间
+
+    Args:
+        time_strs (list): 时间标签列表
+        now (datetime, optional): 参考时间，默认为当前时间
+
+    Returns:
+        list: 与time_strs一一对应的解析结果，无法解析的为None
+    """
+    today = (now or datetime.now()).date()
+    results = {}
+    for time_str in time_strs:
+        if time_str not in results:
+            results[time_str] = _parse(time_str, today) if time_str else None
+    return [results[time_str] for time_str in time_strs]
+
+
+def CacheInfo():
+    """解析缓存的命中情况"""
+    return _parse.cache_info()
+
+
+def ClearCache():
+    """清空解析缓存"""
+    _parse.cache_clear()
@@ -14,15 +14,15 @@ This means that the code can be freely copied and distributed, and costs nothing
 """
 import os
 import sys
+import atexit
 import time
 import datetime
 import re
 import threading
+import collections
 import ctypes
 import ctypes.wintypes
 import comtypes #need pip install comtypes
-import comtypes.client
-from PIL import ImageGrab
 from typing import (Any, Callable, Dict, List, Iterable, Tuple)  # need pip install typing for Python3.4 or lower
 TreeNode = Any
 
@@ -36,6 +36,9 @@ OPERATION_WAIT_TIME = 0.5
 MAX_PATH = 260
 DEBUG_SEARCH_TIME = False
 DEBUG_EXIST_DISAPPEAR = False
+USE_NATIVE_SEARCH = True  # compile searchProperties to IUIAutomationCondition and search in provider side if possible
+USE_LOCATOR_PATH_CACHE = True  # try the child index path where the same locator was found last time before searching
+OperationCounts = collections.Counter()  # UIA operations by kind since the module was imported, see `CountOperation`
 S_OK = 0
 
 IsNT6orHigher = os.sys.getwindowsversion().major >= 6
@@ -43,6 +46,16 @@ ProcessTime = time.perf_counter  #this returns nearly 0 when first call it if py
 ProcessTime()  # need to call it once if python version <= 3.6
 
 
+def CountOperation(op: str, n: int = 1) -> None:
+    """
+    Count UIA operations of kind op in `OperationCounts`.
+    op: str, one of 'search', 'search_cached', 'navigate', 'children', 'property', 'input'.
+    n: int.
+    The counter is shared by all threads, increments from concurrent threads may be lost occasionally.
+    """
+    OperationCounts[op] += n
+
+
 class _AutomationClient:
     _instance = None
 
@@ -54,6 +67,7 @@ class _AutomationClient:
         return cls._instance
 
     def __init__(self):
+        import comtypes.client  # imported on first use, it is slow to import
         tryCount = 3
         for retry in range(tryCount):
             try:
@@ -830,6 +844,17 @@ class NavigateDirection:
     LastChild = 4
 
 
+class TreeScope:
+    """
+    TreeScope from IUIAutomation.
+    Refer https://docs.microsoft.com/en-us/windows/desktop/api/uiautomationclient/ne-uiautomationclient-treescope
+    """
+    Element = 0x1
+    Children = 0x2
+    Descendants = 0x4
+    Subtree = Element | Children | Descendants
+
+
 class DockPosition:
     """
     DockPosition from IUIAutomation.
@@ -2836,6 +2861,8 @@ class Logger:
     """
     FileName = '@AutomationLog.txt'
     _SelfFileName = os.path.split(__file__)[1]
+    _files = {}  # file path -> opened file, kept open between writes
+    _filesLock = threading.Lock()
     ColorNames = {
         "Black": ConsoleColor.Black,
         "DarkBlue": ConsoleColor.DarkBlue,
@@ -2859,6 +2886,27 @@ class Logger:
     def SetLogFile(path: str) -> None:
         Logger.FileName = path
 
+    @staticmethod
+    def _GetFile(fileName: str):
+        """
+        Return the opened file for fileName, open it in append mode on the first write.
+        """
+        fout = Logger._files.get(fileName)
+        if fout is None:
+            fout = Logger._files[fileName] = open(fileName, 'a+', encoding='utf-8')
+        return fout
+
+    @staticmethod
+    def CloseLogFiles() -> None:
+        """Close all log files opened by Write, they will be reopened on the next write."""
+        with Logger._filesLock:
+            for fout in Logger._files.values():
+                try:
+                    fout.close()
+                except Exception:
+                    pass
+            Logger._files.clear()
+
     @staticmethod
     def Write(log: Any, consoleColor: int = ConsoleColor.Default, writeToFile: bool = True, printToStdout: bool = True, logFile: str = None, printTruncateLen: int = 0) -> None:
         """
@@ -2892,16 +2940,15 @@ class Logger:
         if not writeToFile:
             return
         fileName = logFile if logFile else Logger.FileName
-        fout = None
-        try:
-            fout = open(fileName, 'a+', encoding='utf-8')
-            fout.write(log)
-        except Exception as ex:
-            if sys.stdout:
-                sys.stdout.write(ex.__class__.__name__ + ': can\'t write the log!')
-        finally:
-            if fout:
-                fout.close()
+        with Logger._filesLock:
+            try:
+                fout = Logger._GetFile(fileName)
+                fout.write(log)
+                fout.flush()
+            except Exception as ex:
+                Logger._files.pop(fileName, None)
+                if sys.stdout:
+                    sys.stdout.write(ex.__class__.__name__ + ': can\'t write the log!')
 
     @staticmethod
     def WriteLine(log: Any, consoleColor: int = -1, writeToFile: bool = True, printToStdout: bool = True, logFile: str = None) -> None:
@@ -3005,10 +3052,14 @@ class Logger:
     @staticmethod
     def DeleteLog() -> None:
         """Delete log file."""
+        Logger.CloseLogFiles()
         if os.path.exists(Logger.FileName):
             os.remove(Logger.FileName)
 
 
+atexit.register(Logger.CloseLogFiles)
+
+
 class Bitmap:
     """
     A simple Bitmap class wraps Windows GDI+ Gdiplus::Bitmap, but may not have high efficiency.
@@ -5297,6 +5348,9 @@ class Control():
         self.searchProperties = searchProperties
         regName = searchProperties.get('RegexName', '')
         self.regexName = re.compile(regName) if regName else None
+        self._searchCondition = None
+        self._searchConditionBuilt = False
+        self._progenyLevels = None
         self._supportedPatterns = {}
 
     def __str__(self) -> str:
@@ -5342,6 +5396,7 @@ class Control():
         searchProperties: dict, same as searchProperties in `Control.__init__`.
         """
         self.searchProperties.update(searchProperties)
+        self._searchConditionBuilt = False
         if 'Depth' in searchProperties:
             self.searchDepth = searchProperties['Depth']
         if 'RegexName' in searchProperties:
@@ -5356,6 +5411,19 @@ class Control():
             del self.searchProperties[key]
             if key == 'RegexName':
                 self.regexName = None
+        self._searchConditionBuilt = False
+
+    def GetSearchCondition(self):
+        """
+        Compile searchProperties to a `ctypes.POINTER(IUIAutomationCondition)`.
+        Return None if a key can only be compared in python(SubName, RegexName, Depth, Compare),
+            the search falls back to `FindControl` then.
+        The condition is built once and reused until searchProperties changes.
+        """
+        if not self._searchConditionBuilt:
+            self._searchCondition = CreateSearchCondition(self.searchProperties)
+            self._searchConditionBuilt = True
+        return self._searchCondition
 
     def GetSearchPropertiesStr(self) -> str:
         strs = ['{}: {}'.format(k, ControlTypeNames[v] if k == 'ControlType' else repr(v)) for k, v in self.searchProperties.items()]
@@ -5444,6 +5512,7 @@ class Control():
         Call IUIAutomationElement::get_CurrentAutomationId.
         Refer https://docs.microsoft.com/en-us/windows/desktop/api/uiautomationclient/nf-uiautomationclient-iuiautomationelement-get_currentautomationid
         """
+        CountOperation('property')
         return self.Element.CurrentAutomationId
 
     @property
@@ -5457,6 +5526,7 @@ class Control():
         rect = control.BoundingRectangle
         print(rect.left, rect.top, rect.right, rect.bottom, rect.width(), rect.height(), rect.xcenter(), rect.ycenter())
         """
+        CountOperation('property')
         rect = self.Element.CurrentBoundingRectangle
         return Rect(rect.left, rect.top, rect.right, rect.bottom)
     
@@ -5468,6 +5538,7 @@ class Control():
         """
         rect = self.Element.CurrentBoundingRectangle
         bbox = (rect.left, rect.top, rect.right, rect.bottom)
+        from PIL import ImageGrab
         img = ImageGrab.grab(bbox=bbox, all_screens=True)
         if savePath is None:
             savePath = os.path.join(os.getcwd(), 'ControlScreenShot.png')
@@ -5481,6 +5552,7 @@ class Control():
         Call IUIAutomationElement::get_CurrentClassName.
         Refer https://docs.microsoft.com/en-us/windows/desktop/api/uiautomationclient/nf-uiautomationclient-iuiautomationelement-get_currentclassname
         """
+        CountOperation('property')
         return self.Element.CurrentClassName
 
     @property
@@ -5491,6 +5563,7 @@ class Control():
         Call IUIAutomationElement::get_CurrentControlType.
         Refer https://docs.microsoft.com/en-us/windows/desktop/api/uiautomationclient/nf-uiautomationclient-iuiautomationelement-get_currentcontroltype
         """
+        CountOperation('property')
         return self.Element.CurrentControlType
 
     #@property
@@ -5652,6 +5725,7 @@ class Control():
         Call IUIAutomationElement::get_CurrentName.
         Refer https://docs.microsoft.com/en-us/windows/desktop/api/uiautomationclient/nf-uiautomationclient-iuiautomationelement-get_currentname
         """
+        CountOperation('property')
         return self.Element.CurrentName or ''   # CurrentName may be None
 
     @property
@@ -5763,6 +5837,7 @@ class Control():
         Return List[int], a list of int.
         Refer https://docs.microsoft.com/en-us/windows/desktop/api/uiautomationclient/nf-uiautomationclient-iuiautomationelement-getruntimeid
         """
+        CountOperation('property')
         return self.Element.GetRuntimeId()
 
     #QueryInterface
@@ -5785,7 +5860,7 @@ class Control():
         Return `ctypes.POINTER(IUIAutomationElement)`.
         """
         if not self._element:
-            self.Refind(maxSearchSeconds=TIME_OUT_SECOND, searchIntervalSeconds=self.searchInterval)
+            self.Refind(maxSearchSeconds=GetSearchTimeout(), searchIntervalSeconds=self.searchInterval)
         return self._element
 
     @property
@@ -5845,6 +5920,7 @@ class Control():
         """
         Return `Control` subclass or None.
         """
+        CountOperation('navigate')
         ele = _AutomationClient.instance().ViewWalker.GetParentElement(self.Element)
         return Control.CreateControlFromElement(ele)
 
@@ -5852,6 +5928,7 @@ class Control():
         """
         Return `Control` subclass or None.
         """
+        CountOperation('navigate')
         ele = _AutomationClient.instance().ViewWalker.GetFirstChildElement(self.Element)
         return Control.CreateControlFromElement(ele)
 
@@ -5859,6 +5936,7 @@ class Control():
         """
         Return `Control` subclass or None.
         """
+        CountOperation('navigate')
         ele = _AutomationClient.instance().ViewWalker.GetLastChildElement(self.Element)
         return Control.CreateControlFromElement(ele)
 
@@ -5866,6 +5944,7 @@ class Control():
         """
         Return `Control` subclass or None.
         """
+        CountOperation('navigate')
         ele = _AutomationClient.instance().ViewWalker.GetNextSiblingElement(self.Element)
         return Control.CreateControlFromElement(ele)
 
@@ -5873,6 +5952,7 @@ class Control():
         """
         Return `Control` subclass or None.
         """
+        CountOperation('navigate')
         ele = _AutomationClient.instance().ViewWalker.GetPreviousSiblingElement(self.Element)
         return Control.CreateControlFromElement(ele)
 
@@ -5916,23 +5996,48 @@ class Control():
         else:
             return None
         
-    def GetAllProgeny(self) -> List[List['Control']]:
+    def _GetProgenyItem(self, depth: int, index: int) -> 'Control':
+        """
+        Get the nth control in the mth depth, the levels are built breadth-first and only as far as needed.
+        Each level is a list [controls, next parent index, complete], kept until `ClearProgenyCache` is called
+            or the control is searched again.
+        Return `Control` subclass or None.
+        """
+        if self._progenyLevels is None:
+            self._progenyLevels = [[[self], 1, True]]
+        levels = self._progenyLevels
+        while len(levels) <= depth:
+            levels.append([[], 0, False])
+        level = levels[depth]
+        while index >= len(level[0]) and not level[2]:
+            parent = self._GetProgenyItem(depth - 1, level[1])
+            if parent is None:
+                level[2] = True
+                break
+            level[0].extend(parent.GetChildren())
+            level[1] += 1
+        if index < len(level[0]):
+            return level[0][index]
+
+    def ClearProgenyCache(self) -> None:
+        """Forget the progeny built by `GetProgenyControl` and `GetAllProgeny`."""
+        self._progenyLevels = None
+
+    def GetAllProgeny(self, maxDepth: int = 0xFFFFFFFF) -> List[List['Control']]:
         """
         Get all progeny controls.
+        maxDepth: int, the deepest level to get, 0 is self.
         Return List[List[Control]], a list of list of `Control` subclasses.
         """
         all_elements = []
-
-        def find_all_elements(element, depth=0):
-            children = element.GetChildren()
-            if depth == len(all_elements):
-                all_elements.append([])
-            all_elements[depth].append(element)
-            for child in children:
-                find_all_elements(child, depth+1)
-            return all_elements
-        
-        return find_all_elements(self)
+        depth = 0
+        while depth <= maxDepth and self._GetProgenyItem(depth, 0) is not None:
+            index = 0
+            while self._GetProgenyItem(depth, index) is not None:
+                index += 1
+            all_elements.append(self._progenyLevels[depth][0])
+            depth += 1
+        return all_elements
     
     def GetProgenyControl(self, depth: int=1, index: int=0, control_type: str = None) -> 'Control':
         """
@@ -5941,21 +6046,27 @@ class Control():
         index: int, starts with 0.
         control_type: `Control` or its subclass, if not None, only return the nth control that matches the control_type.
         Return `Control` subclass or None.
+        Only the levels above depth and the controls before the result are built, see `ClearProgenyCache`.
         """
-        progeny = self.GetAllProgeny()
-        try:
-            controls = progeny[depth]
-            if control_type:
-                controls = [child for child in controls if child.ControlTypeName == control_type]
-            if index < len(controls):
-                return controls[index]
-        except IndexError:
+        if depth < 0 or index < 0:
             return
+        found = 0
+        i = 0
+        while True:
+            control = self._GetProgenyItem(depth, i)
+            if control is None:
+                return
+            if not control_type or control.ControlTypeName == control_type:
+                if found == index:
+                    return control
+                found += 1
+            i += 1
 
     def GetChildren(self) -> List['Control']:
         """
         Return List[Control], a list of `Control` subclasses.
         """
+        CountOperation('children')
         children = []
         child = self.GetFirstChildControl()
         while child:
@@ -6020,6 +6131,7 @@ class Control():
         if len(self.searchProperties) == 0:
             raise LookupError("control's searchProperties must not be empty!")
         self._element = None
+        self._progenyLevels = None
         startTime = ProcessTime()
         # Use same timeout(s) parameters for resolve all parents
         prev =  self.searchFromControl
@@ -6030,11 +6142,30 @@ class Control():
         startTime2 = ProcessTime()
         if DEBUG_SEARCH_TIME:
             startDateTime = datetime.datetime.now()
+        pathKey = LocatorPathCache.MakeKey(self) if USE_LOCATOR_PATH_CACHE else None
+        if pathKey:
+            rootElement = prev.Element if prev else GetRootControl().Element
+            element = LocatorPathCache.Find(pathKey, rootElement, self)
+            CountOperation('search_cached')
+            if element:
+                self._element = element
+                return True
+        condition = self.GetSearchCondition() if USE_NATIVE_SEARCH else None
         while True:
-            control = FindControl(self.searchFromControl, self._CompareFunction, self.searchDepth, False, self.foundIndex)
+            CountOperation('search')
+            control = None
+            if condition:
+                try:
+                    control = FindControlByCondition(self.searchFromControl, condition, self.searchDepth, False, self.foundIndex)
+                except comtypes.COMError:
+                    condition = None
+            if not condition:
+                control = FindControl(self.searchFromControl, self._CompareFunction, self.searchDepth, False, self.foundIndex)
             if control:
                 self._element = control.Element
                 control._element = 0  # control will be destroyed, but the element needs to be stroed in self._element
+                if pathKey:
+                    LocatorPathCache.Store(pathKey, rootElement, self._element)
                 if DEBUG_SEARCH_TIME:
                     Logger.ColorfullyLog('{} TraverseControls: <Color=Cyan>{}</Color>, SearchTime: <Color=Cyan>{:.3f}</Color>s[{} - {}]'.format(
                         self.GetColorfulSearchPropertiesStr(), control.traverseCount, ProcessTime() - startTime2,
@@ -6073,14 +6204,16 @@ class Control():
                     Logger.ColorfullyLog(self.GetColorfulSearchPropertiesStr() + '<Color=Red> does not disappear.</Color>')
                 return False
 
-    def Refind(self, maxSearchSeconds: float = TIME_OUT_SECOND, searchIntervalSeconds: float = SEARCH_INTERVAL, raiseException: bool = True) -> bool:
+    def Refind(self, maxSearchSeconds: float = None, searchIntervalSeconds: float = SEARCH_INTERVAL, raiseException: bool = True) -> bool:
         """
         Refind the control every searchIntervalSeconds seconds in maxSearchSeconds seconds.
-        maxSearchSeconds: float.
+        maxSearchSeconds: float, if None, use the search timeout of current thread, see `GetSearchTimeout`.
         searchIntervalSeconds: float.
         raiseException: bool, if True, raise a LookupError if timeout.
         Return bool, True if find.
         """
+        if maxSearchSeconds is None:
+            maxSearchSeconds = GetSearchTimeout()
         if not self.Exists(maxSearchSeconds, searchIntervalSeconds, False if raiseException else DEBUG_EXIST_DISAPPEAR):
             if raiseException:
                 # Logger.ColorfullyLog('<Color=Red>Find Control Timeout: </Color>' + self.GetColorfulSearchPropertiesStr())
@@ -6139,6 +6272,7 @@ class Control():
         Click(10, 10): click left+10, top+10.
         Click(-10, -10): click right-10, bottom-10.
         """
+        CountOperation('input')
         point = self.MoveCursorToInnerPos(x, y, ratioX, ratioY, simulateMove)
         if point:
             Click(point[0], point[1], waitTime)
@@ -6173,6 +6307,7 @@ class Control():
         RightClick(10, 10): right click left+10, top+10.
         RightClick(-10, -10): right click right-10, bottom-10.
         """
+        CountOperation('input')
         point = self.MoveCursorToInnerPos(x, y, ratioX, ratioY, simulateMove)
         if point:
             RightClick(point[0], point[1], waitTime)
@@ -6190,6 +6325,7 @@ class Control():
         DoubleClick(10, 10): double click left+10, top+10.
         DoubleClick(-10, -10): double click right-10, bottom-10.
         """
+        CountOperation('input')
         x, y = self.MoveCursorToInnerPos(x, y, ratioX, ratioY, simulateMove)
         Click(x, y, GetDoubleClickTime() * 1.0 / 2000)
         Click(x, y, waitTime)
@@ -6324,6 +6460,7 @@ class Control():
         waitTime: float.
         charMode: bool, if False, the text typied is depend on the input method if a input method is on.
         """
+        CountOperation('input')
         self.SetFocus()
         SendKeys(text, interval, waitTime, charMode)
 
@@ -7540,6 +7677,116 @@ ControlConstructors = {
 }
 
 
+class LocatorPathCache:
+    """
+    Remember the child index path from searchFromControl to the control found by a locator.
+    A locator built again with the same searchFromControl, searchProperties and searchDepth is resolved
+    by walking that path and verifying the control with `Control._CompareFunction`,
+    a full search is only needed if the path is missing or the verification fails.
+    Only locators with foundIndex 1 and without Compare are cached.
+    """
+    MaxSize = 1024
+    MaxPathLength = 64
+    Hits = 0
+    Misses = 0
+    _paths = collections.OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def MakeKey(control: Control) -> tuple:
+        """
+        Return a hashable key for control's locator or None if it can't be cached.
+        control: `Control` or its subclass, its searchFromControl must have been found.
+        """
+        if control.foundIndex != 1 or 'Compare' in control.searchProperties:
+            return None
+        try:
+            rootId = tuple(control.searchFromControl.GetRuntimeId()) if control.searchFromControl else ()
+        except comtypes.COMError:
+            return None
+        return (rootId, control.searchDepth, tuple(sorted(control.searchProperties.items())))
+
+    @staticmethod
+    def Find(key: tuple, rootElement, control: Control):
+        """
+        Walk the cached path from rootElement and verify the element with control's searchProperties.
+        Return `ctypes.POINTER(IUIAutomationElement)` or None on a miss.
+        """
+        with LocatorPathCache._lock:
+            path = LocatorPathCache._paths.get(key)
+        element = None
+        if path is not None and len(path) <= control.searchDepth:
+            walker = _AutomationClient.instance().ViewWalker
+            try:
+                element = rootElement
+                for index in path:
+                    element = walker.GetFirstChildElement(element)
+                    for _ in range(index):
+                        if not element:
+                            break
+                        element = walker.GetNextSiblingElement(element)
+                    if not element:
+                        break
+                candidate = Control.CreateControlFromElement(element) if element else None
+                if not candidate or not control._CompareFunction(candidate, len(path)):
+                    element = None
+            except comtypes.COMError:
+                element = None
+        with LocatorPathCache._lock:
+            if element:
+                LocatorPathCache.Hits += 1
+                if key in LocatorPathCache._paths:
+                    LocatorPathCache._paths.move_to_end(key)
+            else:
+                LocatorPathCache.Misses += 1
+                LocatorPathCache._paths.pop(key, None)
+        return element
+
+    @staticmethod
+    def Store(key: tuple, rootElement, element) -> None:
+        """
+        Compute the child index path from rootElement to element and remember it for key.
+        """
+        automation = _AutomationClient.instance().IUIAutomation
+        walker = _AutomationClient.instance().ViewWalker
+        path = []
+        try:
+            while not automation.CompareElements(rootElement, element):
+                if len(path) >= LocatorPathCache.MaxPathLength:
+                    return
+                index = 0
+                sibling = walker.GetPreviousSiblingElement(element)
+                while sibling:
+                    index += 1
+                    sibling = walker.GetPreviousSiblingElement(sibling)
+                path.append(index)
+                element = walker.GetParentElement(element)
+                if not element:
+                    return
+        except comtypes.COMError:
+            return
+        path.reverse()
+        with LocatorPathCache._lock:
+            LocatorPathCache._paths[key] = path
+            LocatorPathCache._paths.move_to_end(key)
+            while len(LocatorPathCache._paths) > LocatorPathCache.MaxSize:
+                LocatorPathCache._paths.popitem(last=False)
+
+    @staticmethod
+    def Clear() -> None:
+        """Forget all paths and reset the counters."""
+        with LocatorPathCache._lock:
+            LocatorPathCache._paths.clear()
+            LocatorPathCache.Hits = 0
+            LocatorPathCache.Misses = 0
+
+    @staticmethod
+    def GetStats() -> Dict[str, int]:
+        """Return dict, {'hits': int, 'misses': int, 'size': int}."""
+        with LocatorPathCache._lock:
+            return {'hits': LocatorPathCache.Hits, 'misses': LocatorPathCache.Misses, 'size': len(LocatorPathCache._paths)}
+
+
 class UIAutomationInitializerInThread:
     def __init__(self, debug: bool = False):
         self.debug = debug
@@ -7581,11 +7828,46 @@ def SetGlobalSearchTimeout(seconds: float) -> None:
     To make this available, you need explicitly import uiautomation:
         from uiautomation import uiautomation as auto
         auto.SetGlobalSearchTimeout(10)
+    This changes the default of all threads, use `SearchTimeout` to change it for one call.
     """
     global TIME_OUT_SECOND
     TIME_OUT_SECOND = seconds
 
 
+_SearchTimeoutLocal = threading.local()
+
+
+def GetSearchTimeout() -> float:
+    """
+    Return float, the search timeout used by `Control.Element` and `Control.Refind` in current thread,
+        the innermost `SearchTimeout` if there is one, otherwise TIME_OUT_SECOND.
+    """
+    stack = getattr(_SearchTimeoutLocal, 'stack', None)
+    return stack[-1] if stack else TIME_OUT_SECOND
+
+
+class SearchTimeout:
+    """
+    Context manager that changes the search timeout for current thread only.
+    Other threads keep their own timeout, so controls can be searched in several threads at the same time.
+
+    with SearchTimeout(0):
+        name = control.TextControl().Name  # raise LookupError at once if the control doesn't exist
+    """
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __enter__(self) -> 'SearchTimeout':
+        stack = getattr(_SearchTimeoutLocal, 'stack', None)
+        if stack is None:
+            stack = _SearchTimeoutLocal.stack = []
+        stack.append(self.seconds)
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, exceptionTraceback) -> None:
+        _SearchTimeoutLocal.stack.pop()
+
+
 def WaitForExist(control: Control, timeout: float) -> bool:
     """
     Check if control exists in timeout seconds.
@@ -7920,6 +8202,133 @@ def FindControl(control: Control, compare: Callable[[Control, int], bool], maxDe
                 return child
 
 
+_NativeSearchPropertyIds = {
+    'ControlType': PropertyId.ControlTypeProperty,
+    'ClassName': PropertyId.ClassNameProperty,
+    'AutomationId': PropertyId.AutomationIdProperty,
+    'Name': PropertyId.NameProperty,
+}
+
+
+def CreateSearchCondition(searchProperties: Dict[str, Any]):
+    """
+    Create an IUIAutomationCondition from searchProperties.
+    searchProperties: dict, same as searchProperties in `Control.__init__`.
+    Only ControlType, ClassName, AutomationId and Name can be compiled, an empty Name is left to python
+        because a provider may return NULL instead of an empty BSTR.
+    Return `ctypes.POINTER(IUIAutomationCondition)` or None if searchProperties can not be compiled.
+    """
+    if not searchProperties:
+        return None
+    for key, value in searchProperties.items():
+        if key not in _NativeSearchPropertyIds:
+            return None
+        if key == 'Name' and not value:
+            return None
+    automation = _AutomationClient.instance().IUIAutomation
+    condition = None
+    for key, value in searchProperties.items():
+        propertyCondition = automation.CreatePropertyCondition(_NativeSearchPropertyIds[key], value)
+        condition = propertyCondition if condition is None else automation.CreateAndCondition(condition, propertyCondition)
+    return condition
+
+
+def _GetRelativeDepth(rootElement, element, maxDepth: int) -> int:
+    """
+    Return the depth of element below rootElement, or -1 if it is deeper than maxDepth.
+    """
+    automation = _AutomationClient.instance().IUIAutomation
+    walker = _AutomationClient.instance().ViewWalker
+    depth = 0
+    while element and depth <= maxDepth:
+        if automation.CompareElements(rootElement, element):
+            return depth
+        element = walker.GetParentElement(element)
+        depth += 1
+    return -1
+
+
+def FindControlByCondition(control: Control, condition, maxDepth: int = 0xFFFFFFFF, findFromSelf: bool = False, foundIndex: int = 1) -> Control:
+    """
+    Same as `FindControl`, but the search runs in UIAutomation with IUIAutomationElement::FindFirst/FindAll
+        instead of walking the tree and comparing properties in python.
+    control: `Control` or its subclass.
+    condition: `ctypes.POINTER(IUIAutomationCondition)`, see `CreateSearchCondition`.
+    maxDepth: int, enum depth.
+    findFromSelf: bool, if False, do not compare self.
+    foundIndex: int, starts with 1, >= 1.
+    Return `Control` subclass or None if not find.
+    """
+    if maxDepth <= 0 and not findFromSelf:
+        return None
+    if not control:
+        control = GetRootControl()
+    rootElement = control.Element
+    if maxDepth == 1:
+        scope = TreeScope.Children
+    else:
+        scope = TreeScope.Descendants
+    if findFromSelf:
+        scope |= TreeScope.Element
+    depthLimited = 1 < maxDepth < 0xFFFFFFFF
+    if foundIndex == 1 and not depthLimited:
+        element = rootElement.FindFirst(scope, condition)
+        found = Control.CreateControlFromElement(element)
+        if found:
+            found.traverseCount = 1
+        return found
+    elements = rootElement.FindAll(scope, condition)
+    if not elements:
+        return None
+    foundCount = 0
+    for i in range(elements.Length):
+        element = elements.GetElement(i)
+        if depthLimited and _GetRelativeDepth(rootElement, element, maxDepth) < 0:
+            continue
+        foundCount += 1
+        if foundCount == foundIndex:
+            found = Control.CreateControlFromElement(element)
+            if found:
+                found.traverseCount = i + 1
+            return found
+
+
+def SnapshotDescendants(control: Control, controlTypes: Iterable[int]) -> List[Tuple[int, str, Rect]]:
+    """
+    Get ControlType, Name and BoundingRectangle of all descendants whose ControlType is in controlTypes.
+    The properties are fetched by one IUIAutomationElement::FindAllBuildCache call,
+        if the provider doesn't support it, fall back to a single `WalkControl` pass.
+    control: `Control` or its subclass.
+    controlTypes: Iterable[int], values in class `ControlType`.
+    Return List[Tuple[int, str, Rect]], (controlType, name, rect) in tree order.
+    """
+    controlTypes = list(controlTypes)
+    automation = _AutomationClient.instance().IUIAutomation
+    try:
+        condition = None
+        for controlType in controlTypes:
+            typeCondition = automation.CreatePropertyCondition(PropertyId.ControlTypeProperty, controlType)
+            condition = typeCondition if condition is None else automation.CreateOrCondition(condition, typeCondition)
+        cacheRequest = automation.CreateCacheRequest()
+        cacheRequest.AddProperty(PropertyId.ControlTypeProperty)
+        cacheRequest.AddProperty(PropertyId.NameProperty)
+        cacheRequest.AddProperty(PropertyId.BoundingRectangleProperty)
+        elements = control.Element.FindAllBuildCache(TreeScope.Descendants, condition, cacheRequest)
+        snapshot = []
+        for i in range(elements.Length if elements else 0):
+            element = elements.GetElement(i)
+            rect = element.CachedBoundingRectangle
+            snapshot.append((element.CachedControlType, element.CachedName or '', Rect(rect.left, rect.top, rect.right, rect.bottom)))
+        return snapshot
+    except (comtypes.COMError, AttributeError):
+        snapshot = []
+        for child, depth in WalkControl(control):
+            controlType = child.ControlType
+            if controlType in controlTypes:
+                snapshot.append((controlType, child.Name, child.BoundingRectangle))
+        return snapshot
+
+
 def ShowDesktop(waitTime: float = 1) -> None:
     """Show Desktop by pressing win + d"""
     SendKeys('{Win}d')
@@ -1,20 +1,13 @@
-from datetime import datetime, timedelta
-from . import uiautomation as uia
-from PIL import ImageGrab
-import win32clipboard
-import win32process
+from .timeparse import ParseTime
+# PIL、psutil、pyperclip、win32clipboard、win32process只在用到的函数中导入，减少导入wxauto的耗时
 import win32gui
 import win32api
 import win32con
-import pyperclip
 import ctypes
-import psutil
 import shutil
-import winreg
 import logging
 import time
 import os
-import re
 
 VERSION = "3.9.11.17"
 
@@ -29,6 +22,8 @@ def Click(rect):
     win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
     
 def GetPathByHwnd(hwnd):
+    import win32process
+    import psutil
     try:
         thread_id, process_id = win32process.GetWindowThreadProcessId(hwnd)
         process = psutil.Process(process_id)
@@ -52,6 +47,7 @@ def GetVersionByPath(file_path):
 def IsRedPixel(uicontrol):
     rect = uicontrol.BoundingRectangle
     bbox = (rect.left, rect.top, rect.right, rect.bottom)
+    from PIL import ImageGrab
     img = ImageGrab.grab(bbox=bbox, all_screens=True)
     return any(p[0] > p[1] and p[0] > p[2] for p in img.getdata())
 
@@ -70,6 +66,7 @@ pDropFiles.fWide = True
 matedata = bytes(pDropFiles)
 
 def SetClipboardText(text: str):
+    import pyperclip
     pyperclip.copy(text)
     # if not isinstance(text, str):
     #     raise TypeError(f"参数类型必须为str --> {text}")
@@ -137,6 +134,7 @@ def SetClipboardFiles(paths):
     for file in paths:
         if not os.path.exists(file):
             raise FileNotFoundError(f"file ({file}) not exists!")
+    import win32clipboard
     files = ("\0".join(paths)).replace("/", "\\")
     data = files.encode("U16")[2:]+b"\0\0"
     t0 = time.time()
@@ -157,6 +155,7 @@ def SetClipboardFiles(paths):
                 pass
 
 def PasteFile(folder):
+    import win32clipboard
     folder = os.path.realpath(folder)
     if not os.path.exists(folder):
         os.makedirs(folder)
@@ -164,7 +163,7 @@ def PasteFile(folder):
     t0 = time.time()
     while True:
         if time.time() - t0 > 10:
-            raise TimeoutError(f"读取剪贴板文件超时！")
+            raise TimeoutError("读取剪贴板文件超时！")
         try:
             win32clipboard.OpenClipboard()
             if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_HDROP):
@@ -202,6 +201,21 @@ def GetAllWindowExs(HWND):
 def FindWindow(classname=None, name=None) -> int:
     return win32gui.FindWindow(classname, name)
 
+def FindWindows(classname=None, name=None) -> list:
+    """枚举可见的顶层窗口，返回[(句柄, 标题)]"""
+    windows = []
+    def callback(hwnd, param):
+        if not win32gui.IsWindowVisible(hwnd):
+            return True
+        if classname and win32gui.GetClassName(hwnd) != classname:
+            return True
+        title = win32gui.GetWindowText(hwnd)
+        if name is None or title == name:
+            windows.append((hwnd, title))
+        return True
+    win32gui.EnumWindows(callback, None)
+    return windows
+
 def FindWinEx(HWND, classname=None, name=None) -> list:
     hwnds_classname = []
     hwnds_name = []
@@ -226,6 +240,7 @@ def FindWinEx(HWND, classname=None, name=None) -> list:
     return hwnds
 
 def ClipboardFormats(unit=0, *units):
+    import win32clipboard
     units = list(units)
     win32clipboard.OpenClipboard()
     u = win32clipboard.EnumClipboardFormats(unit)
@@ -236,6 +251,7 @@ def ClipboardFormats(unit=0, *units):
     return units
 
 def ReadClipboardData():
+    import win32clipboard
     Dict = {}
     for i in ClipboardFormats():
         if i == 0:
@@ -252,7 +268,7 @@ def ReadClipboardData():
 
 def ParseWeChatTime(time_str):
     """
-    时间格式转换函数
+    时间格式转换函数，见timeparse.ParseTime
 
     Args:
         time_str: 输入的时间字符串
@@ -260,37 +276,7 @@ def ParseWeChatTime(time_str):
     Returns:
         转换后的时间字符串
     """
-    
-    match = re.match(r'^(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})$', time_str)
-    if match:
-        month, day, hour, minute, second = match.groups()
-        current_year = datetime.now().year
-        return datetime(current_year, int(month), int(day), int(hour), int(minute), int(second)).strftime('%Y-%m-%d %H:%M:%S')
-    
-    match = re.match(r'^(\d{1,2}):(\d{1,2})$', time_str)
-    if match:
-        hour, minute = match.groups()
-        return datetime.now().strftime('%Y-%m-%d') + f' {hour}:{minute}:00'
-
-    match = re.match(r'^昨天 (\d{1,2}):(\d{1,2})$', time_str)
-    if match:
-        hour, minute = match.groups()
-        yesterday = datetime.now() - timedelta(days=1)
-        return yesterday.strftime('%Y-%m-%d') + f' {hour}:{minute}:00'
-
-    match = re.match(r'^星期([一二三四五六日]) (\d{1,2}):(\d{1,2})$', time_str)
-    if match:
-        weekday, hour, minute = match.groups()
-        weekday_num = ['一', '二', '三', '四', '五', '六', '日'].index(weekday)
-        today_weekday = datetime.now().weekday()
-        delta_days = (today_weekday - weekday_num) % 7
-        target_day = datetime.now() - timedelta(days=delta_days)
-        return target_day.strftime('%Y-%m-%d') + f' {hour}:{minute}:00'
-
-    match = re.match(r'^(\d{4})年(\d{1,2})月(\d{1,2})日 (\d{1,2}):(\d{1,2})$', time_str)
-    if match:
-        year, month, day, hour, minute = match.groups()
-        return datetime(*[int(i) for i in [year, month, day, hour, minute]]).strftime('%Y-%m-%d %H:%M:%S')
+    return ParseTime(time_str)
 
 
 def RollIntoView(win, ele, equal=False):
@@ -313,9 +299,9 @@ def RollIntoView(win, ele, equal=False):
                     break
 
 wxlog = logging.getLogger('wxauto')
-wxlog.setLevel(logging.DEBUG)
+wxlog.setLevel(logging.INFO)
 console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
+console_handler.setLevel(logging.INFO)
 formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s (%(filename)s:%(lineno)d): %(message)s')
 console_handler.setFormatter(formatter)
 wxlog.addHandler(console_handler)
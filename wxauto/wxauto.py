@@ -10,6 +10,9 @@ from .utils import *
 from .elements import *
 from .errors import *
 from .color import *
+from .contacts import FriendDetailCrawler
+from .backend import WeChatBackend
+import threading
 import time
 import os
 import re
@@ -18,7 +21,7 @@ try:
 except:
     from typing_extensions import Literal
 
-class WeChat(WeChatBase):
+class WeChat(WeChatBase, WeChatBackend):
     VERSION: str = '3.9.11.17'
     lastmsgid: str = None
     listen: dict = dict()
@@ -69,8 +72,7 @@ class WeChat(WeChatBase):
         self.C_MsgList = self.ChatBox.ListControl(Name=self._lang('消息'))
         
         self.nickname = self.A_MyIcon.Name
-        msgs_ = self.GetAllMessage()
-        self.usedmsgid = [i[-1] for i in msgs_]
+        self.usedmsgid = self._getmsgids()
         print(f'初始化成功，获取到已登录窗口：{self.nickname}')
     
     def _checkversion(self):
@@ -106,8 +108,39 @@ class WeChat(WeChatBase):
         if '昵称' not in info:
             info['备注'] = ''
             info['昵称'] = controls[0].Name
-        wxlog.debug(f'获取到好友详情：{info}')
+        wxlog.debug('获取到好友详情：%s', info)
         return info
+
+    def _selected_friend(self):
+        """通讯录中当前选中的好友控件的RuntimeId，不读取详情；焦点不在好友列表项上时返回None"""
+        control = uia.GetFocusedControl()
+        if control is None or control.ControlTypeName != 'ListItemControl':
+            return None
+        return ''.join([str(i) for i in control.GetRuntimeId()])
+
+    def _get_friend_details_timeout(self, timeout):
+        """在新线程中读取当前好友详情，超过timeout秒抛出TimeoutError
+
+        微信卡住时UIAutomation调用不会返回，读取线程会一直阻塞，因此设为守护线程，不等待其结束；
+        线程保存在_detail_reader中，线程结束前不能再操作界面，见CrawlFriendDetails
+        """
+        result = {}
+        def read():
+            initializer = uia.UIAutomationInitializerInThread()
+            try:
+                result['info'] = self._get_friend_details()
+            except Exception as e:
+                result['error'] = e
+            del initializer
+        thread = threading.Thread(target=read, daemon=True)
+        self._detail_reader = thread
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            raise TimeoutError(f'读取好友详情超过{timeout}秒')
+        if 'error' in result:
+            raise result['error']
+        return result['info']
     
     def _goto_first_friend(self):
         def find_letter_tag(self):
@@ -138,6 +171,7 @@ class WeChat(WeChatBase):
         注：1. 该方法运行时间较长，约0.5~1秒一个好友的速度，好友多的话可将n设置为一个较小的值，先测试一下
             2. 如果遇到企业微信的好友且为已离职状态，可能导致微信卡死，需重启（此为微信客户端BUG）
             3. 该方法未经过大量测试，可能存在未知问题，如有问题请微信群内反馈
+            4. 需要中断后继续读取、或只更新过期的详情时，使用CrawlFriendDetails
         """
         t0 = time.time()
         self.SwitchToContact()
@@ -155,6 +189,50 @@ class WeChat(WeChatBase):
             if n and len(details) >= n:
                 return details
 
+    def CrawlFriendDetails(self, directory, n=None, timeout=0xFFFFF, max_age=None, friend_timeout=10, retry_bad=False):
+        """读取好友详情并逐个保存到通讯录缓存，中断后再次调用从上次的好友继续
+
+        Args:
+            directory (ContactDirectory): 保存详情和进度的通讯录缓存
+            n (int, optional): 本次最多读取n个好友（跳过的不计），默认为None，读取到最后一个好友
+            timeout (int, optional): 本次读取的时间（秒），超过后保存进度并返回
+            max_age (int, optional): 详情的有效期（秒），有效期内的好友只跳过不读取，默认为None，读取过的都不再读取
+            friend_timeout (int, optional): 每个好友的读取超时时间（秒），超时的好友记为失败，之后跳过
+            retry_bad (bool, optional): 是否重新读取之前失败的好友
+
+        Returns:
+            list: 缓存中所有好友详情，按好友列表中的顺序排列
+
+        Raises:
+            TimeoutError: 上次超时的读取线程仍未结束（微信可能仍未响应），此时不进行任何界面操作
+
+        注：1. 每读取一个好友立即保存，微信卡死、程序中断或超时后再次调用，会先按方向键回到上次的位置继续
+            2. 一个好友读取超时即停止读取（超时的读取可能仍在进行），微信恢复或重启后再次调用，会跳过这个好友
+            3. 读取到最后一个好友后清除进度，下次从第一个好友开始，只读取过期的详情
+        """
+        reader = getattr(self, '_detail_reader', None)
+        if reader is not None and reader.is_alive():
+            reader.join(friend_timeout)
+            if reader.is_alive():
+                raise TimeoutError('上次读取好友详情的线程仍未结束，微信可能仍未响应')
+        self._show()
+        self.SwitchToContact()
+        self._goto_first_friend()
+        def read():
+            # 跳过时按方向键不等待，读取前等待详情面板刷新，否则可能读到上一个好友
+            time.sleep(uia.OPERATION_WAIT_TIME)
+            return self._get_friend_details_timeout(friend_timeout)
+        crawler = FriendDetailCrawler(
+            directory,
+            read=read,
+            step=lambda: self.SessionBox.SendKeys('{DOWN}', waitTime=0.05),
+            locate=self._selected_friend,
+            max_age=max_age,
+            retry_bad=retry_bad,
+        )
+        crawler.Run(n, timeout)
+        return directory.Details()
+
             
     def GetSessionAmont(self, SessionItem):
         """获取聊天对象名和新消息条数
@@ -183,26 +261,25 @@ class WeChat(WeChatBase):
     
     def GetNextNewMessage(self, savepic=False, savefile=False, savevoice=False, timeout=10):
         """获取下一个新消息"""
-        msgs_ = self.GetAllMessage()
-        msgids = [i[-1] for i in msgs_]
+        MsgItems = self.C_MsgList.GetChildren()
+        msgids = self._getmsgids(MsgItems)
 
         if not self.usedmsgid:
             self.usedmsgid = msgids
         
-        newmsgids = [i for i in msgids if i not in self.usedmsgid]
-        oldmsgids = [i for i in self.usedmsgid if i in msgids]
+        usedmsgid = set(self.usedmsgid)
+        newmsgids = [i for i in msgids if i not in usedmsgid]
+        oldmsgids = [i for i in msgids if i in usedmsgid]
         if newmsgids and oldmsgids:
-            MsgItems = self.C_MsgList.GetChildren()
-            msgids = [''.join([str(i) for i in i.GetRuntimeId()]) for i in MsgItems]
-            new = []
+            new = set()
             for i in range(len(msgids)-1, -1, -1):
-                if msgids[i] in self.usedmsgid:
-                    new = msgids[i+1:]
+                if msgids[i] in usedmsgid:
+                    new = set(msgids[i+1:])
                     break
             NewMsgItems = [
-                i for i in MsgItems 
-                if ''.join([str(i) for i in i.GetRuntimeId()]) in new
-                and i.ControlTypeName == 'ListItemControl'
+                item for item, msgid in zip(MsgItems, msgids)
+                if msgid in new
+                and item.ControlTypeName == 'ListItemControl'
             ]
             if NewMsgItems:
                 wxlog.debug('获取当前窗口新消息')
@@ -225,8 +302,7 @@ class WeChat(WeChatBase):
                 self.ChatWith(session)
                 NewMsgItems = self.C_MsgList.GetChildren()[-sessiondict[session]:]
                 msgs = self._getmsgs(NewMsgItems, savepic, savefile, savevoice)
-                msgs_ = self.GetAllMessage()
-                self.usedmsgid = [i[-1] for i in msgs_]
+                self.usedmsgid = self._getmsgids()
                 return {session:msgs}
         else:
             wxlog.debug('没有新消息')
@@ -250,20 +326,12 @@ class WeChat(WeChatBase):
                 break
         return newmessages
     
-    def GetSessionList(self, reset=False, newmessage=False):
-        """获取当前聊天列表中的所有聊天对象
-        
-        Args:
-            reset (bool): 是否重置SessionItemList
-            newmessage (bool): 是否只获取有新消息的聊天对象
-            
-        Returns:
-            SessionList (dict): 聊天对象列表，键为聊天对象名，值为新消息条数
-        """
+    def _getsessionitems(self, reset=False):
+        """遍历一次会话列表，返回{聊天对象名: (会话控件, 新消息条数)}"""
         self.SessionItem = self.SessionBox.ListItemControl()
         if reset:
             self.SessionItemList = []
-        SessionList = {}
+        SessionItems = {}
         for i in range(100):
             if self.SessionItem.BoundingRectangle.width() != 0:
                 try:
@@ -272,12 +340,24 @@ class WeChat(WeChatBase):
                     break
                 if name not in self.SessionItemList:
                     self.SessionItemList.append(name)
-                if name not in SessionList:
-                    SessionList[name] = amount
+                if name not in SessionItems:
+                    SessionItems[name] = (self.SessionItem, amount)
             self.SessionItem = self.SessionItem.GetNextSiblingControl()
             if not self.SessionItem:
                 break
+        return SessionItems
+
+    def GetSessionList(self, reset=False, newmessage=False):
+        """获取当前聊天列表中的所有聊天对象
+        
+        Args:
+            reset (bool): 是否重置SessionItemList
+            newmessage (bool): 是否只获取有新消息的聊天对象
             
+        Returns:
+            SessionList (dict): 聊天对象列表，键为聊天对象名，值为新消息条数
+        """
+        SessionList = {name: amount for name, (_, amount) in self._getsessionitems(reset).items()}
         if newmessage:
             return {i:SessionList[i] for i in SessionList if SessionList[i] > 0}
         return SessionList
@@ -326,7 +406,7 @@ class WeChat(WeChatBase):
             else:
                 search_result_control = self.SessionBox.GetChildren()[1].GetChildren()[1].GetFirstChildControl()
                 if not search_result_control.PaneControl(searchDepth=1).TextControl(RegexName='联系人|群聊').Exists(0.1):
-                    wxlog.debug(f'未找到搜索结果: {who}')
+                    wxlog.debug('未找到搜索结果: %s', who)
                     self._refresh()
                     return False
                 wxlog.debug('选择搜索结果第一个')
@@ -387,6 +467,23 @@ class WeChat(WeChatBase):
         else:
             return None
 
+    def SendParts(self, parts, who):
+        """向独立聊天窗口按顺序发送多段消息，只激活一次窗口，与SendMsg一样只在who的独立聊天窗口存在时发送
+
+        Args:
+            parts (list): [(类型, 数据, 要@的人)]，格式见ChatWnd.SendParts
+            who (str): 要发送给谁
+
+        Returns:
+            bool: 是否所有段都成功发送，聊天窗口不存在时返回False
+        """
+        chat = self.listen.get(who)
+        if chat is None:
+            if not FindWindow(name=who, classname='ChatWnd'):
+                return False
+            chat = ChatWnd(who, self.language)
+        return chat.SendParts(parts)
+
         
     def SendFiles(self, filepath, who=None):
         """向当前聊天窗口发送文件
@@ -488,14 +585,12 @@ class WeChat(WeChatBase):
     
     def CurrentChat(self):
         '''获取当前聊天对象名'''
-        uia.SetGlobalSearchTimeout(1)
         try:
-            currentname = self.ChatBox.TextControl(searchDepth=15).Name
+            with uia.SearchTimeout(1):
+                currentname = self.ChatBox.TextControl(searchDepth=15).Name
             return currentname
         except:
             return None
-        finally:
-            uia.SetGlobalSearchTimeout(10)
 
     def GetNewFriends(self):
         """获取新的好友申请列表
@@ -516,7 +611,7 @@ class WeChat(WeChatBase):
         self.SessionBox.ButtonControl(Name='ContactListItem').Click(simulateMove=False)
         NewFriendsList = [NewFriendsElement(i, self) for i in self.ChatBox.ListControl(Name='新的朋友').GetChildren()]
         AcceptableNewFriendsList = [i for i in NewFriendsList if i.acceptable]
-        wxlog.debug(f'获取到 {len(AcceptableNewFriendsList)} 条新的好友申请')
+        wxlog.debug('获取到 %s 条新的好友申请', len(AcceptableNewFriendsList))
         return AcceptableNewFriendsList
     
     def AddListenChat(self, who, savepic=False, savefile=False, savevoice=False):
@@ -532,10 +627,99 @@ class WeChat(WeChatBase):
         if not exists:
             self.ChatWith(who)
             self.SessionBox.ListItemControl(RegexName=who).DoubleClick(simulateMove=False)
-        self.listen[who] = ChatWnd(who, self.language)
-        self.listen[who].savepic = savepic
-        self.listen[who].savefile = savefile
-        self.listen[who].savevoice = savevoice
+        self._listen(who, savepic, savefile, savevoice)
+
+    def _listen(self, who, savepic=False, savefile=False, savevoice=False):
+        chat = ChatWnd(who, self.language)
+        chat.savepic = savepic
+        chat.savefile = savefile
+        chat.savevoice = savevoice
+        self.listen[who] = chat
+
+    def GetChatWindows(self):
+        """获取已打开的独立聊天窗口
+
+        Returns:
+            list: 独立聊天窗口的聊天对象名
+        """
+        return [name for _, name in FindWindows(classname='ChatWnd') if name]
+
+    def AddListenChats(self, whos, savepic=False, savefile=False, savevoice=False, callback=None):
+        """批量添加监听对象，按以下顺序处理以减少打开聊天的次数：
+            1. 已打开独立聊天窗口的对象直接监听
+            2. 遍历一次会话列表，列表中可见的对象直接双击打开独立聊天窗口
+            3. 其余对象搜索后打开
+
+        Args:
+            whos (list): 要监听的聊天对象名
+            savepic (bool, optional): 是否自动保存聊天图片
+            savefile (bool, optional): 是否自动保存聊天文件
+            savevoice (bool, optional): 是否自动保存聊天语音
+            callback (callable, optional): 每处理完一个对象调用callback(who, result, done, total)
+
+        Returns:
+            dict: {聊天对象名: result}，result为'listening'(已在监听)、'adopted'(已有独立窗口)、
+                'session'(从会话列表打开)、'search'(搜索后打开)，失败为False
+        """
+        whos = list(dict.fromkeys(whos))
+        results = {}
+
+        def report(who, result):
+            results[who] = result
+            if callback:
+                callback(who, result, len(results), len(whos))
+
+        def listen(who, result):
+            try:
+                self._listen(who, savepic, savefile, savevoice)
+            except Exception as e:
+                wxlog.debug('添加监听对象失败：%s %s', who, e)
+                result = False
+            report(who, result)
+
+        windows = set(self.GetChatWindows())
+        pending = []
+        for who in whos:
+            if who in self.listen:
+                report(who, 'listening')
+            elif who in windows:
+                listen(who, 'adopted')
+            else:
+                pending.append(who)
+        if not pending:
+            return results
+
+        self._show()
+        SessionItems = self._getsessionitems(True)
+        # 最后一个会话可能只显示了一部分，与ChatWith一致不直接点击
+        visible = set(list(SessionItems)[:-1])
+        searching = []
+        for who in pending:
+            if who not in visible:
+                searching.append(who)
+                continue
+            # 弹出的独立窗口可能遮挡会话列表，每次双击前激活主窗口
+            try:
+                self._show()
+                SessionItems[who][0].DoubleClick(simulateMove=False)
+            except Exception as e:
+                wxlog.debug('打开聊天失败：%s %s', who, e)
+                searching.append(who)
+                continue
+            listen(who, 'session')
+        # 搜索会改变会话列表的顺序，放在最后
+        for who in searching:
+            try:
+                if not self.ChatWith(who):
+                    report(who, False)
+                    continue
+                self.SessionBox.ListItemControl(RegexName=who).DoubleClick(simulateMove=False)
+            except Exception as e:
+                wxlog.debug('打开聊天失败：%s %s', who, e)
+                report(who, False)
+                continue
+            listen(who, 'search')
+        return results
 
     def GetListenMessage(self, who=None):
         """获取监听对象的新消息
@@ -551,8 +735,8 @@ class WeChat(WeChatBase):
             msg = chat.GetNewMessage(savepic=chat.savepic, savefile=chat.savefile, savevoice=chat.savevoice)
             return msg
         msgs = {}
-        for who in self.listen:
-            chat = self.listen[who]
+        # 监听对象可能在其他线程中增删，遍历副本
+        for chat in list(self.listen.values()):
             msg = chat.GetNewMessage(savepic=chat.savepic, savefile=chat.savefile, savevoice=chat.savevoice)
             if msg:
                 msgs[chat] = msg
@@ -590,48 +774,49 @@ class WeChat(WeChatBase):
         """
         ele = self.ChatBox.PaneControl(searchDepth=7, foundIndex=6).ButtonControl(Name='聊天信息')
         try:
-            uia.SetGlobalSearchTimeout(1)
-            rect = ele.BoundingRectangle
+            with uia.SearchTimeout(1):
+                rect = ele.BoundingRectangle
             Click(rect)
         except:
             return 
-        finally:
-            uia.SetGlobalSearchTimeout(10)
         roominfoWnd = self.UiaAPI.Control(ClassName='SessionChatRoomDetailWnd', searchDepth=1)
         more = roominfoWnd.ButtonControl(Name='查看更多', searchDepth=8)
         try:
-            uia.SetGlobalSearchTimeout(1)
-            rect = more.BoundingRectangle
+            with uia.SearchTimeout(1):
+                rect = more.BoundingRectangle
             Click(rect)
         except:
             pass
-        finally:
-            uia.SetGlobalSearchTimeout(10)
         members = [i.Name for i in roominfoWnd.ListControl(Name='聊天成员').GetChildren()]
         while members[-1] in ['添加', '移出']:
             members = members[:-1]
         roominfoWnd.SendKeys('{Esc}')
         return members
 
-    def GetAllFriends(self, keywords=None):
+    def GetAllFriends(self, keywords=None, directory=None, refresh=False):
         """获取所有好友列表
         注：
-            1. 该方法运行时间取决于好友数量，约每秒6~8个好友的速度
+            1. 从界面读取时运行时间取决于好友数量，约每秒6~8个好友的速度，可传入directory缓存结果
             2. 该方法未经过大量测试，可能存在未知问题，如有问题请微信群内反馈
         
         Args:
             keywords (str, optional): 搜索关键词，只返回包含关键词的好友列表
+            directory (ContactDirectory, optional): 通讯录缓存，非空时直接从缓存读取（keywords与界面搜索一样，
+                按昵称或备注包含关键词匹配），否则从界面读取后保存到缓存
+            refresh (bool, optional): 是否忽略缓存，重新从界面读取
             
         Returns:
             list: 所有好友列表
         """
+        if directory is not None and not refresh and len(directory):
+            return directory.Search(keywords, contains=True) if keywords else directory.All()
         self._show()
         self.SwitchToContact()
         self.SessionBox.ListControl(Name="联系人").ButtonControl(Name="通讯录管理").Click(simulateMove=False)
         contactwnd = ContactWnd()
         if keywords:
             contactwnd.Search(keywords)
-        friends = contactwnd.GetAllFriends()
+        friends = contactwnd.GetAllFriends(directory, complete=not keywords)
         contactwnd.Close()
         self.SwitchToChat()
         return friends
@@ -640,10 +825,17 @@ class WeChat(WeChatBase):
         """获取所有监听对象"""
         return self.listen
     
-    def RemoveListenChat(self, who):
-        """移除监听对象"""
-        if who in self.listen:
-            del self.listen[who]
+    def RemoveListenChat(self, who, close=False):
+        """移除监听对象
+
+        Args:
+            who (str): 要移除的聊天对象名
+            close (bool, optional): 是否同时关闭其独立聊天窗口
+        """
+        chat = self.listen.pop(who, None)
+        if chat:
+            if close:
+                chat.Close()
         else:
             Warnings.lightred(f'未找到监听对象：{who}', stacklevel=2)
 
@@ -797,7 +989,7 @@ class WeChatFiles:
             self.item = self.SessionBox.ListItemControl(Name=who)
             self.item.Click(simulateMove=False)
         else:
-            wxlog.debug(f'未查询到目标：{who}')
+            wxlog.debug('未查询到目标：%s', who)
         itemfileslist = []
 
         item = self.SessionBox.ListControl(Name='', searchDepth=7).GetParentControl()